@@ -0,0 +1,87 @@
+"""
+Benchmark del decodificador del webhook: camino anterior (json.loads de
+todo el body + recorrer dicts + get_message_type sobre dicts) vs.
+decode_webhook (msgspec directo a estructuras) + get_message_type.
+
+Uso: python -m benchmarks.bench_decoder
+"""
+import json
+import timeit
+from benchmarks.payloads import webhook_body
+from shared.webhook import decode_webhook, get_message_type, iter_events
+
+N = 20_000
+
+
+def old_get_message_type(message):
+    # Copia del helper anterior (shared/utils.py), que trabajaba sobre dicts
+    content = ""
+    message_type = message.get("type", "unknown")
+
+    if message_type == "text":
+        content = message["text"]["body"]
+    elif message_type == "interactive":
+        interactive_object = message["interactive"]
+        interactive_type = interactive_object["type"]
+        if interactive_type == "button_reply":
+            content = interactive_object["button_reply"]["id"]
+        elif interactive_type == "list_reply":
+            content = interactive_object["list_reply"]["id"]
+    elif message_type == "location":
+        content = message["location"]
+    elif message_type == "audio":
+        content = message["audio"]["id"]
+    else:
+        content = None
+
+    return message_type, content
+
+
+def old_path(body: bytes):
+    data = json.loads(body)
+    results = []
+    for entry in data.get("entry") or ():
+        for change in entry.get("changes") or ():
+            value = change.get("value") or {}
+            for message in value.get("messages") or ():
+                results.append((message.get("from"), message.get("id"), old_get_message_type(message)))
+            for status in value.get("statuses") or ():
+                results.append((status.get("recipient_id"), status.get("id"), status.get("status")))
+    return results
+
+
+def new_path(body: bytes):
+    results = []
+    for kind, _, item in iter_events(decode_webhook(body)):
+        if kind == "message":
+            results.append((item.from_, item.id, get_message_type(item)))
+        else:
+            results.append((item.recipient_id, item.id, item.status))
+    return results
+
+
+def main():
+    cases = {
+        "single_text": webhook_body(messages=1, statuses=0, kinds=("text",)),
+        "single_status": webhook_body(messages=0, statuses=1),
+        "batch_20_mixed": webhook_body(messages=15, statuses=5),
+        "batch_100_mixed": webhook_body(messages=80, statuses=20, entries=4),
+    }
+
+    results = {}
+    for name, body in cases.items():
+        assert len(old_path(body)) == len(new_path(body))
+        old_us = min(timeit.repeat(lambda: old_path(body), number=N, repeat=3)) / N * 1e6
+        new_us = min(timeit.repeat(lambda: new_path(body), number=N, repeat=3)) / N * 1e6
+        results[name] = {
+            "body_bytes": len(body),
+            "old_us": round(old_us, 2),
+            "decoder_us": round(new_us, 2),
+            "speedup": round(old_us / new_us, 1),
+        }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Micro-benchmark: armar y serializar el menú de bienvenida en cada envío
+(camino anterior) vs. usar el PayloadTemplate pre-serializado.
+
+Uso: python -m benchmarks.bench_templates
+"""
+import json
+import timeit
+import tracemalloc
+from services.whatsapp_service import build_button_payload, build_list_payload
+from services.templates import button_template, list_template, list_row
+
+PHONE = "59892717261"
+N = 100_000
+
+WELCOME_TEXT = "🤖 ¡Bienvenido a nuestro Restaurante!\n\n¿Qué deseas hacer?"
+WELCOME_BUTTONS = [
+    {"id": "ver_productos", "title": "🍕 Ver Productos"},
+    {"id": "mi_carrito", "title": "🛒 Mi Carrito"},
+    {"id": "mis_pedidos", "title": "📦 Mis Pedidos"}
+]
+PAGE_SECTIONS = [{
+    "title": "Pizzas",
+    "rows": [list_row(f"prod_{i}", f"Pizza {i}", f"${400 + i} - Pizzas") for i in range(8)]
+    + [list_row("page:1:Pizzas", "➡️ Siguiente")],
+}]
+
+
+def old_welcome():
+    # Lo que hace httpx con json=payload: armar el dict y json.dumps en cada envío
+    return json.dumps(build_button_payload(PHONE, WELCOME_TEXT, WELCOME_BUTTONS)).encode()
+
+
+def old_page():
+    return json.dumps(build_list_payload(PHONE, "🍽️ Pizzas: selecciona un producto", "Ver Productos", PAGE_SECTIONS)).encode()
+
+
+WELCOME = button_template(WELCOME_TEXT, WELCOME_BUTTONS)
+PAGE = list_template("🍽️ Pizzas: selecciona un producto", "Ver Productos", PAGE_SECTIONS)
+
+
+def new_welcome():
+    return WELCOME.render(PHONE)
+
+
+def new_page():
+    return PAGE.render(PHONE)
+
+
+def peak_bytes(func, runs: int = 1000) -> float:
+    """Pico de memoria asignada durante una llamada (promedio)"""
+    total = 0
+    tracemalloc.start()
+    for _ in range(runs):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        func()
+        total += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return total / runs
+
+
+def main():
+    # Los dos caminos tienen que producir el mismo mensaje
+    assert json.loads(old_welcome()) == json.loads(new_welcome())
+    assert json.loads(old_page()) == json.loads(new_page())
+
+    results = {}
+    for name, old, new in (("welcome_menu", old_welcome, new_welcome), ("catalog_page", old_page, new_page)):
+        old_us = min(timeit.repeat(old, number=N, repeat=3)) / N * 1e6
+        new_us = min(timeit.repeat(new, number=N, repeat=3)) / N * 1e6
+        results[name] = {
+            "old_us_per_send": round(old_us, 3),
+            "template_us_per_send": round(new_us, 3),
+            "speedup": round(old_us / new_us, 1),
+            "old_peak_bytes": round(peak_bytes(old)),
+            "template_peak_bytes": round(peak_bytes(new)),
+        }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
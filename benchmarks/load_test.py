@@ -0,0 +1,344 @@
+"""
+Test de carga de punta a punta: levanta una Graph API falsa local (con
+latencia y tasa de error configurables), apunta WHATSAPP_API_URL a ella,
+arranca main:app (en el mismo proceso vía ASGI o bajo uvicorn) y le
+manda webhooks generados (text, button_reply, list_reply, location,
+audio y status) a un ritmo fijo.
+
+Al final imprime un JSON con el throughput y los percentiles de latencia
+del webhook y de los envíos a la Graph API, para comparar entre commits.
+
+Uso:
+    python -m benchmarks.load_test --rate 200 --duration 10
+    python -m benchmarks.load_test --mode uvicorn --api-latency-ms 80 --api-error-rate 0.02 --output run.json
+
+Las variables de entorno de shared/config.py (OUTBOUND_WORKERS,
+OUTBOUND_RATE_PER_SECOND, ...) se respetan igual que en producción.
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import itertools
+import json
+import os
+import random
+import tempfile
+import time
+
+import httpx
+import uvicorn
+
+from benchmarks.payloads import KINDS, webhook_body
+
+HOST = "127.0.0.1"
+
+
+# ============================================================
+# GRAPH API FALSA
+# ============================================================
+
+# Lo que "descarga" cualquier audio o imagen
+MEDIA_BYTES = os.urandom(32 * 1024)
+MEDIA_SHA256 = hashlib.sha256(MEDIA_BYTES).hexdigest()
+
+
+class FakeGraphAPI:
+    """
+    App ASGI mínima que contesta como POST /{phone_number_id}/messages,
+    GET /{media_id} (la URL del archivo) y GET /media/{id} (el archivo).
+    Cada request espera `latency` ± `jitter` segundos y falla con un 500
+    con probabilidad `error_rate`.
+    """
+
+    def __init__(self, latency: float, jitter: float, error_rate: float, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.ids = itertools.count()
+        self.requests = 0
+        self.errors = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+
+        # Leer (y descartar) el body completo
+        more = True
+        while more:
+            message = await receive()
+            more = message.get("more_body", False)
+
+        self.requests += 1
+        delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+        if delay:
+            await asyncio.sleep(delay)
+
+        if self.rng.random() < self.error_rate:
+            self.errors += 1
+            status = 500
+            body = b'{"error":{"message":"(#131000) Something went wrong","type":"OAuthException","code":131000}}'
+        elif scope["path"].startswith("/media/"):
+            status = 200
+            body = MEDIA_BYTES
+        elif scope["method"] == "GET":
+            status = 200
+            host = dict(scope["headers"]).get(b"host", b"").decode()
+            media_id = scope["path"].rsplit("/", 1)[-1]
+            body = json.dumps({
+                "url": f"http://{host}/media/{media_id}",
+                "mime_type": "audio/ogg",
+                "sha256": MEDIA_SHA256,
+                "file_size": len(MEDIA_BYTES),
+                "id": media_id,
+            }).encode()
+        else:
+            status = 200
+            body = b'{"messaging_product":"whatsapp","contacts":[{"input":"","wa_id":""}],"messages":[{"id":"wamid.FAKE%d"}]}' % next(self.ids)
+
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+async def serve(app, port: int = 0, lifespan: str = "off") -> tuple[uvicorn.Server, asyncio.Task, int]:
+    """Arranca `app` bajo uvicorn en este event loop y devuelve (server, tarea, puerto)"""
+    config = uvicorn.Config(app, host=HOST, port=port, lifespan=lifespan, log_level="warning", access_log=False)
+    server = uvicorn.Server(config)
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, task, port
+
+
+# ============================================================
+# MEDICIONES
+# ============================================================
+
+def sign(body: bytes) -> str:
+    """X-Hub-Signature-256 como lo manda Meta (con el APP_SECRET del test)"""
+    return "sha256=" + hmac.new(os.environ["APP_SECRET"].encode(), body, hashlib.sha256).hexdigest()
+
+
+def percentiles(samples: list[float]) -> dict:
+    """p50/p95/p99/max en milisegundos"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def at(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50": at(0.50),
+        "p95": at(0.95),
+        "p99": at(0.99),
+        "max": round(ordered[-1] * 1000, 3),
+    }
+
+
+def measure_sends(service, samples: list[float]):
+    """Envuelve service.send_payload para registrar la duración de cada envío"""
+    send_payload = service.send_payload
+
+    async def timed_send_payload(payload):
+        started = time.perf_counter()
+        try:
+            return await send_payload(payload)
+        finally:
+            samples.append(time.perf_counter() - started)
+
+    service.send_payload = timed_send_payload
+
+
+async def drain(outbound, timeout: float) -> bool:
+    """Espera a que la cola de salida termine de enviar todo lo encolado"""
+    try:
+        await asyncio.wait_for(asyncio.gather(*(q.join() for q in outbound.queues)), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+# ============================================================
+# CORRIDA
+# ============================================================
+
+async def replay(client: httpx.AsyncClient, args, samples: list[float]) -> dict:
+    """
+    Manda `rate` webhooks por segundo durante `duration` segundos (carga
+    abierta: cada request sale a su hora aunque los anteriores no hayan
+    terminado) y registra la latencia de cada uno.
+    """
+    rng = random.Random(args.seed)
+    phones = [f"5989{rng.randint(1000000, 9999999)}" for _ in range(args.users)]
+    kinds = tuple(args.kinds.split(","))
+    total = int(args.rate * args.duration)
+
+    # Los bodies se generan antes para no medir el generador
+    bodies = []
+    for i in range(total):
+        statuses = 1 if rng.random() < args.status_ratio else 0
+        bodies.append(webhook_body(
+            messages=args.batch - statuses, statuses=statuses,
+            kinds=kinds, phones=phones, seed=args.seed + i,
+        ))
+
+    errors = 0
+    in_flight: set[asyncio.Task] = set()
+
+    # Las firmas también: las calcula Meta, no el webhook
+    signatures = [sign(body) for body in bodies]
+
+    async def post(body: bytes, signature: str):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            response = await client.post("/whatsapp", content=body, headers={
+                "content-type": "application/json",
+                "x-hub-signature-256": signature,
+            })
+            if response.status_code != 200:
+                errors += 1
+        except httpx.HTTPError:
+            errors += 1
+        samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for i, body in enumerate(bodies):
+        delay = started + i / args.rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.create_task(post(body, signatures[i]))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    elapsed = time.perf_counter() - started
+
+    return {"requests": total, "events": total * args.batch, "errors": errors, "elapsed_s": round(elapsed, 3)}
+
+
+async def run(args) -> dict:
+    api = FakeGraphAPI(args.api_latency_ms / 1000, args.api_jitter_ms / 1000, args.api_error_rate, args.seed)
+    api_server, api_task, api_port = await serve(api)
+
+    # La configuración se lee al importar: main se importa recién ahora
+    os.environ["GRAPH_API_BASE_URL"] = f"http://{HOST}:{api_port}/v21.0"
+    os.environ["WHATSAPP_API_URL"] = f"http://{HOST}:{api_port}/v21.0/123456789012345/messages"
+    import main
+
+    webhook_samples: list[float] = []
+    send_samples: list[float] = []
+
+    if args.mode == "uvicorn":
+        app_server, app_task, app_port = await serve(main.app, lifespan="on")
+        client = httpx.AsyncClient(base_url=f"http://{HOST}:{app_port}", timeout=30, limits=httpx.Limits(max_connections=args.connections))
+        lifespan = None
+    else:
+        lifespan = main.app.router.lifespan_context(main.app)
+        await lifespan.__aenter__()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://app", timeout=30)
+
+    measure_sends(main.app.state.whatsapp, send_samples)
+    try:
+        started = time.perf_counter()
+        load = await replay(client, args, webhook_samples)
+        drained = await drain(main.app.state.outbound, args.drain_timeout)
+        load["drained_s"] = round(time.perf_counter() - started, 3)
+        outbound = main.app.state.outbound.stats()
+        await main.app.state.media.queue.join()
+        media = main.app.state.media.stats()
+    finally:
+        await client.aclose()
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+        else:
+            app_server.should_exit = True
+            await app_task
+        api_server.should_exit = True
+        await api_task
+
+    elapsed = load["elapsed_s"] or 1
+    return {
+        "config": {
+            "mode": args.mode,
+            "rate": args.rate,
+            "duration_s": args.duration,
+            "batch": args.batch,
+            "users": args.users,
+            "kinds": args.kinds,
+            "status_ratio": args.status_ratio,
+            "api_latency_ms": args.api_latency_ms,
+            "api_jitter_ms": args.api_jitter_ms,
+            "api_error_rate": args.api_error_rate,
+        },
+        "load": load,
+        "throughput": {
+            "requests_per_s": round(load["requests"] / elapsed, 1),
+            "events_per_s": round(load["events"] / elapsed, 1),
+            # Los envíos siguen hasta vaciar la cola, después de la carga
+            "sends_per_s": round(len(send_samples) / (load["drained_s"] or 1), 1),
+        },
+        "webhook_latency_ms": percentiles(webhook_samples),
+        "outbound_latency_ms": percentiles(send_samples),
+        "outbound": {**outbound, "drained": drained},
+        "media": media,
+        "graph_api": {"requests": api.requests, "errors": api.errors},
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--mode", choices=("asgi", "uvicorn"), default="asgi", help="asgi: en proceso sin sockets; uvicorn: HTTP real")
+    parser.add_argument("--rate", type=float, default=100, help="webhooks por segundo")
+    parser.add_argument("--duration", type=float, default=10, help="segundos de carga")
+    parser.add_argument("--batch", type=int, default=1, help="eventos por webhook")
+    parser.add_argument("--users", type=int, default=500, help="números de teléfono distintos")
+    parser.add_argument("--kinds", default=",".join(KINDS), help="tipos de mensaje, separados por coma")
+    parser.add_argument("--status-ratio", type=float, default=0.3, help="fracción de webhooks que traen un status")
+    parser.add_argument("--api-latency-ms", type=float, default=50)
+    parser.add_argument("--api-jitter-ms", type=float, default=20)
+    parser.add_argument("--api-error-rate", type=float, default=0.0)
+    parser.add_argument("--connections", type=int, default=100, help="conexiones al webhook (modo uvicorn)")
+    parser.add_argument("--drain-timeout", type=float, default=30, help="segundos para vaciar la cola de salida al final")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="archivo donde guardar el JSON (además de imprimirlo)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Sin logs por evento (ensucian la salida y el tiempo medido) y con un
+    # catálogo y pedidos descartables; se pueden sobreescribir por entorno
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    tmp = tempfile.TemporaryDirectory()
+    os.environ.setdefault("CATALOG_DB_PATH", os.path.join(tmp.name, "catalog.db"))
+    os.environ.setdefault("ORDERS_DB_PATH", os.path.join(tmp.name, "orders.db"))
+    os.environ.setdefault("MEDIA_DIR", os.path.join(tmp.name, "media"))
+    os.environ.setdefault("OUTBOX_PATH", os.path.join(tmp.name, "outbox.journal"))
+    # Los webhooks se firman como los de Meta, así se mide también la verificación
+    os.environ.setdefault("APP_SECRET", "load-test-secret")
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    tmp.cleanup()
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Generador de payloads de webhook realistas (con la misma forma que los
+que manda Meta) para los benchmarks y el test de carga.
+"""
+import itertools
+import json
+import random
+import time
+
+KINDS = ("text", "button_reply", "list_reply", "location", "audio")
+
+_counter = itertools.count()
+
+
+def _message(kind: str, phone: str, rng: random.Random) -> dict:
+    message = {
+        "from": phone,
+        "id": f"wamid.HBgLNTk4OTI3MTcyNjEVAgASGBQzQUE{next(_counter):020d}",
+        "timestamp": str(int(time.time())),
+        "type": "interactive" if kind in ("button_reply", "list_reply") else kind,
+    }
+
+    if kind == "text":
+        message["text"] = {"body": rng.choice(["hola", "menu", "/start", "2", "sin tomate", "no"])}
+    elif kind == "button_reply":
+        message["context"] = {"from": "15550000000", "id": "wamid.CONTEXT"}
+        message["interactive"] = {
+            "type": "button_reply",
+            "button_reply": {"id": rng.choice(["ver_productos", "mi_carrito", "mis_pedidos"]), "title": "🍕 Ver Productos"},
+        }
+    elif kind == "list_reply":
+        message["context"] = {"from": "15550000000", "id": "wamid.CONTEXT"}
+        message["interactive"] = {
+            "type": "list_reply",
+            "list_reply": {"id": f"prod_{rng.randint(1, 5)}", "title": "Pizza Napolitana", "description": "$450 - Pizzas"},
+        }
+    elif kind == "location":
+        message["location"] = {
+            "latitude": -34.9 + rng.random() / 10,
+            "longitude": -56.16 + rng.random() / 10,
+            "name": "Casa",
+            "address": "Av. 18 de Julio 1234, Montevideo",
+        }
+    elif kind == "audio":
+        message["audio"] = {
+            "id": f"{rng.randint(10**15, 10**16)}",
+            "mime_type": "audio/ogg; codecs=opus",
+            "sha256": "a" * 64,
+            "voice": True,
+        }
+    return message
+
+
+def _status(phone: str, rng: random.Random) -> dict:
+    return {
+        "id": f"wamid.OUT{next(_counter):020d}",
+        "status": rng.choice(["sent", "delivered", "read"]),
+        "timestamp": str(int(time.time())),
+        "recipient_id": phone,
+        "conversation": {"id": "c0ffee", "origin": {"type": "service"}},
+        "pricing": {"billable": True, "pricing_model": "CBP", "category": "service"},
+    }
+
+
+def webhook_payload(
+    messages: int = 1,
+    statuses: int = 0,
+    entries: int = 1,
+    kinds=KINDS,
+    phones=None,
+    seed: int = 0,
+) -> dict:
+    """Arma un payload con `messages` mensajes y `statuses` status repartidos en `entries` entradas"""
+    rng = random.Random(seed)
+    phones = phones or [f"5989{rng.randint(1000000, 9999999)}" for _ in range(max(1, messages + statuses))]
+
+    entry_list = []
+    for e in range(entries):
+        entry_messages = [
+            _message(rng.choice(kinds), rng.choice(phones), rng)
+            for _ in range(messages // entries + (e < messages % entries))
+        ]
+        entry_statuses = [
+            _status(rng.choice(phones), rng)
+            for _ in range(statuses // entries + (e < statuses % entries))
+        ]
+
+        value = {
+            "messaging_product": "whatsapp",
+            "metadata": {"display_phone_number": "15550000000", "phone_number_id": "123456789012345"},
+        }
+        if entry_messages:
+            value["contacts"] = [{"profile": {"name": "Cliente"}, "wa_id": m["from"]} for m in entry_messages]
+            value["messages"] = entry_messages
+        if entry_statuses:
+            value["statuses"] = entry_statuses
+
+        entry_list.append({
+            "id": "102290129340398",
+            "changes": [{"value": value, "field": "messages"}],
+        })
+
+    return {"object": "whatsapp_business_account", "entry": entry_list}
+
+
+def webhook_body(**kwargs) -> bytes:
+    """Igual que webhook_payload pero ya serializado, como llega por HTTP"""
+    return json.dumps(webhook_payload(**kwargs)).encode()
@@ -1,84 +1,87 @@
-from functools import wraps
-from typing import Any, Optional, Dict, Callable
-import inspect
+import logging
+from typing import Any, Optional, Dict
 from datetime import datetime
+from shared.flow import Flow, IDLE
+from shared.log import get_logger, log_event
+from shared.router import register_function, registered_commands
+
+logger = get_logger("chat")
+
 
 class Chat:
     def __init__(self):
         self.function_graph: Dict[str, Dict] = {}
         self.user_phone: str = ""
-        self.waiting_for: Optional[Callable] = None
+        # Id del estado del flujo en el que está la conversación (ver CHAT_FLOW)
+        self.waiting_for: int = IDLE
         self.conversation_data: Dict[str, Any] = {}
-    
-    def register_function(self, command: str):
-        """Decorador para registrar comandos del bot."""
-        def decorator(func):
-            @wraps(func)
-            def wrapper(*args, **kwargs):
-                return func(*args, **kwargs)
-            
-            self.function_graph[command] = {
-                'function': wrapper,
+
+        # Registrar los comandos marcados con @register_function
+        for name, commands in registered_commands(type(self)).items():
+            func = getattr(type(self), name)
+            self.function_graph[commands[0]] = {
+                'function': getattr(self, name),
                 'name': func.__name__,
                 'doc': func.__doc__,
-                'command': command
+                'command': commands[0],
+                'aliases': commands[1:],
             }
-            
-            return wrapper
-        return decorator
-    
-    def set_waiting_for(self, func: Callable, **context_data):
+
+        # Los comandos (con sus alias y errores de tipeo) los resuelve el
+        # CommandRouter que arma el flujo con estos mismos métodos
+        self.flow = CHAT_FLOW.compile(self, reply=print)
+
+    def set_waiting_for(self, state_name: str, **context_data):
         """
-        Setea la función que debe manejar la próxima respuesta del usuario.
+        Setea el estado del flujo que debe manejar la próxima respuesta del usuario.
         Permite guardar datos de contexto adicionales.
         """
-        self.waiting_for = func
-        
+        self.waiting_for = self.flow.id(state_name)
+
         # Guardar datos de contexto
         if context_data:
             self.conversation_data.update(context_data)
-        
-        print(f"⏳ Esperando respuesta para: {func.__name__}")
-    
+
+        log_event(logger, logging.DEBUG, "waiting_for", state=state_name)
+
     def set_conversation_data(self, key: str, value: Any):
         """Guarda datos temporales de la conversación."""
         self.conversation_data[key] = value
-    
+
     def get_conversation_data(self, key: str, default: Any = None) -> Any:
         """Obtiene datos temporales de la conversación."""
         return self.conversation_data.get(key, default)
-    
+
     def clear_conversation_data(self):
         """Limpia los datos temporales de la conversación."""
         self.conversation_data = {}
-    
+
     def reset_conversation(self):
         """Resetea la conversación."""
-        self.waiting_for = None
+        self.waiting_for = IDLE
         self.conversation_data = {}
         print("✅ Conversación reseteada.")
-    
+
     def is_waiting_response(self) -> bool:
         """Verifica si el bot está esperando una respuesta."""
-        return self.waiting_for is not None
-    
-    def get_waiting_function(self) -> Optional[Callable]:
-        """Obtiene la función que está esperando respuesta."""
-        return self.waiting_for
-    
+        return self.waiting_for != IDLE
+
+    def get_waiting_state(self) -> Optional[str]:
+        """Obtiene el nombre del estado que está esperando respuesta."""
+        return self.flow.names[self.waiting_for] if self.is_waiting_response() else None
+
     def print_state(self):
         """Imprime el estado actual."""
         print(f"\n{'='*60}")
         print("ESTADO DE LA CONVERSACIÓN")
         print(f"{'='*60}")
-        waiting = self.waiting_for
-        print(f"Esperando respuesta: {waiting.__name__ if waiting else 'No'}")
+        print(f"Esperando respuesta: {self.get_waiting_state() or 'No'}")
         print(f"Datos de conversación: {self.conversation_data}")
         print(f"{'='*60}\n")
 
     # ==================== FUNCIONES DEL BOT PARA MANEJAR LA CONVERSACIÓN ====================
-    
-    @register_function('/ayuda')
+
+    @register_function('/ayuda', 'ayuda', 'help')
     def funcion_0_ayuda(self):
         """Inicia la conversación con opciones."""
         # Aqui ofrecer ayuda al usuario
@@ -88,84 +91,97 @@ class Chat:
         /ayuda - Mostrar este mensaje de ayuda
         """
         print(f"send_message_to_user: {mensaje}") # Aqui enviar el mensaje al usuario por whatsapp
-        
-        self.set_waiting_for(self.funcion_1_bienvenida)
 
+        self.set_waiting_for("ayuda")
 
-    @register_function('/iniciar')
-    def funcion_1_bienvenida(self):
+
+    @register_function('/iniciar', '/start', 'hola', 'menu', 'inicio')
+    def funcion_1_bienvenida(self, message_type: str = "text", mensaje: str = ""):
         """Inicia la conversación con opciones."""
-        bot.clear_conversation_data()
-        
+        self.clear_conversation_data()
+
         mensaje = """
         🤖 ¡Bienvenido! ¿Qué deseas hacer?
-        
+
         1️⃣ Agregar producto
         2️⃣ Consultar stock
         3️⃣ Ver historial
-        
+
         Por favor responde con el número de tu opción (1, 2 o 3)
         """
         print(mensaje) # Aqui enviar el mensaje al usuario por whatsapp
-        
-        # Setear que la próxima respuesta debe ser manejada por funcion_2
-        bot.set_waiting_for(self.funcion_2_elegir_opcion)
-
-
-    def funcion_2_elegir_opcion(self, mensaje: str):
-        """Recibe la opción del usuario y valida."""
-        opcion = mensaje.strip()
-        
-        # Validar que sea una opción válida
-        if opcion in ['1', '2', '3']:
-            bot.set_conversation_data('opcion_elegida', opcion)
-            
-            # Ir a la función 3 con la opción elegida
-            self.funcion_3_responder(opcion)
+
+        # Setear que la próxima respuesta debe ser manejada por el estado "elegir_opcion"
+        self.set_waiting_for("elegir_opcion")
+
+
+    # Las opciones válidas (1, 2, 3) y la vuelta a la bienvenida si la
+    # opción es inválida están declaradas en CHAT_FLOW ("elegir_opcion")
+
+    def funcion_3_agregar_producto(self):
+        """Opción 1: agregar producto."""
+        self.set_conversation_data('opcion_elegida', '1')
+        # Implementar logica de la opción
+        self.set_waiting_for("idle")
+
+    def funcion_3_consultar_stock(self):
+        """Opción 2: consultar stock."""
+        self.set_conversation_data('opcion_elegida', '2')
+        # Implementar logica de la opción
+        self.set_waiting_for("idle")
+
+    def funcion_3_ver_historial(self):
+        """Opción 3: ver historial."""
+        self.set_conversation_data('opcion_elegida', '3')
+        # Implementar logica de la opción
+        self.set_waiting_for("idle")
+
+    def comando_no_reconocido(self, message_type: str, mensaje: str):
+        """Mensaje que no coincide con ningún comando (ni alias ni parecido)."""
+        # Aqui encontrar forma de procesar los parametros (pueden usar function_call de los LLMs para extraer parametros)
+        if mensaje.startswith('/'):
+            print("❌ Comando no reconocido. Usa /ayuda para ver comandos disponibles.")
         else:
-            # Opción inválida, volver a la función 1
-            print("❌ Opción inválida. Intenta de nuevo.")
-            self.funcion_1_bienvenida()
-
-
-    def funcion_3_responder(opcion: str):
-        """Responde según la opción elegida."""
-        
-        # Implementar logica según la opción
-        if opcion == '1':
-            pass
-        
-        elif opcion == '2':
-            pass
-        
-        elif opcion == '3':
-            pass
-        
+            print("❌ Por favor usa un comando. Escribe /ayuda para ver opciones.")
+
     def process_message(self, mensaje: str):
         """
         Procesa un mensaje del usuario.
         Esta función simula recibir mensajes de WhatsApp.
         """
-        
-        # Si estamos esperando una respuesta, ejecutar la función en espera
-        if self.is_waiting_response():
-            waiting_func = self.get_waiting_function()
-            if waiting_func:
-                # Aqui encontrar forma de procesar los parametros (pueden usar function_call de los LLMs para extraer parametros)
-                waiting_func(mensaje)
-                return
-        
-        # Si es un comando
-        if mensaje.startswith('/'):
-            comando = mensaje.split()[0]  # Tomar solo el comando sin argumentos
-            if comando in self.function_graph:
-                # Aqui encontrar forma de procesar los parametros (pueden usar function_call de los LLMs para extraer parametros)
-                self.function_graph[comando]['function'](mensaje)
-            else:
-                print("❌ Comando no reconocido. Usa /ayuda para ver comandos disponibles.")
-        else:
-            print("❌ Por favor usa un comando. Escribe /ayuda para ver opciones.")
-            
-            
+        # El estado actual (comandos si no espera nada, o la respuesta
+        # que se está esperando) decide qué función maneja el mensaje.
+        # Aqui encontrar forma de procesar los parametros (pueden usar function_call de los LLMs para extraer parametros)
+        self.flow.dispatch(self.waiting_for, "text", mensaje)
+
+
+# ============================================================
+# FLUJO DE LA CONVERSACIÓN
+# ============================================================
+
+CHAT_FLOW = Flow()
+
+CHAT_FLOW.state(
+    "idle",
+    commands=True,
+    fallback="comando_no_reconocido",
+)
+
+# Después de /ayuda, cualquier respuesta lleva a la bienvenida
+CHAT_FLOW.state("ayuda", handler="funcion_1_bienvenida")
+
+CHAT_FLOW.state(
+    "elegir_opcion",
+    choices={
+        '1': "funcion_3_agregar_producto",
+        '2': "funcion_3_consultar_stock",
+        '3': "funcion_3_ver_historial",
+    },
+    normalize=True,
+    invalid_reply="❌ Opción inválida. Intenta de nuevo.",
+    on_invalid="funcion_1_bienvenida",
+)
+
+
 # Crear instancia del bot
-bot = Chat()
\ No newline at end of file
+bot = Chat()
@@ -1,181 +1,359 @@
-from services.whatsapp_service import WhatsAppService
-from typing import Dict, Callable, Any
+import time
+from shared.session_store import Session, SessionStore, MemorySessionStore
+from shared.flow import Flow, run_handler
+from shared.router import register_function
+from services.catalog import Catalog
+from services.extraction import OrderExtractor
+from services.search import ProductSearch
+from services.orders import LineItem, OrderStore
+from services.branches import BranchIndex
+from services.templates import TextTemplates, CatalogTemplates, button_template, list_row
+from typing import Any, Optional
 
-whatsapp = WhatsAppService()
+# ============================================================
+# FLUJO DE LA CONVERSACIÓN
+# ============================================================
+# Cada estado declara qué tipo de mensaje espera y a qué método va.
+# Se compila una sola vez por controlador (ver shared/flow.py).
+# Los comandos de texto ("hola", "/start", "menú", "cancelar", ...) se
+# declaran en cada método con @register_function (ver shared/router.py)
+# y valen en todos los estados: siempre hay forma de salir de un paso.
+# Los estados que esperan un botón o una lista pasan el texto a "idle",
+# así un pedido escrito ("2 napolitanas") se entiende en cualquier momento.
 
-# Enviar un mensaje simple
-whatsapp.send_text_message(
-    phone_number="59892717261",
-    text="¡Hola! Tu pedido está listo 🍕"
+FLOW = Flow(commands=True)
+
+FLOW.state(
+    "idle",
+    expects=("text",),
+    fallback="handle_free_text",
+)
+
+FLOW.state(
+    "menu",
+    expects=("interactive",),
+    choices={
+        "ver_productos": "show_products_list",
+        "mi_carrito": "show_cart",
+        "mis_pedidos": "show_orders",
+    },
+    exit_to_idle=True,
+    invalid_reply="❌ Por favor, selecciona una opción del menú.",
+    on_invalid="show_welcome_menu",
+)
+
+FLOW.state(
+    "cart",
+    expects=("interactive",),
+    choices={
+        "confirmar_pedido": "place_order",
+        "vaciar_carrito": "clear_cart",
+        "ver_productos": "show_products_list",
+    },
+    exit_to_idle=True,
+    invalid_reply="❌ Por favor, selecciona una opción del carrito.",
+    on_invalid="show_welcome_menu",
+)
+
+FLOW.state(
+    "category",
+    handler="handle_category_selection",
+    expects=("interactive",),
+    exit_to_idle=True,
+    invalid_reply="❌ Por favor, selecciona una categoría de la lista.",
+    on_invalid="show_products_list",
+)
+
+FLOW.state(
+    "product",
+    handler="handle_product_selection",
+    expects=("interactive",),
+    exit_to_idle=True,
+    invalid_reply="❌ Por favor, selecciona un producto de la lista.",
+    on_invalid="show_products_list",
+)
+
+FLOW.state(
+    "quantity",
+    handler="handle_quantity_input",
+    expects=("text",),
+    invalid_reply="❌ Por favor, envía la cantidad como un número (ej: 2)",
+)
+
+FLOW.state(
+    "details",
+    handler="handle_product_details",
 )
+
+
+# Textos y botones fijos: se serializan una sola vez (ver services/templates.py)
+WELCOME_TEXT = "🤖 ¡Bienvenido a nuestro Restaurante!\n\n¿Qué deseas hacer?"
+WELCOME_BUTTONS = [
+    {"id": "ver_productos", "title": "🍕 Ver Productos"},
+    {"id": "mi_carrito", "title": "🛒 Mi Carrito"},
+    {"id": "mis_pedidos", "title": "📦 Mis Pedidos"}
+]
+CART_BUTTONS = [
+    {"id": "confirmar_pedido", "title": "✅ Confirmar pedido"},
+    {"id": "vaciar_carrito", "title": "🗑️ Vaciar carrito"},
+    {"id": "ver_productos", "title": "🍕 Seguir pidiendo"}
+]
+
+
 class ChatController:
     """Controlador principal del bot"""
     
-    def __init__(self):
-        self.whatsapp = WhatsAppService()
+    def __init__(
+        self,
+        whatsapp,
+        catalog: Catalog,
+        orders: OrderStore,
+        branches: BranchIndex,
+        sessions: SessionStore = None,
+    ):
+        # Todo lo que hace I/O (envíos, bases, archivos) se recibe ya creado:
+        # lo arma el lifespan de main.py, así importar o crear el
+        # controlador no abre conexiones ni archivos.
+        
+        # Cualquier objeto con send_text_message / send_button_message /
+        # send_list_message / send_template. En el webhook se pasa la OutboundQueue, así los
+        # handlers encolan y vuelven enseguida en vez de esperar a la Graph API.
+        self.whatsapp = whatsapp
+        
+        # Productos en memoria (indexados por id y por categoría)
+        self.catalog = catalog
+        
+        # Carritos y pedidos (en memoria, se escriben a disco en segundo plano)
+        self.orders = orders
+        
+        # Sucursales y zonas de entrega (para responder a una ubicación)
+        self.branches = branches
+        
+        # Almacena la sesión de cada usuario por su número de teléfono
+        # (con tope de memoria: las sesiones menos usadas se desalojan)
+        self.sessions = sessions or MemorySessionStore()
+        
+        # Mensajes fijos y páginas del catálogo ya serializados (las páginas
+        # se arman en warm() o la primera vez que se piden)
+        self.texts = TextTemplates()
+        self.welcome_menu = button_template(WELCOME_TEXT, WELCOME_BUTTONS)
+        self.catalog_pages = CatalogTemplates(self.catalog)
+        
+        # Pedidos escritos en texto libre ("2 napolitanas sin tomate") y
+        # búsqueda de productos por nombre ("muzza")
+        self.extractor = OrderExtractor(self.catalog)
+        self.search = ProductSearch(self.catalog)
         
-        # Almacena el estado de cada usuario por su número de teléfono
-        # Estructura: {phone_number: {waiting_for: función, data: {}}}
-        self.user_states: Dict[str, Dict[str, Any]] = {}
+        # Tablas de despacho del flujo, resueltas contra este controlador
+        self.flow = FLOW.compile(self, reply=self.send_static_text)
     
-    def get_user_state(self, phone_number: str) -> Dict[str, Any]:
+    def warm(self):
+        """Arma de antemano las páginas del catálogo y los textos fijos del flujo"""
+        self.catalog_pages.build()
+        self.extractor.build()
+        self.search.build()
+        for text in self.flow.invalid_replies:
+            if text is not None:
+                self.texts.get(text)
+    
+    def get_user_state(self, phone_number: str) -> Session:
         """Obtiene o crea el estado de un usuario"""
-        if phone_number not in self.user_states:
-            self.user_states[phone_number] = {
-                "waiting_for": None,
-                "data": {}
-            }
-        return self.user_states[phone_number]
-    
-    def set_waiting_for(self, phone_number: str, function: Callable):
-        """Define qué función debe manejar la próxima respuesta del usuario"""
+        return self.sessions.get(phone_number)
+    
+    def set_waiting_for(self, phone_number: str, state_name: str):
+        """Define en qué estado del flujo queda el usuario (qué respuesta esperamos)"""
         state = self.get_user_state(phone_number)
-        state["waiting_for"] = function
+        state.waiting_for = self.flow.id(state_name)
     
-    def process_message(self, phone_number: str, message_type: str, content: Any):
+    def process_message(self, phone_number: str, message_type: str, content: Any) -> Optional[str]:
         """
         Procesa un mensaje entrante.
         Este es el PUNTO DE ENTRADA principal.
+        Devuelve el nombre del handler que lo manejó (None si fue inválido).
         """
         state = self.get_user_state(phone_number)
         
-        # Si el usuario está esperando una respuesta específica
-        if state["waiting_for"]:
-            waiting_func = state["waiting_for"]
-            waiting_func(phone_number, message_type, content)
+        # Una ubicación se contesta en cualquier momento de la conversación
+        if message_type == "location" and content is not None:
+            return run_handler(self.handle_location, phone_number, content)
         
-        # Si es un mensaje nuevo o un comando
-        elif message_type == "text":
-            text = content.lower().strip()
-            
-            if text in ["/start", "/iniciar", "hola", "menu"]:
-                self.show_welcome_menu(phone_number)
-            else:
-                # Si no entiende el mensaje, mostrar ayuda
-                self.whatsapp.send_text_message(
-                    phone_number,
-                    "❌ No entendí tu mensaje.\n\nEscribe /start para ver el menú."
-                )
+        # El estado actual decide qué método maneja el mensaje
+        return self.flow.dispatch(state.waiting_for, message_type, content, phone_number)
     
-    # ============================================================
-    # FUNCIONES DE CONVERSACIÓN
-    # ============================================================
+    def send_static_text(self, phone_number: str, text: str):
+        """Envía un texto fijo (del código) usando su payload pre-serializado"""
+        self.whatsapp.send_template(phone_number, self.texts.get(text))
     
-    def show_welcome_menu(self, phone_number: str):
-        """Muestra el menú principal"""
-        buttons = [
-            {"id": "ver_productos", "title": "🍕 Ver Productos"},
-            {"id": "mi_carrito", "title": "🛒 Mi Carrito"},
-            {"id": "mis_pedidos", "title": "📦 Mis Pedidos"}
-        ]
+    def handle_free_text(self, phone_number: str, message_type: str, content: Any):
+        """
+        Texto que no es ningún comando: si es un pedido ("2 napolitanas sin
+        tomate, una coca") se agrega directo al carrito, sin pasar por las
+        listas de categorías, productos, cantidad y aclaraciones. Si no,
+        se busca como nombre de producto ("muzza") y se muestran los
+        que coinciden.
+        """
+        items, unmatched = self.extractor.extract(content)
+        if not items:
+            if not self.show_search_results(phone_number, content):
+                self.handle_unknown_message(phone_number, message_type, content)
+            return
         
-        self.whatsapp.send_button_message(
+        lines = []
+        for item in items:
+            self.orders.add_item(phone_number, item.product, item.quantity, item.details)
+            lines.append(format_line_item(LineItem(
+                item.product.id, item.product.name, item.product.price, item.quantity, item.details
+            )))
+        text = "✅ Agregué a tu carrito:\n\n" + "\n".join(lines)
+        if unmatched:
+            text += "\n\n⚠️ No encontré: " + ", ".join(unmatched)
+        text += f"\n\nTotal del carrito: ${self.orders.cart_total(phone_number)}"
+        self.whatsapp.send_button_message(phone_number, text, CART_BUTTONS)
+        
+        self.set_waiting_for(phone_number, "cart")
+    
+    def show_search_results(self, phone_number: str, query: str) -> bool:
+        """Muestra como lista los productos que coinciden con `query`. False si no hay ninguno."""
+        results = self.search.search(query)
+        if not results:
+            return False
+        
+        rows = [list_row(p.id, p.name, f"${p.price} - {p.category}") for p, _ in results]
+        self.whatsapp.send_list_message(
             phone_number,
-            "🤖 ¡Bienvenido a nuestro Restaurante!\n\n¿Qué deseas hacer?",
-            buttons
+            f"🔎 Esto encontré para \"{query[:60]}\":",
+            "Ver productos",
+            [{"title": "Resultados", "rows": rows}]
         )
         
-        # Esperamos que el usuario presione un botón
-        self.set_waiting_for(phone_number, self.handle_menu_selection)
+        # La elección se maneja igual que en la lista de una categoría
+        self.set_waiting_for(phone_number, "product")
+        return True
     
-    def handle_menu_selection(self, phone_number: str, message_type: str, content: Any):
-        """Maneja la selección del menú principal"""
+    def handle_unknown_message(self, phone_number: str, message_type: str, content: Any):
+        """Texto que no es ningún comando conocido"""
+        # Si no entiende el mensaje, mostrar ayuda
+        self.send_static_text(
+            phone_number,
+            "❌ No entendí tu mensaje.\n\nEscribe /start para ver el menú."
+        )
+    
+    def handle_location(self, phone_number: str, location):
+        """Responde qué sucursal le entrega al cliente y a qué distancia está"""
+        match = self.branches.locate(location.latitude, location.longitude)
+        if match is None:
+            self.send_static_text(phone_number, "📍 Por ahora no tenemos sucursales cargadas.")
+            return
         
-        if message_type != "interactive":
+        if match.delivery is not None:
             self.whatsapp.send_text_message(
                 phone_number,
-                "❌ Por favor, selecciona una opción del menú."
+                f"📍 ¡Llegamos a tu zona!\n\n"
+                f"Te atiende {match.delivery.name} ({match.delivery.address}), "
+                f"a {format_distance(match.delivery_distance_m)}."
             )
-            self.show_welcome_menu(phone_number)
-            return
+        else:
+            self.whatsapp.send_text_message(
+                phone_number,
+                f"😕 Todavía no hacemos envíos a tu zona.\n\n"
+                f"La sucursal más cercana es {match.nearest.name} ({match.nearest.address}), "
+                f"a {format_distance(match.distance_m)}: puedes retirar tu pedido ahí."
+            )
+    
+    # ============================================================
+    # FUNCIONES DE CONVERSACIÓN
+    # ============================================================
+    
+    @register_function("/start", "/iniciar", "/inicio", "hola", "buenas", "menu", "inicio", "empezar")
+    def show_welcome_menu(self, phone_number: str):
+        """Muestra el menú principal"""
+        self.whatsapp.send_template(phone_number, self.welcome_menu)
         
-        button_id = content
+        # Esperamos que el usuario presione un botón
+        self.set_waiting_for(phone_number, "menu")
+    
+    @register_function("/cancelar", "cancelar", "anular")
+    def cancel(self, phone_number: str):
+        """Abandona el paso en el que estaba el usuario (p. ej. la cantidad) y vuelve a idle"""
+        state = self.get_user_state(phone_number)
+        state.data = {}
+        self.send_static_text(
+            phone_number,
+            "👌 Listo, cancelado.\n\nEscribe lo que quieras pedir o /start para ver el menú."
+        )
+        self.set_waiting_for(phone_number, "idle")
+    
+    @register_function("/productos", "productos", "ver productos", "carta")
+    def show_products_list(self, phone_number: str):
+        """Muestra las categorías del menú (o directo los productos si hay una sola)"""
+        self.catalog_pages.refresh()
         
-        if button_id == "ver_productos":
-            self.show_products_list(phone_number)
+        if len(self.catalog.categories) == 1:
+            self.show_products_page(phone_number, self.catalog.categories[0], 0)
+        else:
+            self.show_categories(phone_number, 0)
+    
+    def show_categories(self, phone_number: str, page: int):
+        """Muestra una página de categorías"""
+        template = self.catalog_pages.category_page(page) or self.catalog_pages.category_page(0)
+        self.whatsapp.send_template(phone_number, template)
         
-        elif button_id == "mi_carrito":
-            self.show_cart(phone_number)
+        self.set_waiting_for(phone_number, "category")
+    
+    def handle_category_selection(self, phone_number: str, message_type: str, content: Any):
+        """Maneja cuando el usuario elige una categoría (o cambia de página)"""
         
-        elif button_id == "mis_pedidos":
-            self.show_orders(phone_number)
+        # Un id que no armamos nosotros (o una respuesta sin id) es una categoría que no existe
+        content = content or ""
+        if content.startswith("cats:") and content[5:].isdecimal():
+            self.show_categories(phone_number, int(content[5:]))
+        elif content.startswith("cat:") and content[4:] in self.catalog.by_category:
+            self.show_products_page(phone_number, content[4:], 0)
+        else:
+            self.send_static_text(phone_number, "❌ Esa categoría ya no está disponible.")
+            self.show_products_list(phone_number)
     
-    def show_products_list(self, phone_number: str):
-        """Muestra la lista de productos"""
-        
-        # AQUÍ debes cargar tus 25 productos desde tu base de datos
-        # Por ahora, ejemplo con datos mock:
-        
-        products = [
-            {"id": "prod_1", "name": "Pizza Napolitana", "price": 450, "category": "Pizzas"},
-            {"id": "prod_2", "name": "Hamburguesa Completa", "price": 380, "category": "Minutas"},
-            {"id": "prod_3", "name": "Coca-Cola 1.5L", "price": 120, "category": "Bebidas"},
-            {"id": "prod_4", "name": "Milanesa con Papas", "price": 420, "category": "Minutas"},
-            {"id": "prod_5", "name": "Pizza Muzzarella", "price": 400, "category": "Pizzas"},
-        ]
-        
-        # Crear secciones para la lista
-        sections = [
-            {
-                "title": "Productos Disponibles",
-                "rows": [
-                    {
-                        "id": p["id"],
-                        "title": p["name"],
-                        "description": f"${p['price']} - {p['category']}"
-                    }
-                    for p in products[:5]  # Mostrar solo 5 por página
-                ]
-            }
-        ]
+    def show_products_page(self, phone_number: str, category: str, page: int):
+        """Muestra una página de productos de una categoría"""
+        template = self.catalog_pages.product_page(category, page)
+        if template is None:
+            self.show_products_list(phone_number)
+            return
         
-        self.whatsapp.send_list_message(
-            phone_number,
-            "🍽️ Selecciona un producto:",
-            "Ver Productos",
-            sections
-        )
+        self.whatsapp.send_template(phone_number, template)
         
-        self.set_waiting_for(phone_number, self.handle_product_selection)
+        self.set_waiting_for(phone_number, "product")
     
     def handle_product_selection(self, phone_number: str, message_type: str, content: Any):
-        """Maneja cuando el usuario selecciona un producto"""
+        """Maneja cuando el usuario selecciona un producto (o cambia de página)"""
         
-        if message_type != "interactive":
-            self.whatsapp.send_text_message(
-                phone_number,
-                "❌ Por favor, selecciona un producto de la lista."
-            )
-            self.show_products_list(phone_number)
+        # Un id que no armamos nosotros (o una respuesta sin id) es un producto que no existe
+        content = content or ""
+        page, separator, category = content[5:].partition(":")
+        if content.startswith("page:") and separator and page.isdecimal():
+            self.show_products_page(phone_number, category, int(page))
             return
         
-        product_id = content
-        
-        # Aquí buscarías el producto en tu base de datos
-        # Por ahora, simulamos:
-        product_name = "Pizza Napolitana"  # Buscar por product_id
+        product = self.catalog.get(content)
+        if product is None:
+            self.send_static_text(phone_number, "❌ Ese producto ya no está disponible.")
+            self.show_products_list(phone_number)
+            return
         
         self.whatsapp.send_text_message(
             phone_number,
-            f"✅ Seleccionaste: {product_name}\n\n¿Cuántas unidades deseas?"
+            f"✅ Seleccionaste: {product.name}\n\n¿Cuántas unidades deseas?"
         )
         
         # Guardamos el producto seleccionado en el estado del usuario
         state = self.get_user_state(phone_number)
-        state["data"]["selected_product"] = product_id
+        state.data["selected_product"] = product.id
         
-        self.set_waiting_for(phone_number, self.handle_quantity_input)
+        self.set_waiting_for(phone_number, "quantity")
     
     def handle_quantity_input(self, phone_number: str, message_type: str, content: Any):
         """Maneja cuando el usuario ingresa la cantidad"""
         
-        if message_type != "text":
-            self.whatsapp.send_text_message(
-                phone_number,
-                "❌ Por favor, envía la cantidad como un número (ej: 2)"
-            )
-            return
-        
         try:
             quantity = int(content)
             if quantity <= 0:
@@ -183,17 +361,17 @@ class ChatController:
             
             # Guardar cantidad en el estado
             state = self.get_user_state(phone_number)
-            state["data"]["quantity"] = quantity
+            state.data["quantity"] = quantity
             
             self.whatsapp.send_text_message(
                 phone_number,
                 f"✅ Cantidad: {quantity}\n\n¿Alguna aclaración? (ej: 'Sin tomate')\n\nResponde NO si no tienes aclaraciones."
             )
             
-            self.set_waiting_for(phone_number, self.handle_product_details)
+            self.set_waiting_for(phone_number, "details")
         
         except ValueError:
-            self.whatsapp.send_text_message(
+            self.send_static_text(
                 phone_number,
                 "❌ Cantidad inválida. Por favor, envía un número mayor a 0."
             )
@@ -204,40 +382,105 @@ class ChatController:
         state = self.get_user_state(phone_number)
         
         if message_type == "text" and content.lower() != "no":
-            state["data"]["details"] = content
+            state.data["details"] = content
         else:
-            state["data"]["details"] = "Sin aclaraciones"
+            state.data["details"] = ""
         
-        # AQUÍ deberías agregar el producto al carrito
-        # Por ahora solo confirmamos:
+        product = self.catalog.get(state.data["selected_product"])
+        if product is None:
+            state.data = {}
+            self.send_static_text(phone_number, "❌ Ese producto ya no está disponible.")
+            self.show_welcome_menu(phone_number)
+            return
+        
+        self.orders.add_item(phone_number, product, state.data["quantity"], state.data["details"])
         
         self.whatsapp.send_text_message(
             phone_number,
             f"✅ Producto agregado al carrito!\n\n"
-            f"Producto: {state['data']['selected_product']}\n"
-            f"Cantidad: {state['data']['quantity']}\n"
-            f"Aclaraciones: {state['data']['details']}\n\n"
+            f"Producto: {product.name}\n"
+            f"Cantidad: {state.data['quantity']}\n"
+            f"Aclaraciones: {state.data['details'] or 'Sin aclaraciones'}\n\n"
             f"¿Qué deseas hacer ahora?"
         )
         
         # Limpiar datos temporales
-        state["data"] = {}
+        state.data = {}
         
         # Volver al menú principal
         self.show_welcome_menu(phone_number)
     
+    @register_function("/carrito", "carrito", "mi carrito")
     def show_cart(self, phone_number: str):
         """Muestra el carrito del usuario"""
-        # IMPLEMENTAR: Mostrar productos en el carrito
-        self.whatsapp.send_text_message(
+        cart = self.orders.cart(phone_number)
+        if not cart:
+            self.send_static_text(
+                phone_number,
+                "🛒 Tu carrito está vacío.\n\nEscribe /start para ver productos."
+            )
+            return
+        
+        lines = [format_line_item(item) for item in cart]
+        self.whatsapp.send_button_message(
             phone_number,
-            "🛒 Tu carrito está vacío.\n\nEscribe /start para ver productos."
+            "🛒 Tu carrito:\n\n" + "\n".join(lines) + f"\n\nTotal: ${self.orders.cart_total(phone_number)}",
+            CART_BUTTONS
         )
+        
+        self.set_waiting_for(phone_number, "cart")
     
-    def show_orders(self, phone_number: str):
-        """Muestra los pedidos del usuario"""
-        # IMPLEMENTAR: Mostrar historial de pedidos
+    def clear_cart(self, phone_number: str):
+        """Vacía el carrito"""
+        self.orders.clear_cart(phone_number)
+        self.send_static_text(phone_number, "🗑️ Vaciamos tu carrito.")
+        self.show_welcome_menu(phone_number)
+    
+    def place_order(self, phone_number: str):
+        """Confirma el carrito como pedido"""
+        order = self.orders.place_order(phone_number)
+        if order is None:
+            self.show_cart(phone_number)
+            return
+        
         self.whatsapp.send_text_message(
             phone_number,
-            "📦 No tienes pedidos aún.\n\nEscribe /start para hacer un pedido."
-        )
\ No newline at end of file
+            f"📦 ¡Pedido #{order.id} confirmado!\n\n"
+            + "\n".join(format_line_item(item) for item in order.items)
+            + f"\n\nTotal: ${order.total}"
+        )
+        self.show_welcome_menu(phone_number)
+    
+    @register_function("/pedidos", "pedidos", "mis pedidos")
+    def show_orders(self, phone_number: str):
+        """Muestra los últimos pedidos del usuario"""
+        orders = self.orders.orders(phone_number)
+        if not orders:
+            self.send_static_text(
+                phone_number,
+                "📦 No tienes pedidos aún.\n\nEscribe /start para hacer un pedido."
+            )
+        else:
+            lines = [
+                f"#{order.id} · {time.strftime('%d/%m %H:%M', time.localtime(order.created_at))}"
+                f" · {sum(item.quantity for item in order.items)} productos · ${order.total}"
+                for order in orders
+            ]
+            self.whatsapp.send_text_message(
+                phone_number,
+                "📦 Tus últimos pedidos:\n\n" + "\n".join(lines) + "\n\nEscribe /start para hacer otro pedido."
+            )
+
+
+def format_distance(meters: float) -> str:
+    """850 → '850 m', 2300 → '2.3 km'"""
+    if meters < 1000:
+        return f"{meters:.0f} m"
+    return f"{meters / 1000:.1f} km"
+
+
+def format_line_item(item) -> str:
+    """'2 x Pizza Napolitana (sin tomate) — $900'"""
+    details = f" ({item.details})" if item.details else ""
+    return f"{item.quantity} x {item.name}{details} — ${item.subtotal}"
+
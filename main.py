@@ -1,14 +1,322 @@
+from contextlib import asynccontextmanager
+from functools import partial
+import asyncio
+import logging
+import msgspec
 from fastapi import FastAPI, HTTPException, Request
-from utils.get_type_message import get_message_type
-
-app = FastAPI()
+from fastapi.responses import JSONResponse, PlainTextResponse
+from shared.webhook import Message, Status, decode_webhook, get_message_type, iter_events, dispatch_events
+from shared.dedup import MessageDeduplicator
+from shared.actors import Mailboxes
+from shared.signature import SignatureError, read_signed_body
+from controllers.chat_controller import ChatController
+from services.whatsapp_service import AsyncWhatsAppService
+from services.outbound_queue import OutboundQueue
+from services.outbox import OutboxJournal
+from services.catalog import Catalog
+from services.orders import OrderStore
+from services.media import MediaDownloader
+from services.branches import BranchIndex
+from services.delivery import DeliveryTracker, STAGES
+from services.worker_pool import WorkerPool, serve_worker
+from shared.log import get_logger, log_event, setup_logging, Timer
+from shared.metrics import REGISTRY, STARTUP_SECONDS, WEBHOOK_SECONDS, WEBHOOK_REJECTED, HANDLER_SECONDS, EVENTS
 
 # ============================================================
 # CONFIGURACIÓN
 # ============================================================
 
-# 🔑 ACCESS_TOKEN: Se usa para TODO
-ACCESS_TOKEN = "EAAPrCUjHBWYBPwPlmMKZBlCio386SlWewHJtjDoehs1exMVwQpcN8lzPJuwFSmhZAgRVCPPCd8k3DQCCDHbMQvy9oXn37HEkO6nOoBivqFF8uOYZAiOnLak807DmVzGkdwwyf90fIZC2sgESjmJpvseVydb00erBZAvDo5kpFqgwdypLg1hZAWZBdj2FBgxGAZDZD"
+# 🔑 ACCESS_TOKEN: Se usa para TODO (ver shared/config.py)
+from shared.config import (
+    ACCESS_TOKEN,
+    APP_SECRET,
+    WEBHOOK_ALLOW_UNSIGNED,
+    WEBHOOK_MAX_BYTES,
+    MEDIA_TYPES,
+    PORT,
+    RELOAD,
+    PREWARM,
+    PREWARM_TIMEOUT,
+    WORKER_PROCESSES,
+    OUTBOUND_RATE_PER_SECOND,
+    OUTBOUND_BURST,
+    OUTBOX_PATH,
+)
+
+logger = get_logger("webhook")
+
+# Clave con la que Meta firma los webhooks (vacía = se rechazan, salvo WEBHOOK_ALLOW_UNSIGNED)
+SECRET = APP_SECRET.encode()
+
+
+# ============================================================
+# CICLO DE VIDA
+# ============================================================
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Crea los recursos compartidos al arrancar y los cierra al apagar.
+    El pool HTTP de WhatsApp vive acá para que todos los requests lo reusen.
+    Los handlers no envían directo: encolan en app.state.outbound y los
+    workers de la cola hacen los envíos en segundo plano. Lo mismo con
+    carritos y pedidos: app.state.orders los escribe a disco en lotes, y
+    los audios y fotos de los clientes: app.state.media los descarga.
+    Cada mensaje saliente se anota en un journal (OUTBOX_PATH) antes de
+    enviarse, así lo que no se llegó a enviar sale al volver a arrancar.
+    app.state.delivery cruza los mensajes enviados con sus webhooks de
+    estado (entregado, leído, fallido). app.state.mailboxes tiene un
+    buzón por cliente activo, así los mensajes de un mismo cliente se
+    procesan de a uno.
+
+    Nada de esto se crea al importar: importar main (en un test, al
+    forkear un worker) no abre conexiones ni archivos. Si PREWARM está
+    activo, después de arrancar se abre el pool HTTP y se arman las
+    páginas del catálogo en segundo plano; /ready contesta 503 hasta
+    que termina.
+
+    Con WORKER_PROCESSES > 1 este proceso no atiende conversaciones:
+    lanza los procesos worker (cada uno con todo lo anterior) y les
+    reparte los eventos por número de teléfono (ver WorkerPool).
+    """
+    timer = Timer()
+    app.state.ready = False
+    app.state.pool = None
+    log_listener = setup_logging()
+    if not SECRET and WEBHOOK_ALLOW_UNSIGNED:
+        log_event(logger, logging.WARNING, "webhook_signature_disabled", hint="solo para desarrollo")
+    elif not SECRET:
+        log_event(logger, logging.ERROR, "webhook_secret_missing", hint="sin APP_SECRET todos los POST se rechazan con 403")
+    try:
+        if WORKER_PROCESSES > 1:
+            async with open_pool(app, timer):
+                yield
+        else:
+            async with open_services(app, timer):
+                yield
+    finally:
+        log_listener.stop()
+
+
+@asynccontextmanager
+async def open_services(app: FastAPI, timer: Timer, shard: tuple = (0, 1)):
+    """
+    Arma todo lo que necesita la conversación en app.state. `shard` es
+    (índice, cantidad) del worker: con varios procesos, cada uno se
+    queda con su parte del límite de envíos, numera los pedidos aparte
+    y tiene su propio journal de salida.
+    """
+    index, count = shard
+    app.state.whatsapp = AsyncWhatsAppService()
+    app.state.delivery = DeliveryTracker()
+    # Cada worker tiene su propio journal (los mensajes de un número salen siempre del mismo)
+    journal = None
+    if OUTBOX_PATH:
+        journal = OutboxJournal(OUTBOX_PATH if count == 1 else f"{OUTBOX_PATH}.{index}")
+    app.state.outbound = OutboundQueue(
+        app.state.whatsapp,
+        rate_per_second=OUTBOUND_RATE_PER_SECOND / count,
+        burst=max(1, OUTBOUND_BURST // count),
+        journal=journal,
+        tracker=app.state.delivery,
+    )
+    app.state.catalog = Catalog()
+    app.state.orders = OrderStore(id_offset=index, id_stride=count)
+    app.state.branches = BranchIndex.from_file()
+    app.state.controller = ChatController(
+        app.state.outbound, catalog=app.state.catalog, orders=app.state.orders, branches=app.state.branches
+    )
+    app.state.dedup = MessageDeduplicator.from_config()
+    app.state.media = MediaDownloader(app.state.whatsapp.client)
+    app.state.mailboxes = Mailboxes(partial(handle_event, app))
+    register_gauges(app)
+    await app.state.outbound.start()
+    await app.state.orders.start()
+    await app.state.media.start()
+    STARTUP_SECONDS.set(timer.seconds(), "lifespan")
+    log_event(logger, logging.INFO, "startup", duration_ms=timer.ms(), prewarm=PREWARM, worker=index)
+
+    if PREWARM:
+        app.state.prewarm = asyncio.create_task(prewarm(app, timer))
+    else:
+        app.state.prewarm = None
+        app.state.ready = True
+    try:
+        yield
+    finally:
+        if app.state.prewarm is not None:
+            app.state.prewarm.cancel()
+            await asyncio.gather(app.state.prewarm, return_exceptions=True)
+        await app.state.mailboxes.stop()
+        await app.state.media.stop()
+        await app.state.orders.stop()
+        await app.state.outbound.stop()
+        await app.state.whatsapp.aclose()
+        app.state.dedup.close()
+        app.state.catalog.close()
+        app.state.orders.close()
+
+
+@asynccontextmanager
+async def open_pool(app: FastAPI, timer: Timer):
+    """
+    Lanza los procesos worker. Las bases compartidas (catálogo, pedidos,
+    de-duplicación) se crean acá antes, para que los workers no corran
+    a crear las tablas o cargar los productos de ejemplo a la vez.
+    /ready contesta 200 cuando todos los workers terminaron su arranque
+    y se conectaron. /metrics de este proceso cubre el webhook y el
+    pool; lo de cada worker (cola, pedidos, entregas) está en /health.
+    """
+    Catalog().close()
+    OrderStore().close()
+    MessageDeduplicator.from_config().close()
+
+    pool = app.state.pool = WorkerPool(run_worker, WORKER_PROCESSES)
+    REGISTRY.gauge_func("bot_ready", "1 cuando terminó el arranque (ver /ready)", lambda: int(app.state.ready))
+    REGISTRY.gauge_func(
+        "bot_worker_connected", "1 si el worker está conectado",
+        lambda: {str(link.index): int(link.connected) for link in pool.links}, labelnames=("worker",),
+    )
+    REGISTRY.gauge_func("bot_worker_backlog", "Frames esperando a que un worker se conecte", pool.backlog)
+    for kind in ("message", "status"):
+        EVENTS.labels(kind)
+    await pool.start()
+    STARTUP_SECONDS.set(timer.seconds(), "lifespan")
+    log_event(logger, logging.INFO, "startup", duration_ms=timer.ms(), workers=WORKER_PROCESSES)
+
+    async def wait_workers():
+        await pool.all_connected.wait()
+        STARTUP_SECONDS.set(timer.seconds(), "total")
+        app.state.ready = True
+        log_event(logger, logging.INFO, "ready", total_ms=timer.ms(), workers=WORKER_PROCESSES)
+
+    waiting = asyncio.create_task(wait_workers())
+    try:
+        yield
+    finally:
+        waiting.cancel()
+        await pool.stop()
+
+
+def run_worker(index: int, count: int, socket_path: str):
+    """Punto de entrada de cada proceso worker (lo lanza WorkerPool)"""
+    asyncio.run(worker_main(index, count, socket_path))
+
+
+async def worker_main(index: int, count: int, socket_path: str):
+    """
+    Un worker arma los mismos servicios que el modo de un solo proceso,
+    termina el pre-warm y recién ahí se conecta al proceso principal a
+    recibir eventos. Cuando el principal cierra el socket, se apaga.
+    """
+    timer = Timer()
+    worker = FastAPI()
+    worker.state.ready = False
+    log_listener = setup_logging()
+    try:
+        async with open_services(worker, timer, shard=(index, count)):
+            if worker.state.prewarm is not None:
+                await worker.state.prewarm
+            await serve_worker(
+                index, socket_path,
+                mailboxes=worker.state.mailboxes,
+                stats=partial(service_stats, worker),
+            )
+    finally:
+        log_listener.stop()
+
+
+async def prewarm(app: FastAPI, startup: Timer):
+    """
+    Deja todo listo antes del primer mensaje: la conexión con la Graph
+    API abierta y las páginas del catálogo y textos fijos ya codificados.
+    Si la Graph API no contesta, se sigue igual (la conexión se abrirá
+    con el primer envío).
+    """
+    timer = Timer()
+    try:
+        await app.state.whatsapp.warm(PREWARM_TIMEOUT)
+    except Exception as e:
+        log_event(logger, logging.WARNING, "prewarm_http_failed", error=f"{type(e).__name__}: {e}")
+    STARTUP_SECONDS.set(timer.seconds(), "prewarm_http")
+
+    step = Timer()
+    app.state.controller.warm()
+    STARTUP_SECONDS.set(step.seconds(), "prewarm_templates")
+
+    STARTUP_SECONDS.set(timer.seconds(), "prewarm")
+    STARTUP_SECONDS.set(startup.seconds(), "total")
+    app.state.ready = True
+    log_event(logger, logging.INFO, "ready", prewarm_ms=timer.ms(), total_ms=startup.ms())
+
+
+def register_gauges(app: FastAPI):
+    """
+    Métricas que se leen de los objetos del lifespan al pedir /metrics.
+    También crea de entrada las series de cada handler, así aparecen en
+    0 antes del primer mensaje.
+    """
+    state = app.state
+    REGISTRY.gauge_func("bot_ready", "1 cuando terminó el arranque (ver /ready)", lambda: int(state.ready))
+    REGISTRY.gauge_func("bot_sessions_live", "Sesiones en memoria", lambda: len(state.controller.sessions))
+    REGISTRY.gauge_func("bot_mailboxes_active", "Clientes con un buzón (y su tarea) abierto", lambda: len(state.mailboxes))
+    REGISTRY.gauge_func("bot_mailbox_depth", "Mensajes esperando en los buzones de los clientes", state.mailboxes.depth)
+    REGISTRY.gauge_func("bot_outbound_queue_depth", "Mensajes esperando en la cola de salida", state.outbound.depth)
+    REGISTRY.gauge_func(
+        "bot_outbound_messages_total", "Mensajes de la cola de salida por resultado",
+        lambda: {
+            "sent": state.outbound.sent, "failed": state.outbound.failed,
+            "dropped": state.outbound.dropped, "retried": state.outbound.retried,
+        },
+        labelnames=("result",), kind="counter",
+    )
+    REGISTRY.gauge_func(
+        "bot_outbound_breaker_open", "1 mientras el circuit breaker frena los envíos",
+        lambda: int(state.outbound.breaker.state != "closed"),
+    )
+    REGISTRY.gauge_func(
+        "bot_outbox_pending", "Mensajes anotados en el journal que todavía no terminaron",
+        lambda: len(state.outbound.journal.pending) if state.outbound.journal is not None else 0,
+    )
+    REGISTRY.gauge_func(
+        "bot_orders_pending_writes", "Carritos y pedidos esperando a escribirse en disco",
+        lambda: len(state.orders.dirty_carts) + len(state.orders.pending_orders),
+    )
+    REGISTRY.gauge_func("bot_media_queue_depth", "Archivos esperando a descargarse", state.media.depth)
+    REGISTRY.gauge_func("bot_dedup_entries", "Ids de mensaje recordados", lambda: len(state.dedup.entries))
+    REGISTRY.gauge_func(
+        "bot_delivery_rate", "Tasa de entrega, lectura y falla por handler (mensajes en el buffer de estados)",
+        lambda: delivery_rates(state.delivery.summary()), labelnames=("handler", "outcome"),
+    )
+    REGISTRY.gauge_func(
+        "bot_delivery_latency_seconds", "p50/p95 de cada etapa de entrega por handler (según Meta)",
+        lambda: delivery_latencies(state.delivery.summary()), labelnames=("handler", "stage", "quantile"),
+    )
+
+    for name in state.controller.flow.handler_names() | {"invalid", "duplicate"}:
+        HANDLER_SECONDS.labels(name)
+    for kind in ("message", "status"):
+        EVENTS.labels(kind)
+
+
+def delivery_rates(summary: dict) -> dict:
+    return {
+        (tag, outcome): entry[f"{outcome}_rate"]
+        for tag, entry in summary.items()
+        for outcome in ("delivered", "read", "failed")
+    }
+
+
+def delivery_latencies(summary: dict) -> dict:
+    return {
+        (tag, stage, quantile): entry[stage][quantile]
+        for tag, entry in summary.items()
+        for stage in STAGES if stage in entry
+        for quantile in ("p50", "p95")
+    }
+
+
+app = FastAPI(lifespan=lifespan)
 
 # ============================================================
 # ENDPOINTS
@@ -28,7 +336,9 @@ def root():
             "GET /": "Página principal",
             "GET /welcome": "Bienvenida alternativa",
             "GET /whatsapp": "Verificación del webhook",
-            "POST /whatsapp": "Recepción de mensajes"
+            "POST /whatsapp": "Recepción de mensajes",
+            "GET /ready": "Listo para recibir tráfico (después del pre-warm)",
+            "GET /metrics": "Métricas (Prometheus)"
         }
     }
 
@@ -56,39 +366,27 @@ async def verify_token(request: Request):
         challenge = query_params.get("hub.challenge")
         mode = query_params.get("hub.mode")
         
-        # Logging para debugging
-        print("\n" + "=" * 60)
-        print("🔍 VERIFICACIÓN DE WEBHOOK")
-        print("=" * 60)
-        print(f"Mode: {mode}")
-        print(f"Challenge: {challenge}")
-        
-        # Solo mostrar los primeros 30 caracteres del token por seguridad
-        if verify_token:
-            print(f"Token recibido: {verify_token[:30]}...")
-            print(f"Token esperado: {ACCESS_TOKEN[:30]}...")
-            print(f"¿Coinciden?: {verify_token == ACCESS_TOKEN}")
-        else:
-            print("Token recibido: None")
-        
-        print("=" * 60 + "\n")
+        # Nunca se loguea el token, solo si coincide
+        matches = verify_token == ACCESS_TOKEN
+        log_event(
+            logger, logging.INFO, "webhook_verification",
+            mode=mode, challenge=challenge, token_present=bool(verify_token), token_matches=matches
+        )
         
         # Validación
         if not verify_token or not challenge:
-            print("❌ Faltan parámetros")
+            log_event(logger, logging.WARNING, "webhook_verification_missing_params")
             raise HTTPException(
                 status_code=400,
                 detail="Faltan parámetros: hub.verify_token y hub.challenge son requeridos"
             )
         
         # Comparar el token con ACCESS_TOKEN
-        if verify_token == ACCESS_TOKEN:
-            print("✅ Token verificado correctamente")
-            print(f"📤 Devolviendo challenge: {challenge}\n")
+        if matches:
             # Devolver el challenge como entero
             return int(challenge)
         else:
-            print("❌ Token de verificación inválido")
+            log_event(logger, logging.WARNING, "webhook_verification_invalid_token")
             raise HTTPException(
                 status_code=403,
                 detail="Token de verificación inválido"
@@ -99,14 +397,14 @@ async def verify_token(request: Request):
     
     except ValueError as e:
         # Error al convertir challenge a int
-        print(f"❌ Error: challenge no es un número válido: {e}")
+        log_event(logger, logging.WARNING, "webhook_verification_invalid_challenge", error=str(e))
         raise HTTPException(
             status_code=400,
             detail=f"Challenge inválido: {e}"
         )
     
     except Exception as e:
-        print(f"❌ Error inesperado: {e}")
+        logger.exception("webhook_verification_error")
         raise HTTPException(
             status_code=500,
             detail=f"Error interno: {str(e)}"
@@ -117,83 +415,173 @@ async def verify_token(request: Request):
 async def received_message(request: Request):
     """
     Recibe TODOS los mensajes de WhatsApp.
+
+    Primero se verifica que el POST venga de Meta (X-Hub-Signature-256,
+    un HMAC del body con APP_SECRET): el HMAC se calcula mientras se lee
+    el body y, si no coincide, se contesta 403 sin decodificar nada. Así
+    el tráfico falso cuesta leer y hashear, no parsear ni despachar.
+
+    Un mismo POST puede traer varias entradas, cambios, mensajes y
+    status: se recorren todos y se procesan en paralelo entre clientes
+    distintos, respetando el orden de cada cliente (cada uno tiene su
+    buzón, ver shared/actors.py). Con varios procesos
+    worker, cada evento se reenvía al worker dueño de ese número.
     """
+    timer = Timer()
     try:
-        # Leer el body
-        body = await request.json()
-        
-        # Verificar estructura básica
-        if "entry" not in body:
-            print("⚠️ Webhook sin 'entry'")
-            return "EVENT_RECEIVED"
-        
-        entry = body.get("entry", [])
-        if not entry:
+        # Leer el body verificando la firma, y decodificar esos mismos bytes
+        length = request.headers.get("content-length")
+        try:
+            body = await read_signed_body(
+                request.stream(),
+                request.headers.get("x-hub-signature-256"),
+                SECRET,
+                WEBHOOK_MAX_BYTES,
+                int(length) if length and length.isdigit() else None,
+                WEBHOOK_ALLOW_UNSIGNED,
+            )
+        except SignatureError as e:
+            WEBHOOK_REJECTED.inc(e.reason)
+            log_event(logger, logging.WARNING, "webhook_rejected", reason=e.reason, client=request.client.host if request.client else "")
+            if e.reason == "too_large":
+                return PlainTextResponse("Payload Too Large", status_code=413)
+            return PlainTextResponse("Forbidden", status_code=403)
+        try:
+            payload = decode_webhook(body)
+        except msgspec.MsgspecError as e:
+            log_event(logger, logging.WARNING, "webhook_invalid_body", error=str(e))
             return "EVENT_RECEIVED"
-        
-        changes = entry[0].get("changes", [])
-        if not changes:
+
+        # Verificar estructura básica
+        if not payload.entry:
+            log_event(logger, logging.WARNING, "webhook_without_entry")
             return "EVENT_RECEIVED"
-        
-        value = changes[0].get("value", {})
-        
-        # Verificar si hay mensajes
-        if "messages" in value and len(value["messages"]) > 0:
-            message = value["messages"][0]
-            
-            # Extraer información del mensaje
-            type_message, content = get_message_type(message)
-            number = message.get("from")
-            message_id = message.get("id")
-            
-            # Logging
-            print("\n" + "=" * 60)
-            print("📱 MENSAJE RECIBIDO")
-            print("=" * 60)
-            print(f"De: {number}")
-            print(f"ID: {message_id}")
-            print(f"Tipo: {type_message}")
-            print(f"Contenido: {content}")
-            print("=" * 60 + "\n")
-            
-            # AQUÍ PUEDES AGREGAR TU LÓGICA
-            # Ejemplo:
-            # bot.process_message(number, type_message, content)
+
+        pool = request.app.state.pool
+        if pool is not None:
+            items = list(iter_events(payload))
+            for kind, _, _ in items:
+                EVENTS.inc(kind)
+            await pool.drain(pool.forward(body, items))
+            events = len(items)
         else:
-            # Webhook de estado (mensaje entregado, leído, etc.)
-            print("ℹ️ Webhook de estado recibido (no es un mensaje nuevo)")
-        
+            events = await dispatch_events(iter_events(payload), request.app.state.mailboxes)
+        WEBHOOK_SECONDS.observe(timer.seconds())
+        log_event(logger, logging.DEBUG, "webhook_handled", events=events, duration_ms=timer.ms())
+
         # SIEMPRE retornar esto
         return "EVENT_RECEIVED"
-    
-    except KeyError as e:
-        print(f"❌ Error de estructura JSON: Falta clave {e}")
-        return "EVENT_RECEIVED"
-    
-    except Exception as e:
-        print(f"❌ Error al procesar mensaje: {e}")
-        import traceback
-        traceback.print_exc()
+
+    except Exception:
+        logger.exception("webhook_error")
         return "EVENT_RECEIVED"
 
 
+async def handle_event(app: FastAPI, event):
+    kind, value, item = event
+    EVENTS.inc(kind)
+    if kind == "message":
+        handle_message(app, item)
+    else:
+        handle_status(app, item)
+
+
+def handle_message(app: FastAPI, message: Message):
+    """Procesa un mensaje entrante de un cliente"""
+    timer = Timer()
+    number = message.from_
+    message_id = message.id
+
+    # Meta reintenta el webhook si tardamos: un mismo id no se procesa dos veces
+    if message_id and app.state.dedup.seen(message_id):
+        HANDLER_SECONDS.observe(timer.seconds(), "duplicate")
+        log_event(logger, logging.INFO, "message_duplicate", sender=number, message_id=message_id)
+        return
+
+    # Extraer información del mensaje
+    type_message, content = get_message_type(message)
+
+    # Audios, fotos y documentos se descargan en segundo plano
+    if type_message in MEDIA_TYPES and content is not None:
+        app.state.media.submit(number, message_id, type_message, content)
+
+    handler = app.state.controller.process_message(number, type_message, content)
+    HANDLER_SECONDS.observe(timer.seconds(), handler or "invalid")
+
+    log_event(
+        logger, logging.INFO, "message_received",
+        sender=number, message_id=message_id, type=type_message,
+        handler=handler, duration_ms=timer.ms()
+    )
+
+
+def handle_status(app: FastAPI, status: Status):
+    """Procesa un webhook de estado (mensaje enviado, entregado, leído, etc.)"""
+    matched = app.state.delivery.on_status(status)
+    log_event(
+        logger, logging.INFO, "status_received",
+        recipient=status.recipient_id, message_id=status.id, status=status.status, matched=matched
+    )
+
+
 # ============================================================
 # HEALTH CHECK (Útil para Render)
 # ============================================================
 
 @app.get("/health")
-def health_check():
+async def health_check(request: Request):
     """
     Endpoint para verificar que el servidor está vivo.
     Render usa esto para saber si tu app está funcionando.
+    También informa el estado de la cola de salida (profundidad y
+    mensajes enviados por segundo) para dimensionar los workers.
+    Con varios procesos worker, se informa lo mismo por cada worker.
     """
-    return {
+    health = {
         "status": "healthy",
         "service": "WhatsApp Bot",
-        "version": "1.0.0"
+        "version": "1.0.0",
+    }
+    pool = request.app.state.pool
+    if pool is not None:
+        health["workers"] = await pool.stats()
+    else:
+        health.update(service_stats(request.app))
+    return health
+
+
+def service_stats(app: FastAPI) -> dict:
+    """Estadísticas de los servicios de este proceso"""
+    return {
+        "outbound": app.state.outbound.stats(),
+        "dedup": app.state.dedup.stats(),
+        "sessions": app.state.controller.sessions.stats(),
+        "search": app.state.controller.search.stats(),
+        "mailboxes": app.state.mailboxes.stats(),
+        "orders": app.state.orders.stats(),
+        "media": app.state.media.stats(),
+        "delivery": app.state.delivery.stats()
     }
 
 
+@app.get("/ready")
+def readiness_check(request: Request):
+    """
+    Readiness: 200 recién cuando terminó el pre-warm (pool HTTP abierto
+    y catálogo listo); 503 mientras tanto. /health es solo "el proceso
+    está vivo".
+    """
+    if request.app.state.ready:
+        return {"ready": True}
+    return JSONResponse({"ready": False}, status_code=503)
+
+
+@app.get("/metrics")
+def metrics():
+    """Métricas en formato de texto de Prometheus"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 # ============================================================
 # EJECUTAR SERVIDOR
 # ============================================================
@@ -207,12 +595,14 @@ if __name__ == "__main__":
     print(f"✅ ACCESS_TOKEN configurado")
     print(f"📝 Primeros 30 caracteres: {ACCESS_TOKEN[:30]}...")
     print("=" * 60)
-    print("🌐 Servidor: http://0.0.0.0:8000")
-    print("📚 Documentación automática: http://0.0.0.0:8000/docs")
+    print(f"🌐 Servidor: http://0.0.0.0:{PORT}")
+    print(f"📚 Documentación automática: http://0.0.0.0:{PORT}/docs")
     print("=" * 60)
     print("\n⚠️  IMPORTANTE para Meta for Developers:")
     print("   Callback URL: https://tu-dominio.onrender.com/whatsapp")
     print("   Verify Token: [Pega tu ACCESS_TOKEN completo]")
     print("=" * 60 + "\n")
     
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    # reload solo en desarrollo (RELOAD=1): en producción cada reinicio y
+    # cada worker pagaría el watcher de archivos
+    uvicorn.run("main:app", host="0.0.0.0", port=PORT, reload=RELOAD)
\ No newline at end of file
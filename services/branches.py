@@ -0,0 +1,233 @@
+import json
+import math
+import os
+import sys
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from shared.config import BRANCHES_PATH, BRANCH_GRID_DEGREES
+
+EARTH_RADIUS_M = 6_371_000
+NO_ZONES = np.empty(0, dtype=np.int32)
+
+# Sucursales de ejemplo (se usan si no existe BRANCHES_PATH).
+# Las zonas son polígonos [[lat, lon], ...]; una sucursal puede tener varias.
+SAMPLE_BRANCHES = [
+    {
+        "id": "centro",
+        "name": "Sucursal Centro",
+        "address": "Av. 18 de Julio 1234",
+        "lat": -34.9058, "lon": -56.1913,
+        "zones": [[[-34.890, -56.215], [-34.890, -56.170], [-34.915, -56.170], [-34.922, -56.200], [-34.910, -56.215]]],
+    },
+    {
+        "id": "pocitos",
+        "name": "Sucursal Pocitos",
+        "address": "Av. Brasil 2800",
+        "lat": -34.9080, "lon": -56.1530,
+        "zones": [[[-34.890, -56.170], [-34.890, -56.135], [-34.920, -56.130], [-34.922, -56.170]]],
+    },
+    {
+        "id": "carrasco",
+        "name": "Sucursal Carrasco",
+        "address": "Av. Arocena 1600",
+        "lat": -34.8880, "lon": -56.0560,
+        "zones": [[[-34.860, -56.090], [-34.860, -56.030], [-34.900, -56.030], [-34.900, -56.090]]],
+    },
+]
+
+
+class Branch:
+    """Una sucursal (solo lectura)"""
+
+    __slots__ = ("id", "name", "address", "lat", "lon")
+
+    def __init__(self, id: str, name: str, address: str, lat: float, lon: float):
+        self.id = id
+        self.name = name
+        self.address = address
+        self.lat = lat
+        self.lon = lon
+
+    def __repr__(self):
+        return f"Branch({self.id!r}, {self.name!r})"
+
+
+class BranchMatch:
+    """Resultado de ubicar un punto: sucursal más cercana y quién le entrega"""
+
+    __slots__ = ("nearest", "distance_m", "delivery", "delivery_distance_m")
+
+    def __init__(self, nearest: Branch, distance_m: float, delivery: Optional[Branch], delivery_distance_m: Optional[float]):
+        self.nearest = nearest
+        self.distance_m = distance_m
+        # Sucursal cuya zona de entrega contiene el punto (None = fuera de zona)
+        self.delivery = delivery
+        self.delivery_distance_m = delivery_distance_m
+
+
+def _unit_vectors(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Coordenadas → puntos en la esfera unitaria (N, 3)"""
+    lat, lon = np.radians(lat), np.radians(lon)
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def _unit_vector(lat: float, lon: float) -> np.ndarray:
+    """Lo mismo para un solo punto (con math: para un escalar es más rápido que NumPy)"""
+    lat, lon = math.radians(lat), math.radians(lon)
+    cos_lat = math.cos(lat)
+    return np.array((cos_lat * math.cos(lon), cos_lat * math.sin(lon), math.sin(lat)))
+
+
+def _arc_meters(dot) -> float:
+    """Distancia sobre la Tierra entre dos vectores unitarios con ese producto punto"""
+    return EARTH_RADIUS_M * math.acos(max(-1.0, min(1.0, float(dot))))
+
+
+class CellEdges:
+    """
+    Lados de todas las zonas que tocan una celda de la grilla.
+
+    Para cada lado se guarda lat1, lat2, lon1 y la pendiente lon/lat, así
+    el ray casting (contar cuántos lados cruza una semirrecta hacia el
+    este) es una comparación vectorizada sin divisiones; bincount cuenta
+    los cruces por zona y las zonas con cantidad impar contienen el punto.
+    """
+
+    __slots__ = ("zones", "lat1", "lat2", "lon1", "slope", "owner")
+
+    def __init__(self, zones: List[int], edges: List[np.ndarray]):
+        self.zones = np.array(zones, dtype=np.int32)
+        all_edges = np.vstack(edges)
+        self.lat1 = all_edges[:, 0].copy()
+        self.lat2 = all_edges[:, 2].copy()
+        self.lon1 = all_edges[:, 1].copy()
+        dlat = self.lat2 - self.lat1
+        # Los lados horizontales nunca "cruzan" (straddles es False): pendiente 0
+        self.slope = np.divide(all_edges[:, 3] - self.lon1, dlat, out=np.zeros_like(dlat), where=dlat != 0)
+        # Índice (dentro de esta celda) de la zona de cada lado
+        self.owner = np.repeat(np.arange(len(zones)), [len(e) for e in edges])
+
+    def containing(self, lat: float, lon: float) -> np.ndarray:
+        crosses = ((self.lat1 > lat) != (self.lat2 > lat)) & (lon < self.lon1 + (lat - self.lat1) * self.slope)
+        counts = np.bincount(self.owner[crosses], minlength=len(self.zones))
+        return self.zones[(counts & 1) == 1]
+
+
+class BranchIndex:
+    """
+    Índice espacial de sucursales y zonas de entrega, armado una vez al
+    arrancar.
+
+    - Sucursal más cercana: las sucursales se guardan como vectores
+      unitarios; la más cercana es la de mayor producto punto con el
+      punto consultado (una multiplicación matriz-vector), y la distancia
+      sale del arco entre los dos.
+    - Zonas de entrega: una grilla de celdas de BRANCH_GRID_DEGREES
+      grados guarda qué zonas tocan cada celda. Una consulta mira solo
+      las zonas de su celda: primero descarta por caja (bounding box) y
+      después hace ray casting sobre los lados de cada candidata, todo
+      con arrays de NumPy.
+    """
+
+    def __init__(self, branches: List[dict], grid_degrees: float = BRANCH_GRID_DEGREES):
+        self.grid = grid_degrees
+        self.branches = tuple(
+            Branch(b["id"], b["name"], b.get("address", ""), float(b["lat"]), float(b["lon"]))
+            for b in branches
+        )
+        self.by_id: Dict[str, Branch] = {b.id: b for b in self.branches}
+        self.points = _unit_vectors(
+            np.array([b.lat for b in self.branches], dtype=np.float64),
+            np.array([b.lon for b in self.branches], dtype=np.float64),
+        )
+
+        # Zonas: por cada polígono, sus lados (lat1, lon1, lat2, lon2) y su caja
+        zone_branch: List[int] = []
+        zone_edges: List[np.ndarray] = []
+        boxes: List[Tuple[float, float, float, float]] = []
+        for index, branch in enumerate(branches):
+            for polygon in branch.get("zones", ()):
+                vertices = np.asarray(polygon, dtype=np.float64)
+                if len(vertices) < 3:
+                    continue
+                zone_edges.append(np.hstack([vertices, np.roll(vertices, -1, axis=0)]))
+                boxes.append((vertices[:, 0].min(), vertices[:, 1].min(), vertices[:, 0].max(), vertices[:, 1].max()))
+                zone_branch.append(index)
+        self.zone_branch = np.array(zone_branch, dtype=np.int32)
+
+        # Grilla: celda → zonas cuya caja la toca
+        cell_zones: Dict[Tuple[int, int], List[int]] = {}
+        for zone, (lat0, lon0, lat1, lon1) in enumerate(boxes):
+            for row in range(self._cell(lat0), self._cell(lat1) + 1):
+                for col in range(self._cell(lon0), self._cell(lon1) + 1):
+                    cell_zones.setdefault((row, col), []).append(zone)
+
+        # Cada celda guarda juntos los lados de todas sus zonas, así una
+        # consulta es una sola pasada vectorizada sobre esos lados
+        self.cells: Dict[Tuple[int, int], CellEdges] = {
+            cell: CellEdges(zones, [zone_edges[z] for z in zones])
+            for cell, zones in cell_zones.items()
+        }
+
+    @classmethod
+    def from_file(cls, path: str = BRANCHES_PATH) -> "BranchIndex":
+        """Lee las sucursales de un JSON ({"branches": [...]}); si no existe usa las de ejemplo"""
+        if not os.path.exists(path):
+            return cls(SAMPLE_BRANCHES)
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["branches"] if isinstance(data, dict) else data)
+
+    def _cell(self, degrees: float) -> int:
+        return math.floor(degrees / self.grid)
+
+    def __len__(self) -> int:
+        return len(self.branches)
+
+    # ============================================================
+    # CONSULTAS
+    # ============================================================
+
+    def nearest(self, lat: float, lon: float) -> Tuple[Optional[Branch], float]:
+        """Sucursal más cercana y la distancia en metros"""
+        if not self.branches:
+            return None, math.inf
+        dots = self.points @ _unit_vector(lat, lon)
+        best = int(dots.argmax())
+        return self.branches[best], _arc_meters(dots[best])
+
+    def zones_containing(self, lat: float, lon: float) -> np.ndarray:
+        """Ids de las zonas que contienen el punto"""
+        cell = self.cells.get((self._cell(lat), self._cell(lon)))
+        if cell is None:
+            return NO_ZONES
+        return cell.containing(lat, lon)
+
+    def locate(self, lat: float, lon: float) -> Optional[BranchMatch]:
+        """Sucursal más cercana y, si el punto está en alguna zona, la que entrega (la más cercana de esas)"""
+        nearest, distance = self.nearest(lat, lon)
+        if nearest is None:
+            return None
+
+        zones = self.zones_containing(lat, lon)
+        if len(zones) == 0:
+            return BranchMatch(nearest, distance, None, None)
+
+        candidates = self.zone_branch[zones]
+        dots = self.points[candidates] @ _unit_vector(lat, lon)
+        best = int(dots.argmax())
+        delivery = self.branches[int(candidates[best])]
+        return BranchMatch(nearest, distance, delivery, _arc_meters(dots[best]))
+
+
+if __name__ == "__main__":
+    # Consulta rápida: python -m services.branches -34.905 -56.16
+    if len(sys.argv) != 3:
+        print("Uso: python -m services.branches <lat> <lon>")
+        sys.exit(1)
+
+    index = BranchIndex.from_file()
+    match = index.locate(float(sys.argv[1]), float(sys.argv[2]))
+    print(f"Más cercana: {match.nearest.name} a {match.distance_m:.0f} m")
+    print(f"Entrega: {match.delivery.name if match.delivery else 'fuera de zona'}")
@@ -0,0 +1,455 @@
+"""
+Difusiones: el mismo mensaje (con campos por cliente) a miles de
+clientes a la vez. Por ejemplo "tu pedido está listo" o el plato del día.
+
+Uso:
+    python -m services.broadcast pedido_listo --to 59892717261 --text "¡Hola! Tu pedido está listo 🍕"
+    python -m services.broadcast promo_lunes --file clientes.csv --text "¡Hola {nombre}! Hoy 2x1 en pizzas 🍕"
+    python -m services.broadcast promo_lunes --query "SELECT DISTINCT phone FROM orders" --text-file promo.txt
+
+El archivo puede ser un CSV con encabezado (una columna phone o
+telefono y las que use el texto) o un número por línea. La consulta
+corre en modo solo lectura sobre la base de pedidos (ORDERS_DB_PATH).
+
+Si se corta (Ctrl+C, un reinicio), volver a correr el mismo comando
+sigue donde quedó: a los que ya se les envió no se les vuelve a enviar.
+"""
+import argparse
+import asyncio
+import csv
+import logging
+import os
+import sqlite3
+import sys
+import time
+from collections import deque
+from string import Formatter
+from typing import Dict, Iterable, List, Optional
+from services.whatsapp_service import AsyncWhatsAppService, is_retryable, build_text_payload
+from services.outbound_queue import TokenBucket, CircuitBreaker, backoff_delay
+from services.templates import text_template
+from shared.log import get_logger, log_event, setup_logging
+from shared.config import (
+    ORDERS_DB_PATH,
+    BROADCAST_DIR,
+    BROADCAST_RATE_PER_SECOND,
+    BROADCAST_CONCURRENCY,
+    BROADCAST_BATCH_SIZE,
+    BROADCAST_REPORT_INTERVAL,
+    OUTBOUND_MAX_ATTEMPTS,
+    OUTBOUND_BACKOFF_BASE,
+    OUTBOUND_BACKOFF_MAX,
+    BREAKER_THRESHOLD,
+    BREAKER_COOLDOWN,
+)
+
+logger = get_logger("broadcast")
+
+# Columnas que se aceptan como número de teléfono
+PHONE_COLUMNS = ("phone", "telefono", "teléfono", "numero", "número", "wa_id")
+
+# Estados en el checkpoint
+CLAIMED, SENT, FAILED, RELEASED = "S", "D", "F", "R"
+# Un número de WhatsApp con código de país tiene al menos 8 dígitos
+MIN_PHONE_DIGITS = 8
+
+
+# ============================================================
+# DESTINATARIOS
+# ============================================================
+
+def _phone(row: Dict[str, str]) -> str:
+    for column in PHONE_COLUMNS:
+        value = row.get(column)
+        if value:
+            digits = "".join(char for char in value if char.isdigit())
+            return digits if len(digits) >= MIN_PHONE_DIGITS else ""
+    return ""
+
+
+def load_recipients(path: str) -> List[Dict[str, str]]:
+    """
+    Lee los destinatarios de un archivo: CSV con encabezado (una columna
+    de teléfono más los campos del texto) o un número por línea.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        first = f.readline()
+        f.seek(0)
+        if any(column in first.lower() for column in PHONE_COLUMNS):
+            rows = [{key.strip().lower(): (value or "").strip() for key, value in row.items() if key} for row in csv.DictReader(f)]
+        else:
+            rows = [{"phone": line.strip()} for line in f if line.strip()]
+    for row in rows:
+        row["phone"] = _phone(row)
+    return rows
+
+
+def query_recipients(sql: str, path: str = ORDERS_DB_PATH) -> List[Dict[str, str]]:
+    """
+    Destinatarios a partir de una consulta sobre la base de pedidos (en
+    solo lectura). La primera columna es el teléfono si ninguna se llama
+    phone; las demás quedan como campos para el texto.
+    """
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        cursor = conn.execute(sql)
+        columns = [description[0].lower() for description in cursor.description]
+        rows = []
+        for values in cursor:
+            row = {column: "" if value is None else str(value) for column, value in zip(columns, values)}
+            row["phone"] = _phone(row) or _phone({"phone": row[columns[0]]})
+            rows.append(row)
+        return rows
+    finally:
+        conn.close()
+
+
+# ============================================================
+# CHECKPOINT
+# ============================================================
+
+class Checkpoint:
+    """
+    Progreso de una difusión en disco: una línea por cambio de estado de
+    un destinatario ("S" tomado, "D" enviado, "F" falló, "R" devuelto sin
+    enviar al cortarse).
+
+    Un destinatario se marca como tomado (con fsync) antes de enviarle;
+    los resultados se bajan a disco junto con el siguiente lote de
+    tomados. Al retomar, los D se saltean y los F se vuelven a intentar;
+    los que quedaron en S se cortaron en medio del envío y no se sabe si
+    les llegó, así que no se les envía salvo que se pida (resend_uncertain).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.states: Dict[str, str] = {}
+        self.buffer: List[str] = []
+        self.file = None
+
+    def load(self) -> Dict[str, str]:
+        """Estado de cada destinatario según el archivo (una línea cortada al final se ignora)"""
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break
+                    state, _, phone_number = line.rstrip("\n").partition("\t")
+                    self.states[phone_number] = state
+        self.file = open(self.path, "a", encoding="utf-8")
+        return self.states
+
+    def mark(self, phone_number: str, state: str):
+        self.states[phone_number] = state
+        self.buffer.append(f"{state}\t{phone_number}\n")
+
+    async def sync(self):
+        """Baja a disco todo lo marcado (un write + fsync, en un hilo aparte)"""
+        if not self.buffer:
+            return
+        data, self.buffer = "".join(self.buffer), []
+        await asyncio.to_thread(self._write, data)
+
+    def _write(self, data: str):
+        self.file.write(data)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file is not None:
+            self._write("".join(self.buffer))
+            self.buffer = []
+            self.file.close()
+            self.file = None
+
+
+# ============================================================
+# DIFUSIÓN
+# ============================================================
+
+class Broadcast:
+    """
+    Envía `text` a cada destinatario, con los campos de su fila
+    ("¡Hola {nombre}!"). Un texto sin campos se serializa una sola vez.
+
+    Los envíos salen por un AsyncWhatsAppService (un pool de conexiones)
+    desde `concurrency` workers, con un token bucket propio a
+    BROADCAST_RATE_PER_SECOND (por debajo del límite de la cuenta, así
+    el bot sigue contestando mientras tanto) y los mismos reintentos y
+    circuit breaker que la cola de salida.
+
+    El progreso se guarda en BROADCAST_DIR/<nombre>.log (ver Checkpoint):
+    correr otra vez la misma difusión envía solo a los que faltan.
+    Cada BROADCAST_REPORT_INTERVAL segundos se informa el avance.
+    """
+
+    # Ventana (segundos) sobre la que se calcula el ritmo de envío
+    RATE_WINDOW = 10.0
+
+    def __init__(
+        self,
+        name: str,
+        recipients: Iterable[Dict[str, str]],
+        text: str,
+        service: Optional[AsyncWhatsAppService] = None,
+        rate_per_second: float = BROADCAST_RATE_PER_SECOND,
+        concurrency: int = BROADCAST_CONCURRENCY,
+        batch_size: int = BROADCAST_BATCH_SIZE,
+        max_attempts: int = OUTBOUND_MAX_ATTEMPTS,
+        resend_uncertain: bool = False,
+        directory: str = BROADCAST_DIR,
+    ):
+        self.name = name
+        self.text = text
+        self.fields = self._check_text()
+        # Sin campos, el payload es siempre el mismo salvo el destinatario
+        self.template = None if self.fields else text_template(text.format_map({}))
+        self.service = service
+        self.bucket = TokenBucket(rate_per_second, max(1, int(rate_per_second)))
+        self.breaker = CircuitBreaker(BREAKER_THRESHOLD, BREAKER_COOLDOWN)
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.resend_uncertain = resend_uncertain
+        self.checkpoint = Checkpoint(os.path.join(directory, f"{name}.log"))
+
+        # Un mismo número una sola vez, en el orden de la lista
+        self.recipients: Dict[str, Dict[str, str]] = {}
+        self.invalid = 0
+        for row in recipients:
+            if row.get("phone"):
+                self.recipients.setdefault(row["phone"], row)
+            else:
+                self.invalid += 1
+
+        self.total = len(self.recipients)
+        self.skipped = 0
+        self.uncertain = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.pending = 0
+        # Tomados en el checkpoint que todavía no agarró ningún worker
+        self.waiting: set = set()
+        self.started_at = 0.0
+        self.sent_times: deque = deque()
+
+    # ============================================================
+    # EJECUCIÓN
+    # ============================================================
+
+    async def run(self) -> dict:
+        """Envía a los que faltan y devuelve el resumen final"""
+        states = self.checkpoint.load()
+        todo = []
+        for phone_number in self.recipients:
+            state = states.get(phone_number)
+            if state == SENT:
+                self.skipped += 1
+            elif state == CLAIMED and not self.resend_uncertain:
+                self.uncertain += 1
+            else:
+                todo.append(phone_number)
+        self.pending = len(todo)
+
+        own_service = self.service is None
+        if own_service:
+            self.service = AsyncWhatsAppService()
+        self.started_at = time.monotonic()
+        log_event(
+            logger, logging.INFO, "broadcast_started", name=self.name, total=self.total,
+            pending=self.pending, skipped=self.skipped, uncertain=self.uncertain, invalid=self.invalid,
+        )
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.batch_size)
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.concurrency)]
+        reporter = asyncio.create_task(self._reporter())
+        try:
+            for start in range(0, len(todo), self.batch_size):
+                batch = todo[start:start + self.batch_size]
+                # Se toma el lote en disco antes de enviar (y de paso se guardan los resultados anteriores)
+                for phone_number in batch:
+                    self.checkpoint.mark(phone_number, CLAIMED)
+                self.waiting.update(batch)
+                await self.checkpoint.sync()
+                for phone_number in batch:
+                    await queue.put(phone_number)
+            await queue.join()
+        finally:
+            for task in (*workers, reporter):
+                task.cancel()
+            await asyncio.gather(*workers, reporter, return_exceptions=True)
+            # Si se cortó, los que no se llegaron a empezar quedan libres para la próxima
+            for phone_number in self.waiting:
+                self.checkpoint.mark(phone_number, RELEASED)
+            self.checkpoint.close()
+            if own_service:
+                await self.service.aclose()
+
+        summary = self.stats()
+        log_event(logger, logging.INFO, "broadcast_finished", **summary)
+        return summary
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            phone_number = await queue.get()
+            self.waiting.discard(phone_number)
+            try:
+                ok = await self._send(phone_number)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Un destinatario con problemas no puede frenar al worker (y con él a run())
+                self.failed += 1
+                logger.exception("broadcast_worker_error", extra={"fields": {"recipient": phone_number}})
+                ok = False
+            try:
+                self.checkpoint.mark(phone_number, SENT if ok else FAILED)
+                self.pending -= 1
+            finally:
+                queue.task_done()
+
+    async def _send(self, phone_number: str) -> bool:
+        """Envía a un destinatario con reintentos. True si la Graph API lo aceptó."""
+        try:
+            payload = self._payload(phone_number)
+        except (KeyError, IndexError, ValueError) as e:
+            self.failed += 1
+            log_event(logger, logging.WARNING, "broadcast_bad_fields", recipient=phone_number, error=repr(e))
+            return False
+
+        for attempt in range(1, self.max_attempts + 1):
+            probe = await self.breaker.wait()
+            try:
+                await self.bucket.acquire()
+                await self.service.send_payload(payload)
+            except Exception as e:
+                # success() o failure() cierran la prueba del breaker
+                probe = False
+                retryable = is_retryable(e)
+                if retryable:
+                    self.breaker.failure()
+                else:
+                    self.breaker.success()
+                if not retryable or attempt == self.max_attempts:
+                    self.failed += 1
+                    log_event(
+                        logger, logging.WARNING, "broadcast_send_failed",
+                        recipient=phone_number, attempts=attempt, error=str(e)
+                    )
+                    return False
+                self.retried += 1
+                await asyncio.sleep(backoff_delay(attempt, e, OUTBOUND_BACKOFF_BASE, OUTBOUND_BACKOFF_MAX))
+                continue
+            else:
+                self.breaker.success()
+            finally:
+                # Una prueba cancelada no puede dejar el breaker medio abierto
+                if probe:
+                    self.breaker.abort()
+
+            self.sent += 1
+            self.sent_times.append(time.monotonic())
+            return True
+        return False
+
+    def _check_text(self) -> set:
+        """
+        Devuelve los campos del texto y lo prueba con valores de ejemplo,
+        así un campo mal escrito ("{nombre!x}", "{precio:d}", una llave
+        sin cerrar) falla al crear la difusión y no a mitad de camino.
+        Los campos siempre llegan como texto.
+        """
+        try:
+            fields = {field for _, field, _, _ in Formatter().parse(self.text) if field}
+            self.text.format_map({field: "x" for field in fields})
+        except Exception as e:
+            raise ValueError(f"Texto de la difusión inválido: {e}") from None
+        return fields
+
+    def _payload(self, phone_number: str):
+        if self.template is not None:
+            return self.template.render(phone_number)
+        return build_text_payload(phone_number, self.text.format_map(self.recipients[phone_number]))
+
+    async def _reporter(self):
+        while True:
+            await asyncio.sleep(BROADCAST_REPORT_INTERVAL)
+            log_event(logger, logging.INFO, "broadcast_progress", **self.stats())
+
+    # ============================================================
+    # ESTADÍSTICAS
+    # ============================================================
+
+    def rate(self) -> float:
+        """Envíos por segundo en los últimos RATE_WINDOW segundos"""
+        now = time.monotonic()
+        while self.sent_times and now - self.sent_times[0] > self.RATE_WINDOW:
+            self.sent_times.popleft()
+        window = min(self.RATE_WINDOW, now - self.started_at) if self.started_at else 0.0
+        return round(len(self.sent_times) / window, 2) if window > 0 else 0.0
+
+    def stats(self) -> dict:
+        rate = self.rate()
+        return {
+            "name": self.name,
+            "total": self.total,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "skipped": self.skipped,
+            "uncertain": self.uncertain,
+            "remaining": self.pending,
+            "rate_per_second": rate,
+            "elapsed_s": round(time.monotonic() - self.started_at, 1) if self.started_at else 0.0,
+            "eta_s": round(self.pending / rate, 1) if rate else None,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Envía un mensaje a muchos clientes (se puede retomar)")
+    parser.add_argument("name", help="nombre de la difusión (identifica su checkpoint)")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--to", nargs="+", help="números de teléfono")
+    source.add_argument("--file", help="CSV con columna phone (y los campos del texto) o un número por línea")
+    source.add_argument("--query", help="SELECT sobre la base de pedidos; la primera columna es el teléfono")
+    message = parser.add_mutually_exclusive_group(required=True)
+    message.add_argument("--text", help="texto a enviar; {campo} se completa con la columna del destinatario")
+    message.add_argument("--text-file", help="archivo con el texto a enviar")
+    parser.add_argument("--rate", type=float, default=BROADCAST_RATE_PER_SECOND, help="envíos por segundo")
+    parser.add_argument("--concurrency", type=int, default=BROADCAST_CONCURRENCY, help="envíos simultáneos")
+    parser.add_argument("--resend-uncertain", action="store_true", help="reenviar a los que se cortaron en medio del envío")
+    args = parser.parse_args()
+
+    if args.to:
+        rows = [{"phone": _phone({"phone": number})} for number in args.to]
+    elif args.file:
+        rows = load_recipients(args.file)
+    else:
+        rows = query_recipients(args.query)
+
+    if args.text_file:
+        with open(args.text_file, encoding="utf-8") as f:
+            text = f.read().strip()
+    else:
+        text = args.text
+
+    try:
+        broadcast = Broadcast(
+            args.name, rows, text, rate_per_second=args.rate,
+            concurrency=args.concurrency, resend_uncertain=args.resend_uncertain,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    log_listener = setup_logging()
+    try:
+        result = asyncio.run(broadcast.run())
+    except KeyboardInterrupt:
+        print("⏸️ Difusión interrumpida: vuelve a correr el mismo comando para seguir.")
+        sys.exit(1)
+    finally:
+        log_listener.stop()
+    print(f"✅ {result['sent']} enviados, {result['failed']} fallidos, {result['skipped']} ya enviados antes")
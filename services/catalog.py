@@ -0,0 +1,192 @@
+import csv
+import os
+import sqlite3
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from shared.config import CATALOG_DB_PATH, CATALOG_REFRESH_SECONDS
+
+# WhatsApp permite hasta 10 filas por lista: 8 productos + "anterior" y "siguiente"
+PAGE_SIZE = 8
+
+# Productos de ejemplo para una base recién creada
+SAMPLE_PRODUCTS = [
+    ("prod_1", "Pizza Napolitana", 450, "Pizzas"),
+    ("prod_2", "Hamburguesa Completa", 380, "Minutas"),
+    ("prod_3", "Coca-Cola 1.5L", 120, "Bebidas"),
+    ("prod_4", "Milanesa con Papas", 420, "Minutas"),
+    ("prod_5", "Pizza Muzzarella", 400, "Pizzas"),
+]
+
+
+class Product:
+    """Un producto del menú (solo lectura)"""
+
+    __slots__ = ("id", "name", "price", "category")
+
+    def __init__(self, id: str, name: str, price: int, category: str):
+        self.id = id
+        self.name = name
+        self.price = price
+        self.category = category
+
+    def __repr__(self):
+        return f"Product({self.id!r}, {self.name!r}, {self.price}, {self.category!r})"
+
+
+class Catalog:
+    """
+    Catálogo de productos.
+
+    Los productos viven en SQLite (con índice por categoría) y se cargan
+    completos en memoria: buscar por id es un acceso a dict y cada
+    categoría es una tupla ya ordenada, así paginar es un slice.
+
+    La versión del catálogo es el `PRAGMA user_version` de la base. Quien
+    modifique productos (upsert_products, el import por CSV u otro
+    proceso) la incrementa; refresh_if_stale() la consulta como mucho
+    una vez cada CATALOG_REFRESH_SECONDS y recarga si cambió.
+    """
+
+    def __init__(self, path: str = CATALOG_DB_PATH, refresh_seconds: float = CATALOG_REFRESH_SECONDS):
+        self.path = path
+        self.refresh_seconds = refresh_seconds
+
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._create_schema()
+
+        self.version = -1
+        self.checked_at = 0.0
+        self.by_id: Dict[str, Product] = {}
+        self.by_category: Dict[str, Tuple[Product, ...]] = {}
+        self.categories: Tuple[str, ...] = ()
+        self.load()
+
+    def _create_schema(self):
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS products ("
+                " id TEXT PRIMARY KEY,"
+                " name TEXT NOT NULL,"
+                " price INTEGER NOT NULL,"
+                " category TEXT NOT NULL,"
+                " position INTEGER NOT NULL DEFAULT 0,"
+                " active INTEGER NOT NULL DEFAULT 1)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_products_category"
+                " ON products (category, position, name)"
+            )
+
+        empty = self.conn.execute("SELECT COUNT(*) FROM products").fetchone()[0] == 0
+        if empty:
+            self.upsert_products(Product(*row) for row in SAMPLE_PRODUCTS)
+
+    # ============================================================
+    # LECTURA (en memoria)
+    # ============================================================
+
+    def load(self):
+        """Carga todo el catálogo en memoria"""
+        version = self._read_version()
+        rows = self.conn.execute(
+            "SELECT id, name, price, category FROM products"
+            " WHERE active = 1 ORDER BY category, position, name"
+        ).fetchall()
+
+        by_id = {}
+        by_category: Dict[str, List[Product]] = {}
+        for row in rows:
+            product = Product(*row)
+            by_id[product.id] = product
+            by_category.setdefault(product.category, []).append(product)
+
+        # Se reemplaza todo de una vez: nunca se ve un catálogo a medio cargar
+        self.by_id = by_id
+        self.by_category = {category: tuple(products) for category, products in by_category.items()}
+        self.categories = tuple(by_category)
+        self.version = version
+        self.checked_at = time.monotonic()
+
+    def refresh_if_stale(self) -> bool:
+        """Recarga si la versión cambió. Devuelve True si recargó."""
+        now = time.monotonic()
+        if now - self.checked_at < self.refresh_seconds:
+            return False
+
+        self.checked_at = now
+        if self._read_version() == self.version:
+            return False
+
+        self.load()
+        return True
+
+    def get(self, product_id: str) -> Optional[Product]:
+        """Busca un producto por id (O(1))"""
+        return self.by_id.get(product_id)
+
+    def page(self, category: str, page: int) -> Tuple[Tuple[Product, ...], bool, bool]:
+        """
+        Devuelve los productos de una página de la categoría y si hay
+        página anterior / siguiente.
+        """
+        products = self.by_category.get(category, ())
+        start = page * PAGE_SIZE
+        return products[start:start + PAGE_SIZE], page > 0, start + PAGE_SIZE < len(products)
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    # ============================================================
+    # ESCRITURA
+    # ============================================================
+
+    def upsert_products(self, products: Iterable[Product]):
+        """Agrega o actualiza productos e incrementa la versión"""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO products (id, name, price, category, active) VALUES (?, ?, ?, ?, 1)"
+                " ON CONFLICT(id) DO UPDATE SET name = excluded.name, price = excluded.price,"
+                " category = excluded.category, active = 1",
+                ((p.id, p.name, p.price, p.category) for p in products),
+            )
+            self._bump_version()
+        self.checked_at = 0.0
+
+    def deactivate(self, product_ids: Iterable[str]):
+        """Saca productos del menú (sin borrarlos) e incrementa la versión"""
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE products SET active = 0 WHERE id = ?",
+                ((product_id,) for product_id in product_ids),
+            )
+            self._bump_version()
+        self.checked_at = 0.0
+
+    def _read_version(self) -> int:
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def _bump_version(self):
+        self.conn.execute(f"PRAGMA user_version = {self._read_version() + 1}")
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    # Importa productos desde un CSV con columnas: id,name,price,category
+    # Uso: python -m services.catalog productos.csv
+    if len(sys.argv) != 2:
+        print("Uso: python -m services.catalog productos.csv")
+        sys.exit(1)
+
+    catalog = Catalog()
+    with open(sys.argv[1], newline="", encoding="utf-8") as f:
+        products = [
+            Product(row["id"], row["name"], int(row["price"]), row["category"])
+            for row in csv.DictReader(f)
+        ]
+    catalog.upsert_products(products)
+    print(f"✅ {len(products)} productos importados (versión {catalog._read_version()})")
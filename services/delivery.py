@@ -0,0 +1,204 @@
+import logging
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from shared.webhook import Status
+from shared.log import get_logger, log_event
+from shared.config import DELIVERY_TRACK_SIZE
+
+logger = get_logger("delivery")
+
+# Etapas que se miden (desde, hasta): columnas de DeliveryTracker.times
+ACCEPTED, SENT, DELIVERED, READ = range(4)
+STAGES = {
+    "accepted_to_sent": (ACCEPTED, SENT),
+    "accepted_to_delivered": (ACCEPTED, DELIVERED),
+    "delivered_to_read": (DELIVERED, READ),
+}
+COLUMNS = {"sent": SENT, "delivered": DELIVERED, "read": READ}
+QUANTILES = (50, 95)
+
+
+class DeliveryTracker:
+    """
+    Sigue qué pasa con cada mensaje que enviamos después de que la Graph
+    API lo acepta: cuándo lo manda Meta (sent), cuándo llega al teléfono
+    (delivered), cuándo se lee (read) o si falla (failed).
+
+    Los datos viven en un ring buffer de `capacity` lugares hecho con
+    arrays de NumPy (una fila de tiempos por mensaje, el handler que lo
+    envió y el código de error), así la memoria es fija y anotar un
+    envío o un estado es escribir un par de celdas. Cuando el buffer se
+    llena se pisa el mensaje más viejo.
+
+    `record_sent` lo llama la cola de salida con el wamid que devuelve la
+    Graph API; `on_status` lo llama el webhook con cada status. El resumen
+    (tasas y percentiles de latencia por handler) se calcula recién al
+    pedirlo, vectorizado sobre todo el buffer.
+
+    Ojo: Meta manda los timestamps en segundos enteros, así que las
+    latencias tienen resolución de un segundo.
+    """
+
+    def __init__(self, capacity: int = DELIVERY_TRACK_SIZE):
+        self.capacity = capacity
+        # Tiempos (epoch) por etapa; NaN = todavía no pasó
+        self.times = np.full((capacity, 4), np.nan, dtype=np.float64)
+        # Handler que envió el mensaje (índice en self.tags); -1 = lugar vacío
+        self.tag_ids = np.full(capacity, -1, dtype=np.int16)
+        # Código de error de Meta si falló (0 = no falló)
+        self.errors = np.zeros(capacity, dtype=np.int32)
+        self.failed = np.zeros(capacity, dtype=np.bool_)
+
+        # wamid de cada lugar y lugar de cada wamid
+        self.ids: List[Optional[str]] = [None] * capacity
+        self.slots: Dict[str, int] = {}
+        self.position = 0
+
+        self.tags: List[str] = []
+        self.tag_index: Dict[str, int] = {}
+
+        self.tracked = 0
+        self.statuses = 0
+        self.unmatched = 0
+
+    def _tag(self, tag: str) -> int:
+        index = self.tag_index.get(tag)
+        if index is None:
+            index = self.tag_index[tag] = len(self.tags)
+            self.tags.append(tag)
+        return index
+
+    # ============================================================
+    # REGISTRO (O(1), lo llaman la cola de salida y el webhook)
+    # ============================================================
+
+    def record_sent(self, message_id: str, tag: str, at: Optional[float] = None):
+        """Anota un mensaje que la Graph API aceptó"""
+        if not message_id:
+            return
+        slot = self.position
+        self.position = (slot + 1) % self.capacity
+
+        # Se pisa el mensaje más viejo
+        old = self.ids[slot]
+        if old is not None:
+            del self.slots[old]
+        self.ids[slot] = message_id
+        self.slots[message_id] = slot
+
+        row = self.times[slot]
+        row[:] = np.nan
+        row[ACCEPTED] = time.time() if at is None else at
+        self.tag_ids[slot] = self._tag(tag or "other")
+        self.errors[slot] = 0
+        self.failed[slot] = False
+        self.tracked += 1
+
+    def on_status(self, status: Status) -> bool:
+        """
+        Aplica un status del webhook. Devuelve False si el mensaje no se
+        está siguiendo (enviado antes de arrancar o ya pisado).
+        """
+        self.statuses += 1
+        slot = self.slots.get(status.id)
+        if slot is None:
+            self.unmatched += 1
+            return False
+
+        try:
+            at = float(status.timestamp)
+        except ValueError:
+            at = time.time()
+
+        if status.status == "failed":
+            self.failed[slot] = True
+            code = status.errors[0].code if status.errors else 0
+            self.errors[slot] = code
+            log_event(
+                logger, logging.WARNING, "delivery_failed",
+                recipient=status.recipient_id, message_id=status.id,
+                tag=self.tags[self.tag_ids[slot]], code=code,
+                error=status.errors[0].title if status.errors else ""
+            )
+            return True
+
+        column = COLUMNS.get(status.status)
+        # Los webhooks pueden llegar desordenados: se queda el primero de cada etapa
+        if column is not None and np.isnan(self.times[slot, column]):
+            self.times[slot, column] = at
+        return True
+
+    # ============================================================
+    # RESUMEN
+    # ============================================================
+
+    def summary(self) -> Dict[str, dict]:
+        """
+        Por handler: mensajes seguidos, cuántos siguen pendientes, tasas
+        de entrega, lectura y falla, y p50/p95 (segundos) de cada etapa.
+        """
+        used = self.tag_ids >= 0
+        tag_ids = self.tag_ids[used]
+        times = self.times[used]
+        failed = self.failed[used]
+        minlength = len(self.tags)
+
+        # Leído implica entregado aunque el webhook de delivered no haya llegado
+        delivered = ~np.isnan(times[:, DELIVERED]) | ~np.isnan(times[:, READ])
+        read = ~np.isnan(times[:, READ])
+        pending = ~delivered & ~failed
+
+        totals = np.bincount(tag_ids, minlength=minlength)
+        counts = {
+            "delivered": np.bincount(tag_ids[delivered], minlength=minlength),
+            "read": np.bincount(tag_ids[read], minlength=minlength),
+            "failed": np.bincount(tag_ids[failed], minlength=minlength),
+            "pending": np.bincount(tag_ids[pending], minlength=minlength),
+        }
+
+        # Latencias: una columna por etapa, NaN donde falta alguno de los dos extremos
+        latencies = {
+            stage: np.maximum(times[:, end] - times[:, start], 0.0)
+            for stage, (start, end) in STAGES.items()
+        }
+
+        result = {}
+        for index, tag in enumerate(self.tags):
+            total = int(totals[index])
+            if total == 0:
+                continue
+            mine = tag_ids == index
+            # Las tasas son sobre los mensajes que ya tuvieron resultado
+            settled = max(total - int(counts["pending"][index]), 1)
+            entry = {
+                "tracked": total,
+                "pending": int(counts["pending"][index]),
+                "delivered_rate": round(int(counts["delivered"][index]) / settled, 4),
+                "read_rate": round(int(counts["read"][index]) / settled, 4),
+                "failed_rate": round(int(counts["failed"][index]) / settled, 4),
+            }
+            for stage, values in latencies.items():
+                values = values[mine]
+                values = values[~np.isnan(values)]
+                if len(values):
+                    p50, p95 = np.percentile(values, QUANTILES)
+                    entry[stage] = {"count": len(values), "p50": round(float(p50), 3), "p95": round(float(p95), 3)}
+            result[tag] = entry
+        return result
+
+    def error_codes(self) -> Dict[int, int]:
+        """Fallas por código de error de Meta (solo de los mensajes en el buffer)"""
+        codes, counts = np.unique(self.errors[self.failed], return_counts=True)
+        return {int(code): int(count) for code, count in zip(codes, counts)}
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "tracked": self.tracked,
+            "live": len(self.slots),
+            "statuses": self.statuses,
+            "unmatched": self.unmatched,
+            "error_codes": self.error_codes(),
+            "by_handler": self.summary(),
+        }
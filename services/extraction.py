@@ -0,0 +1,266 @@
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from services.catalog import Catalog, Product
+from shared.router import normalize
+from shared.config import EXTRACT_MIN_SCORE, EXTRACT_MIN_MARGIN, EXTRACT_MAX_QUANTITY
+
+# ============================================================
+# VOCABULARIO DE LOS PEDIDOS
+# ============================================================
+
+NUMBER_WORDS = {
+    "un": 1, "uno": 1, "una": 1, "dos": 2, "tres": 3, "cuatro": 4, "cinco": 5,
+    "seis": 6, "siete": 7, "ocho": 8, "nueve": 9, "diez": 10, "once": 11,
+    "doce": 12, "docena": 12,
+}
+# Palabras que abren una aclaración ("sin tomate", "bien cocida", "para llevar")
+NOTE_MARKERS = frozenset({
+    "sin", "con", "extra", "aparte", "bien", "poco", "poca", "mucho", "mucha",
+    "doble", "que", "para", "mas", "menos",
+})
+# Palabras que no son parte del producto ni de la cantidad (un saludo
+# delante del pedido incluido: "hola, quiero 2 napolitanas")
+FILLERS = frozenset({
+    "hola", "buenas", "buenos", "buen", "dia", "dias", "tardes", "noches",
+    "quiero", "queria", "quisiera", "dame", "mandame", "me", "das", "mandas",
+    "traeme", "pido", "pedir", "agrega", "agregame", "sumame", "por", "favor",
+    "porfa", "de", "del", "el", "la", "los", "las", "y", "tambien", "otra", "otro",
+})
+
+# Cada producto de un pedido va separado por coma, punto y coma, salto de
+# línea, "+" o " y " seguido de una cantidad ("2 napolitanas y 1 coca",
+# "... y 2x coca", "... y x2 coca")
+_SEPARATORS = re.compile(
+    r"[,;\n+]|\s+y\s+(?=(?:x?\d{1,3}x?|" + "|".join(NUMBER_WORDS) + r")\b)",
+    re.IGNORECASE,
+)
+# "2", "2x", "x2"
+_QUANTITY = re.compile(r"^x?(\d{1,3})x?$")
+
+
+def _stem(word: str) -> str:
+    """Plural → singular, lo justo para comparar ('napolitanas' → 'napolitana')"""
+    if len(word) > 3 and word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def trigrams(phrase: str) -> List[str]:
+    """
+    Trigramas de cada palabra por separado, con un espacio de borde:
+    'pizza napolitana' → ' pi', 'piz', ..., 'za ', ' na', ..., 'na '.
+    Al no cruzar palabras, el orden en que se escriben no importa.
+    """
+    grams = []
+    for word in phrase.split():
+        padded = f" {_stem(word)} "
+        grams.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class ExtractedItem:
+    """Un producto reconocido en un mensaje de texto libre"""
+
+    __slots__ = ("product", "quantity", "details", "score")
+
+    def __init__(self, product: Product, quantity: int, details: str, score: float):
+        self.product = product
+        self.quantity = quantity
+        self.details = details
+        self.score = score
+
+    def __repr__(self):
+        return f"ExtractedItem({self.product.name!r}, {self.quantity}, {self.details!r}, {self.score:.2f})"
+
+
+class _Segment:
+    """Un pedazo del mensaje ("2 napolitanas sin tomate") y sus frases candidatas"""
+
+    __slots__ = ("text", "quantity", "candidates")
+
+    def __init__(self, text: str, quantity: int):
+        self.text = text
+        self.quantity = quantity
+        # (fila en la matriz de consultas, aclaraciones)
+        self.candidates: List[Tuple[int, str]] = []
+
+
+# ============================================================
+# EXTRACTOR
+# ============================================================
+
+class OrderExtractor:
+    """
+    Saca producto, cantidad y aclaraciones de un pedido escrito en texto
+    libre ("2 napolitanas sin tomate, una coca"), sin llamar a nada
+    externo.
+
+    Los nombres del catálogo se pasan a vectores de trigramas de
+    caracteres (una fila por producto, ya normalizadas) en una matriz de
+    NumPy que se arma una vez por versión del catálogo. Para un mensaje
+    se arman todas las frases candidatas de todos sus pedazos (el texto
+    hasta cada "sin"/"con"/..., porque "Milanesa con Papas" también lleva
+    un "con") y se puntúan contra todo el catálogo con un solo producto
+    de matrices (similitud coseno). De cada pedazo gana la frase con el
+    mejor puntaje; lo que sigue a esa frase son las aclaraciones.
+
+    Solo cuenta como pedido un pedazo con cantidad ("2", "una", "x2"); lo
+    demás lo resuelve la búsqueda (ver services/search.py). Un producto se
+    acepta si su puntaje pasa EXTRACT_MIN_SCORE y le saca
+    EXTRACT_MIN_MARGIN al segundo ("2 pizzas" no elige entre dos pizzas).
+    """
+
+    def __init__(
+        self,
+        catalog: Catalog,
+        min_score: float = EXTRACT_MIN_SCORE,
+        min_margin: float = EXTRACT_MIN_MARGIN,
+        max_quantity: int = EXTRACT_MAX_QUANTITY,
+    ):
+        self.catalog = catalog
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.max_quantity = max_quantity
+        self.version = None
+        self.products: List[Product] = []
+        self.vocabulary: Dict[str, int] = {}
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+
+    def refresh(self):
+        """Rearma la matriz si el catálogo cambió de versión"""
+        self.catalog.refresh_if_stale()
+        if self.version != self.catalog.version:
+            self.build()
+
+    def build(self):
+        products = list(self.catalog.by_id.values())
+        vocabulary: Dict[str, int] = {}
+        rows = []
+        for product in products:
+            grams = trigrams(normalize(product.name))
+            rows.append([vocabulary.setdefault(gram, len(vocabulary)) for gram in grams])
+
+        matrix = np.zeros((len(products), max(len(vocabulary), 1)), dtype=np.float32)
+        for index, columns in enumerate(rows):
+            np.add.at(matrix[index], columns, 1.0)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.maximum(norms, 1e-9)
+
+        self.products = products
+        self.vocabulary = vocabulary
+        self.matrix = matrix
+        self.version = self.catalog.version
+
+    # ============================================================
+    # EXTRACCIÓN
+    # ============================================================
+
+    def extract(self, text: str) -> Tuple[List[ExtractedItem], List[str]]:
+        """
+        Devuelve los productos reconocidos y los pedazos del mensaje que
+        parecían un pedido (tenían cantidad) pero no se pudieron resolver.
+        """
+        self.refresh()
+        if not self.products:
+            return [], []
+
+        segments: List[_Segment] = []
+        phrases: List[List[str]] = []
+        for piece in _SEPARATORS.split(text):
+            segment = self._segment(piece, phrases)
+            if segment is not None:
+                segments.append(segment)
+        if not phrases:
+            return [], []
+
+        scores = self._score(phrases)
+        # Los dos mejores productos de cada frase
+        order = np.argsort(-scores, axis=1)[:, :2]
+        best = np.take_along_axis(scores, order, axis=1)
+
+        items, unmatched = [], []
+        for segment in segments:
+            chosen = None
+            for row, details in segment.candidates:
+                # Ante un empate gana la frase más larga (la más específica)
+                if chosen is None or best[row, 0] >= best[chosen[0], 0]:
+                    chosen = (row, details)
+
+            row, details = chosen
+            top = float(best[row, 0])
+            second = float(best[row, 1]) if best.shape[1] > 1 else 0.0
+            if top >= self.min_score and top - second >= self.min_margin and segment.quantity <= self.max_quantity:
+                items.append(ExtractedItem(self.products[order[row, 0]], segment.quantity, details, top))
+            else:
+                unmatched.append(segment.text)
+        return items, unmatched
+
+    def _segment(self, piece: str, phrases: List[List[str]]) -> Optional[_Segment]:
+        """
+        Separa la cantidad y agrega a `phrases` las frases candidatas del
+        pedazo. Las aclaraciones se toman del texto original (sin normalizar).
+        """
+        raw = piece.split()
+        words = [normalize(word) for word in raw]
+
+        def skip_fillers(index: int) -> int:
+            while index < len(words) and (not words[index] or words[index] in FILLERS):
+                index += 1
+            return index
+
+        # Cantidad al principio: "2", "2x", "dos", "una"
+        start = skip_fillers(0)
+        quantity = 0
+        if start < len(words):
+            match = _QUANTITY.match(words[start])
+            if match:
+                quantity = int(match.group(1))
+                start += 1
+            elif words[start] in NUMBER_WORDS:
+                quantity = NUMBER_WORDS[words[start]]
+                start += 1
+        start = skip_fillers(start)
+
+        # El producto termina en la primera aclaración o en una cantidad con x ("napolitana x2")
+        end = len(words)
+        cuts = []
+        for index in range(start + 1, len(words)):
+            if words[index] in NOTE_MARKERS:
+                cuts.append(index)
+                continue
+            match = _QUANTITY.match(words[index])
+            if match and words[index] != match.group(1) and not cuts:
+                quantity = quantity or int(match.group(1))
+                end = index
+                break
+        # Sin cantidad no es un pedido: "muzza" o "milanesa" solos van a la búsqueda
+        if start >= end or not quantity:
+            return None
+
+        segment = _Segment(" ".join(raw), quantity)
+        for cut in [*cuts, end]:
+            phrase = " ".join(words[start:cut]).split()
+            details = " ".join(raw[end + 1:] if cut == end and end < len(words) else raw[cut:])
+            segment.candidates.append((len(phrases), details))
+            phrases.append(phrase)
+        return segment
+
+    def _score(self, phrases: List[List[str]]) -> np.ndarray:
+        """
+        Similitud coseno de cada frase contra cada producto: arma la
+        matriz de consultas (frases x trigramas) y la multiplica una sola
+        vez por la del catálogo.
+        """
+        queries = np.zeros((len(phrases), self.matrix.shape[1]), dtype=np.float32)
+        # La norma cuenta también los trigramas que no están en el catálogo
+        norms = np.zeros(len(phrases), dtype=np.float32)
+        for index, phrase in enumerate(phrases):
+            counts = Counter(trigrams(" ".join(phrase)))
+            for gram, count in counts.items():
+                column = self.vocabulary.get(gram)
+                if column is not None:
+                    queries[index, column] = count
+            norms[index] = np.sqrt(sum(count * count for count in counts.values()))
+        return (queries @ self.matrix.T) / np.maximum(norms, 1e-9)[:, None]
@@ -0,0 +1,302 @@
+import asyncio
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import time
+import httpx
+from shared.webhook import Media
+from shared.metrics import MEDIA_DOWNLOADS
+from shared.log import get_logger, log_event, Timer
+from shared.config import (
+    GRAPH_API_BASE_URL,
+    MEDIA_DIR,
+    MEDIA_CONCURRENCY,
+    MEDIA_QUEUE_SIZE,
+    MEDIA_CHUNK_SIZE,
+    MEDIA_MAX_BYTES,
+)
+
+logger = get_logger("media")
+
+
+class MediaTooLarge(Exception):
+    pass
+
+
+class MediaChecksumMismatch(Exception):
+    pass
+
+
+class MediaJob:
+    """Un archivo a descargar"""
+
+    __slots__ = ("phone_number", "message_id", "kind", "media", "enqueued_at")
+
+    def __init__(self, phone_number: str, message_id: str, kind: str, media: Media):
+        self.phone_number = phone_number
+        self.message_id = message_id
+        self.kind = kind
+        self.media = media
+        self.enqueued_at = time.monotonic()
+
+
+def extension_for(mime_type: str) -> str:
+    """'audio/ogg; codecs=opus' → '.ogg'"""
+    base = mime_type.split(";", 1)[0].strip()
+    if base == "audio/ogg":
+        return ".ogg"
+    return mimetypes.guess_extension(base) or ".bin"
+
+
+# Operaciones de disco que corren en un hilo (ver MediaDownloader)
+
+def _move(tmp_path: str, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(tmp_path, path)
+
+
+def _discard(tmp_path: str):
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+
+def _append(path: str, line: str):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line)
+
+
+class MediaDownloader:
+    """
+    Descarga los archivos que mandan los clientes (notas de voz, fotos,
+    documentos) a disco, fuera del webhook.
+
+    El webhook solo encola (submit); MEDIA_CONCURRENCY workers resuelven
+    el id del archivo en la Graph API y lo bajan por bloques directo a un
+    archivo temporal, así nunca se tiene el archivo entero en memoria.
+
+    Todo lo que toca el disco (escribir cada bloque, mover el archivo,
+    anotar el índice) corre en un hilo aparte con asyncio.to_thread: un
+    disco lento no frena al event loop que atiende el webhook.
+
+    Los archivos se guardan por su sha256 (MEDIA_DIR/ab/abcdef....ogg):
+    si el mismo archivo ya está en disco (Meta manda el sha256 en el
+    webhook) no se vuelve a descargar. Cada descarga se anota en
+    MEDIA_DIR/index.jsonl con el número, el mensaje y la ruta, para que
+    el personal encuentre los archivos de cada cliente.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        directory: str = MEDIA_DIR,
+        concurrency: int = MEDIA_CONCURRENCY,
+        queue_size: int = MEDIA_QUEUE_SIZE,
+        chunk_size: int = MEDIA_CHUNK_SIZE,
+        max_bytes: int = MEDIA_MAX_BYTES,
+    ):
+        # Se reusa el cliente de AsyncWhatsAppService: mismo pool y mismo token
+        self.client = client
+        self.directory = directory
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.tasks: list[asyncio.Task] = []
+        # Descargas en curso por sha256 (o id): si llega el mismo archivo
+        # dos veces seguidas, el segundo job espera al primero
+        self.in_flight: dict[str, asyncio.Future] = {}
+
+        self.downloaded = 0
+        self.cached = 0
+        self.failed = 0
+        self.dropped = 0
+        self.bytes = 0
+
+        os.makedirs(os.path.join(directory, "tmp"), exist_ok=True)
+
+    # ============================================================
+    # ENCOLAR (lo llama el webhook, no espera nada)
+    # ============================================================
+
+    def submit(self, phone_number: str, message_id: str, kind: str, media: Media) -> bool:
+        """Encola la descarga. Devuelve False si la cola está llena."""
+        if not media.id:
+            return False
+        try:
+            self.queue.put_nowait(MediaJob(phone_number, message_id, kind, media))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            MEDIA_DOWNLOADS.inc("dropped")
+            log_event(logger, logging.WARNING, "media_dropped", sender=phone_number, media_id=media.id, depth=self.depth())
+            return False
+
+    # ============================================================
+    # WORKERS
+    # ============================================================
+
+    async def start(self):
+        self.tasks = [
+            asyncio.create_task(self._worker(), name=f"media-{i}")
+            for i in range(self.concurrency)
+        ]
+
+    async def stop(self):
+        """Frena los workers; lo que quede en la cola no se descarga"""
+        if self.depth():
+            log_event(logger, logging.WARNING, "media_pending_at_shutdown", depth=self.depth())
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self.download(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                MEDIA_DOWNLOADS.inc("failed")
+                log_event(
+                    logger, logging.ERROR, "media_failed",
+                    sender=job.phone_number, media_id=job.media.id, error=f"{type(e).__name__}: {e}"
+                )
+            finally:
+                self.queue.task_done()
+
+    # ============================================================
+    # DESCARGA
+    # ============================================================
+
+    def path_for(self, sha256: str, mime_type: str) -> str:
+        return os.path.join(self.directory, sha256[:2], sha256 + extension_for(mime_type))
+
+    async def download(self, job: MediaJob) -> str:
+        """Descarga (o encuentra en disco) el archivo del job y devuelve su ruta"""
+        media = job.media
+
+        # 1) Si ya lo tenemos (o se está bajando), ni siquiera se consulta la Graph API
+        key = media.sha256 or media.id
+        pending = self.in_flight.get(key)
+        if pending is not None:
+            path, sha256, mime_type = await asyncio.shield(pending)
+            return await self._cache_hit(job, path, sha256, mime_type)
+        if media.sha256:
+            path = self.path_for(media.sha256, media.mime_type)
+            if await asyncio.to_thread(os.path.exists, path):
+                return await self._cache_hit(job, path, media.sha256, media.mime_type)
+
+        future = self.in_flight[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await self._fetch(job)
+            future.set_result(result)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Se marca como leída por si nadie más la estaba esperando
+            future.exception()
+            raise
+        finally:
+            del self.in_flight[key]
+
+        path, sha256, mime_type = result
+        await self._record(job, path, sha256, mime_type)
+        return path
+
+    async def _cache_hit(self, job: MediaJob, path: str, sha256: str, mime_type: str) -> str:
+        self.cached += 1
+        MEDIA_DOWNLOADS.inc("cached")
+        await self._record(job, path, sha256, mime_type)
+        return path
+
+    async def _fetch(self, job: MediaJob) -> tuple[str, str, str]:
+        """Resuelve el id y baja el archivo; devuelve (ruta, sha256, mime_type)"""
+        timer = Timer()
+        media = job.media
+
+        # 2) Resolver el id: la Graph API devuelve una URL temporal
+        response = await self.client.get(f"{GRAPH_API_BASE_URL}/{media.id}")
+        response.raise_for_status()
+        info = response.json()
+        mime_type = info.get("mime_type") or media.mime_type
+        expected = info.get("sha256") or media.sha256
+        if int(info.get("file_size") or 0) > self.max_bytes:
+            raise MediaTooLarge(f"{info['file_size']} bytes")
+
+        # 3) Bajarlo por bloques a un temporal, calculando el sha256 en el camino
+        tmp_path = os.path.join(self.directory, "tmp", f"{media.id}.part")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            async with self.client.stream("GET", info["url"]) as stream:
+                stream.raise_for_status()
+                f = await asyncio.to_thread(open, tmp_path, "wb")
+                try:
+                    async for chunk in stream.aiter_bytes(self.chunk_size):
+                        size += len(chunk)
+                        if size > self.max_bytes:
+                            raise MediaTooLarge(f"más de {self.max_bytes} bytes")
+                        digest.update(chunk)
+                        await asyncio.to_thread(f.write, chunk)
+                finally:
+                    await asyncio.to_thread(f.close)
+
+            sha256 = digest.hexdigest()
+            if expected and sha256 != expected:
+                raise MediaChecksumMismatch(f"esperado {expected}, recibido {sha256}")
+
+            path = self.path_for(sha256, mime_type)
+            await asyncio.to_thread(_move, tmp_path, path)
+        finally:
+            await asyncio.to_thread(_discard, tmp_path)
+
+        self.downloaded += 1
+        self.bytes += size
+        MEDIA_DOWNLOADS.inc("downloaded")
+        log_event(
+            logger, logging.INFO, "media_downloaded",
+            sender=job.phone_number, media_id=media.id, kind=job.kind,
+            bytes=size, duration_ms=timer.ms()
+        )
+        return path, sha256, mime_type
+
+    async def _record(self, job: MediaJob, path: str, sha256: str, mime_type: str):
+        """Anota la descarga en el índice (una línea JSON por archivo recibido)"""
+        line = json.dumps({
+            "ts": round(time.time(), 3),
+            "sender": job.phone_number,
+            "message_id": job.message_id,
+            "kind": job.kind,
+            "media_id": job.media.id,
+            "mime_type": mime_type,
+            "sha256": sha256,
+            "caption": job.media.caption,
+            "path": os.path.relpath(path, self.directory),
+        }, ensure_ascii=False)
+        await asyncio.to_thread(_append, os.path.join(self.directory, "index.jsonl"), line + "\n")
+
+    # ============================================================
+    # ESTADÍSTICAS
+    # ============================================================
+
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth(),
+            "capacity": self.queue.maxsize,
+            "workers": len(self.tasks),
+            "downloaded": self.downloaded,
+            "cached": self.cached,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "bytes": self.bytes,
+        }
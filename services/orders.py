@@ -0,0 +1,519 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from services.catalog import Product
+from shared.config import (
+    ORDERS_DB_PATH,
+    ORDERS_FLUSH_INTERVAL,
+    ORDERS_FLUSH_BATCH,
+    ORDERS_FLUSH_MAX_BACKOFF,
+    ORDERS_CACHE_USERS,
+    ORDERS_HISTORY_LIMIT,
+)
+from shared.log import get_logger, log_event, Timer
+
+logger = get_logger("orders")
+
+
+class LineItem:
+    """Un renglón del carrito o de un pedido"""
+
+    __slots__ = ("product_id", "name", "unit_price", "quantity", "details")
+
+    def __init__(self, product_id: str, name: str, unit_price: int, quantity: int, details: str = ""):
+        self.product_id = product_id
+        self.name = name
+        self.unit_price = unit_price
+        self.quantity = quantity
+        self.details = details
+
+    @property
+    def subtotal(self) -> int:
+        return self.unit_price * self.quantity
+
+    def row(self) -> tuple:
+        return (self.product_id, self.name, self.unit_price, self.quantity, self.details)
+
+
+class Order:
+    """Un pedido confirmado (los renglones no cambian después de confirmarlo)"""
+
+    __slots__ = ("id", "phone_number", "created_at", "total", "items")
+
+    def __init__(self, id: int, phone_number: str, created_at: float, total: int, items: Tuple[LineItem, ...]):
+        self.id = id
+        self.phone_number = phone_number
+        self.created_at = created_at
+        self.total = total
+        self.items = items
+
+
+class UserOrders:
+    """Lo que se tiene en memoria de un cliente: su carrito y sus últimos pedidos"""
+
+    __slots__ = ("cart", "history")
+
+    def __init__(self, cart: List[LineItem], history: List[Order]):
+        self.cart = cart
+        # Del más nuevo al más viejo, como mucho ORDERS_HISTORY_LIMIT
+        self.history = history
+
+
+class OrderStore:
+    """
+    Carritos y pedidos.
+
+    El carrito y los últimos pedidos de cada cliente activo se mantienen
+    en memoria (LRU de ORDERS_CACHE_USERS clientes); leerlos o calcular
+    el total recorre solo los renglones de ese cliente.
+
+    Las escrituras son diferidas (write-behind): cada cambio queda
+    pendiente en memoria y una tarea en segundo plano los escribe a
+    SQLite (WAL) en una sola transacción cada ORDERS_FLUSH_INTERVAL
+    segundos, o antes si se juntan ORDERS_FLUSH_BATCH. La escritura
+    corre en un hilo aparte, así la conversación nunca espera al disco.
+
+    Si la base no responde (sqlite3.OperationalError: bloqueada, disco
+    lleno) lo no escrito vuelve a quedar pendiente y se reintenta. Si el
+    lote falla por algo de sus datos, se escribe de a un carrito o pedido
+    y lo que no entra se aparta en la tabla rejected_writes, así un
+    renglón roto no frena a los demás.
+
+    Los pedidos se buscan por el índice (phone, id), así el historial
+    de un cliente no depende de cuántos pedidos haya en total.
+
+    Con varios procesos sobre la misma base (WORKER_PROCESSES > 1) cada
+    uno numera los pedidos en su propia clase módulo `id_stride`
+    (id % id_stride == id_offset), así dos procesos nunca usan el mismo id.
+    """
+
+    def __init__(
+        self,
+        path: str = ORDERS_DB_PATH,
+        flush_interval: float = ORDERS_FLUSH_INTERVAL,
+        flush_batch: int = ORDERS_FLUSH_BATCH,
+        max_backoff: float = ORDERS_FLUSH_MAX_BACKOFF,
+        max_users: int = ORDERS_CACHE_USERS,
+        history_limit: int = ORDERS_HISTORY_LIMIT,
+        id_offset: int = 0,
+        id_stride: int = 1,
+    ):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.max_backoff = max_backoff
+        self.max_users = max_users
+        self.history_limit = history_limit
+
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Una conexión para escribir (hilo del flush) y otra para leer (event loop)
+        self.writer = self._connect()
+        self._create_schema()
+        self.conn = self.writer if path == ":memory:" else self._connect()
+
+        self.users: OrderedDict[str, UserOrders] = OrderedDict()
+        self.id_stride = id_stride
+        first = self.conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM orders").fetchone()[0]
+        self.next_order_id = first + (id_offset - first) % id_stride
+
+        # Cambios pendientes de escribir: carrito completo por número y pedidos nuevos
+        self.dirty_carts: Dict[str, Tuple[LineItem, ...]] = {}
+        self.pending_orders: List[Order] = []
+        # Lo que se está escribiendo en este momento (todavía no está en la base)
+        self.flushing: Tuple[Dict[str, Tuple[LineItem, ...]], List[Order]] = ({}, [])
+
+        self.wakeup: Optional[asyncio.Event] = None
+        self.task: Optional[asyncio.Task] = None
+
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.rejected = 0
+        self.rows_written = 0
+        self.last_flush_ms = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def _create_schema(self):
+        with self.writer:
+            self.writer.execute(
+                "CREATE TABLE IF NOT EXISTS cart_items ("
+                " phone TEXT NOT NULL,"
+                " position INTEGER NOT NULL,"
+                " product_id TEXT NOT NULL,"
+                " name TEXT NOT NULL,"
+                " unit_price INTEGER NOT NULL,"
+                " quantity INTEGER NOT NULL,"
+                " details TEXT NOT NULL DEFAULT '',"
+                " PRIMARY KEY (phone, position)) WITHOUT ROWID"
+            )
+            self.writer.execute(
+                "CREATE TABLE IF NOT EXISTS orders ("
+                " id INTEGER PRIMARY KEY,"
+                " phone TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " total INTEGER NOT NULL)"
+            )
+            self.writer.execute("CREATE INDEX IF NOT EXISTS idx_orders_phone ON orders (phone, id)")
+            self.writer.execute(
+                "CREATE TABLE IF NOT EXISTS order_items ("
+                " order_id INTEGER NOT NULL,"
+                " position INTEGER NOT NULL,"
+                " product_id TEXT NOT NULL,"
+                " name TEXT NOT NULL,"
+                " unit_price INTEGER NOT NULL,"
+                " quantity INTEGER NOT NULL,"
+                " details TEXT NOT NULL DEFAULT '',"
+                " PRIMARY KEY (order_id, position)) WITHOUT ROWID"
+            )
+            # Carritos y pedidos que no se pudieron escribir por sus datos (ver _reject)
+            self.writer.execute(
+                "CREATE TABLE IF NOT EXISTS rejected_writes ("
+                " rejected_at REAL NOT NULL,"
+                " kind TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " data TEXT NOT NULL,"
+                " error TEXT NOT NULL)"
+            )
+
+    # ============================================================
+    # CARRITO
+    # ============================================================
+
+    def cart(self, phone_number: str) -> List[LineItem]:
+        """Renglones del carrito (no modificar la lista directamente)"""
+        return self._user(phone_number).cart
+
+    def cart_total(self, phone_number: str) -> int:
+        return sum(item.subtotal for item in self._user(phone_number).cart)
+
+    def add_item(self, phone_number: str, product: Product, quantity: int, details: str = "") -> LineItem:
+        """Agrega un producto al carrito (suma la cantidad si ya estaba con las mismas aclaraciones)"""
+        cart = self._user(phone_number).cart
+        for item in cart:
+            if item.product_id == product.id and item.details == details:
+                item.quantity += quantity
+                break
+        else:
+            item = LineItem(product.id, product.name, product.price, quantity, details)
+            cart.append(item)
+        self._cart_changed(phone_number, cart)
+        return item
+
+    def clear_cart(self, phone_number: str):
+        user = self._user(phone_number)
+        if user.cart:
+            user.cart = []
+            self._cart_changed(phone_number, user.cart)
+
+    # ============================================================
+    # PEDIDOS
+    # ============================================================
+
+    def place_order(self, phone_number: str) -> Optional[Order]:
+        """Convierte el carrito en un pedido y vacía el carrito. None si estaba vacío."""
+        user = self._user(phone_number)
+        if not user.cart:
+            return None
+
+        items = tuple(LineItem(*item.row()) for item in user.cart)
+        order = Order(self.next_order_id, phone_number, time.time(), sum(i.subtotal for i in items), items)
+        self.next_order_id += self.id_stride
+
+        user.history.insert(0, order)
+        del user.history[self.history_limit:]
+        self.pending_orders.append(order)
+
+        user.cart = []
+        self._cart_changed(phone_number, user.cart)
+        return order
+
+    def orders(self, phone_number: str) -> List[Order]:
+        """Últimos pedidos del cliente, del más nuevo al más viejo"""
+        return self._user(phone_number).history
+
+    # ============================================================
+    # MEMORIA
+    # ============================================================
+
+    def _user(self, phone_number: str) -> UserOrders:
+        user = self.users.get(phone_number)
+        if user is not None:
+            self.users.move_to_end(phone_number)
+            return user
+
+        user = UserOrders(self._load_cart(phone_number), self._load_history(phone_number))
+        self.users[phone_number] = user
+        # Desalojar es seguro: lo pendiente sigue en dirty_carts / pending_orders
+        while len(self.users) > self.max_users:
+            self.users.popitem(last=False)
+        return user
+
+    def _load_cart(self, phone_number: str) -> List[LineItem]:
+        for carts in (self.dirty_carts, self.flushing[0]):
+            if phone_number in carts:
+                return [LineItem(*item.row()) for item in carts[phone_number]]
+
+        rows = self.conn.execute(
+            "SELECT product_id, name, unit_price, quantity, details FROM cart_items"
+            " WHERE phone = ? ORDER BY position",
+            (phone_number,),
+        ).fetchall()
+        return [LineItem(*row) for row in rows]
+
+    def _load_history(self, phone_number: str) -> List[Order]:
+        orders = self.conn.execute(
+            "SELECT id, created_at, total FROM orders WHERE phone = ? ORDER BY id DESC LIMIT ?",
+            (phone_number, self.history_limit),
+        ).fetchall()
+
+        items: Dict[int, List[LineItem]] = {order_id: [] for order_id, _, _ in orders}
+        if orders:
+            placeholders = ",".join("?" * len(orders))
+            for row in self.conn.execute(
+                "SELECT order_id, product_id, name, unit_price, quantity, details FROM order_items"
+                f" WHERE order_id IN ({placeholders}) ORDER BY order_id, position",
+                tuple(items),
+            ):
+                items[row[0]].append(LineItem(*row[1:]))
+
+        history = [
+            Order(order_id, phone_number, created_at, total, tuple(items[order_id]))
+            for order_id, created_at, total in orders
+        ]
+
+        # Pedidos que todavía no llegaron a la base
+        unsaved = [o for o in self.flushing[1] + self.pending_orders if o.phone_number == phone_number]
+        if unsaved:
+            saved_ids = set(items)
+            history = [o for o in reversed(unsaved) if o.id not in saved_ids] + history
+            del history[self.history_limit:]
+        return history
+
+    def _cart_changed(self, phone_number: str, cart: List[LineItem]):
+        # Se guarda una copia: el carrito en memoria puede seguir cambiando
+        # mientras el hilo de escritura la usa
+        self.dirty_carts[phone_number] = tuple(LineItem(*item.row()) for item in cart)
+        if self.wakeup is not None and len(self.dirty_carts) + len(self.pending_orders) >= self.flush_batch:
+            self.wakeup.set()
+
+    # ============================================================
+    # ESCRITURA DIFERIDA
+    # ============================================================
+
+    async def start(self):
+        """Arranca la tarea que escribe los cambios pendientes"""
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.create_task(self._flusher())
+
+    async def stop(self):
+        """Detiene la tarea y escribe lo que quede pendiente (sin lanzar: se llama al apagar)"""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        try:
+            await self.flush_async()
+        except Exception:
+            self._unsaved_at_shutdown()
+
+    async def _flusher(self):
+        # Fallos seguidos: mientras la base no responde se espera cada vez
+        # más (hasta max_backoff) en vez de reintentar en cada intervalo.
+        # Lo que no se pudo escribir sigue pendiente (ver _restore).
+        failures = 0
+        while True:
+            if failures:
+                await asyncio.sleep(self._retry_delay(failures))
+            else:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self.wakeup.clear()
+            try:
+                await self.flush_async()
+                failures = 0
+            except Exception:
+                failures += 1
+                log_event(
+                    logger, logging.WARNING, "orders_flush_retry",
+                    failures=failures, retry_in=self._retry_delay(failures),
+                    pending=len(self.dirty_carts) + len(self.pending_orders),
+                )
+
+    def _retry_delay(self, failures: int) -> float:
+        return min(self.max_backoff, self.flush_interval * 2 ** failures)
+
+    async def flush_async(self):
+        """Escribe lo pendiente en un hilo aparte"""
+        batch = self._take()
+        if batch is None:
+            return
+        try:
+            unwritten = await asyncio.to_thread(self._write_batch, *batch)
+        finally:
+            self.flushing = ({}, [])
+        if unwritten is not None:
+            self._restore(*unwritten)
+            raise unwritten[2]
+
+    def flush(self):
+        """Escribe lo pendiente en este mismo hilo (al cerrar, o sin event loop)"""
+        batch = self._take()
+        if batch is None:
+            return
+        try:
+            unwritten = self._write_batch(*batch)
+        finally:
+            self.flushing = ({}, [])
+        if unwritten is not None:
+            self._restore(*unwritten)
+            raise unwritten[2]
+
+    def _take(self):
+        if not self.dirty_carts and not self.pending_orders:
+            return None
+        batch = (self.dirty_carts, self.pending_orders)
+        self.dirty_carts, self.pending_orders = {}, []
+        self.flushing = batch
+        return batch
+
+    def _write_batch(self, carts: Dict[str, Tuple[LineItem, ...]], orders: List[Order]):
+        """
+        Escribe el lote en una transacción; si falla por sus datos, lo
+        escribe de a uno y aparta lo que no entra. Ante un error
+        transitorio devuelve (carritos, pedidos, error) con lo que quedó
+        sin escribir; None si no quedó nada. Corre en el hilo de escritura.
+        """
+        try:
+            self._write(carts, orders)
+            return None
+        except sqlite3.OperationalError as e:
+            return carts, orders, e
+        except Exception as e:
+            log_event(
+                logger, logging.WARNING, "orders_flush_split",
+                carts=len(carts), orders=len(orders), error=f"{type(e).__name__}: {e}"
+            )
+
+        pieces = [({phone_number: cart}, []) for phone_number, cart in carts.items()]
+        pieces += [({}, [order]) for order in orders]
+        for index, (piece_carts, piece_orders) in enumerate(pieces):
+            try:
+                self._write(piece_carts, piece_orders)
+            except sqlite3.OperationalError as e:
+                rest = pieces[index:]
+                return (
+                    {phone_number: cart for rest_carts, _ in rest for phone_number, cart in rest_carts.items()},
+                    [order for _, rest_orders in rest for order in rest_orders],
+                    e,
+                )
+            except Exception as e:
+                self._reject(piece_carts, piece_orders, e)
+        return None
+
+    def _reject(self, carts: Dict[str, Tuple[LineItem, ...]], orders: List[Order], error: Exception):
+        """Aparta un carrito o pedido que nunca se va a poder escribir (queda en el log y en rejected_writes)"""
+        self.rejected += 1
+        if carts:
+            ((key, items),) = carts.items()
+            kind, data = "cart", {"phone": key, "items": [item.row() for item in items]}
+        else:
+            (order,) = orders
+            kind, key = "order", str(order.id)
+            data = {
+                "id": order.id, "phone": order.phone_number, "created_at": order.created_at,
+                "total": order.total, "items": [item.row() for item in order.items],
+            }
+        data = json.dumps(data, ensure_ascii=False, default=repr)
+        error = f"{type(error).__name__}: {error}"
+        log_event(logger, logging.ERROR, "orders_write_rejected", kind=kind, key=key, data=data, error=error)
+        try:
+            with self.writer:
+                self.writer.execute(
+                    "INSERT INTO rejected_writes VALUES (?, ?, ?, ?, ?)", (time.time(), kind, key, data, error)
+                )
+        except sqlite3.Error:
+            logger.exception("orders_reject_error", extra={"fields": {"kind": kind, "key": key}})
+
+    def _restore(self, carts: Dict[str, Tuple[LineItem, ...]], orders: List[Order], error: Exception):
+        """Si la base no respondió, lo no escrito vuelve a quedar pendiente"""
+        self.failed_flushes += 1
+        log_event(
+            logger, logging.ERROR, "orders_flush_error",
+            carts=len(carts), orders=len(orders), error=f"{type(error).__name__}: {error}"
+        )
+        for phone_number, cart in carts.items():
+            # Si el carrito cambió mientras tanto, gana la versión más nueva
+            self.dirty_carts.setdefault(phone_number, cart)
+        self.pending_orders[:0] = orders
+
+    def _unsaved_at_shutdown(self):
+        log_event(
+            logger, logging.ERROR, "orders_unsaved_at_shutdown",
+            carts=len(self.dirty_carts), orders=len(self.pending_orders),
+        )
+
+    def _write(self, carts: Dict[str, Tuple[LineItem, ...]], orders: List[Order]):
+        timer = Timer()
+        cart_rows = [
+            (phone_number, position, *item.row())
+            for phone_number, cart in carts.items()
+            for position, item in enumerate(cart)
+        ]
+        item_rows = [
+            (order.id, position, *item.row())
+            for order in orders
+            for position, item in enumerate(order.items)
+        ]
+
+        with self.writer:
+            self.writer.executemany("DELETE FROM cart_items WHERE phone = ?", ((phone,) for phone in carts))
+            self.writer.executemany("INSERT INTO cart_items VALUES (?, ?, ?, ?, ?, ?, ?)", cart_rows)
+            self.writer.executemany(
+                "INSERT INTO orders (id, phone, created_at, total) VALUES (?, ?, ?, ?)",
+                ((o.id, o.phone_number, o.created_at, o.total) for o in orders),
+            )
+            self.writer.executemany("INSERT INTO order_items VALUES (?, ?, ?, ?, ?, ?, ?)", item_rows)
+
+        self.flushes += 1
+        self.rows_written += len(carts) + len(cart_rows) + len(orders) + len(item_rows)
+        self.last_flush_ms = timer.ms()
+        log_event(
+            logger, logging.DEBUG, "orders_flushed",
+            carts=len(carts), orders=len(orders), duration_ms=self.last_flush_ms
+        )
+
+    def stats(self) -> dict:
+        return {
+            "users_cached": len(self.users),
+            "pending_carts": len(self.dirty_carts),
+            "pending_orders": len(self.pending_orders),
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "rejected": self.rejected,
+            "rows_written": self.rows_written,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+    def close(self):
+        try:
+            self.flush()
+        except sqlite3.Error:
+            self._unsaved_at_shutdown()
+        if self.conn is not self.writer:
+            self.conn.close()
+        self.writer.close()
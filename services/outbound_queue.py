@@ -0,0 +1,503 @@
+import asyncio
+import logging
+import random
+import time
+import zlib
+from collections import deque
+from services.whatsapp_service import (
+    AsyncWhatsAppService,
+    GraphAPIError,
+    build_text_payload,
+    build_button_payload,
+    build_list_payload,
+    is_retryable,
+    sent_message_id,
+)
+from services.templates import encode_payload
+from shared.flow import current_handler
+from shared.log import get_logger, log_event
+from shared.config import (
+    OUTBOUND_WORKERS,
+    OUTBOUND_QUEUE_SIZE,
+    OUTBOUND_RATE_PER_SECOND,
+    OUTBOUND_BURST,
+    OUTBOUND_RECIPIENT_INTERVAL,
+    OUTBOUND_MAX_ATTEMPTS,
+    OUTBOUND_BACKOFF_BASE,
+    OUTBOUND_BACKOFF_MAX,
+    BREAKER_THRESHOLD,
+    BREAKER_COOLDOWN,
+)
+
+logger = get_logger("outbound")
+
+
+def backoff_delay(attempt: int, error: Exception, base: float, cap: float) -> float:
+    """Espera antes del próximo intento: Retry-After si vino, si no exponencial con jitter completo"""
+    if isinstance(error, GraphAPIError) and error.retry_after:
+        return min(error.retry_after, cap)
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class TokenBucket:
+    """
+    Limitador global de envíos (token bucket).
+
+    Se recargan `rate` tokens por segundo hasta un máximo de `burst`.
+    Cada envío consume un token; si no hay, se espera lo justo para que
+    se recargue uno.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """
+    Corta los envíos mientras la Graph API está fallando.
+
+    Después de `threshold` fallas transitorias seguidas (429, 5xx,
+    timeouts) se abre: nadie envía durante `cooldown` segundos. Pasado
+    ese tiempo queda medio abierto y sale un solo envío de prueba; si
+    funciona se cierra, si falla se vuelve a abrir.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.retry_at = 0.0
+        self.changed = asyncio.Event()
+        self.trips = 0
+
+    async def wait(self) -> bool:
+        """
+        Vuelve cuando se puede enviar. Devuelve True si este envío es la
+        prueba: quien la hace la termina con success() o failure(), o con
+        abort() si no llegó a tener resultado (p. ej. se canceló).
+        """
+        while self.state != self.CLOSED:
+            if self.state == self.OPEN:
+                wait = self.retry_at - time.monotonic()
+                if wait <= 0:
+                    # Este envío es la prueba
+                    self.state = self.HALF_OPEN
+                    return True
+                await asyncio.sleep(wait)
+            else:
+                # Hay una prueba en curso: esperar su resultado
+                await self.changed.wait()
+        return False
+
+    def success(self):
+        self.failures = 0
+        if self.state != self.CLOSED:
+            log_event(logger, logging.INFO, "breaker_closed")
+            self._set(self.CLOSED)
+
+    def failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.threshold):
+            self.retry_at = time.monotonic() + self.cooldown
+            self.trips += 1
+            log_event(logger, logging.WARNING, "breaker_opened", failures=self.failures, cooldown_s=self.cooldown)
+            self._set(self.OPEN)
+
+    def abort(self):
+        """
+        La prueba terminó sin resultado: se vuelve a abrir y sale otra
+        después del cooldown (si no, los demás esperarían para siempre).
+        No hace nada si la prueba ya informó su resultado.
+        """
+        if self.state == self.HALF_OPEN:
+            self.retry_at = time.monotonic() + self.cooldown
+            self._set(self.OPEN)
+
+    def _set(self, state: str):
+        self.state = state
+        # Despierta a los que esperaban el resultado de la prueba
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class SendRate:
+    """
+    Envíos por segundo en los últimos `window` segundos.
+
+    Un contador por segundo en un ring fijo de `window` lugares: anotar un
+    envío es sumar 1 y la memoria no crece aunque nadie consulte la tasa.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self.counts = [0] * window
+        self.seconds = [-1] * window
+
+    def add(self):
+        second = int(time.monotonic())
+        slot = second % self.window
+        if self.seconds[slot] != second:
+            self.seconds[slot] = second
+            self.counts[slot] = 0
+        self.counts[slot] += 1
+
+    def per_second(self) -> float:
+        cutoff = int(time.monotonic()) - self.window
+        return sum(count for count, second in zip(self.counts, self.seconds) if second > cutoff) / self.window
+
+
+class OutboundMessage:
+    """Un mensaje pendiente de envío"""
+
+    __slots__ = ("phone_number", "payload", "tag", "seq", "enqueued_at", "attempts", "not_before")
+
+    def __init__(self, phone_number: str, payload, tag: str = "", seq: int = 0):
+        self.phone_number = phone_number
+        self.payload = payload
+        # Quién lo envió (handler o plantilla), para los estados de entrega
+        self.tag = tag
+        # Número de registro en el journal (0 = sin journal)
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+        # Intentos hechos y cuándo se puede reintentar (monotonic)
+        self.attempts = 0
+        self.not_before = 0.0
+
+
+class OutboundQueue:
+    """
+    Cola de salida con workers async.
+
+    Los handlers llaman a send_text_message / send_button_message /
+    send_list_message igual que con WhatsAppService, pero acá solo se
+    encola el payload y se vuelve enseguida. Un pool de workers envía en
+    segundo plano respetando:
+
+    - un token bucket global (throughput máximo contra la Cloud API)
+    - un intervalo mínimo entre mensajes al mismo número
+
+    Cada número de teléfono cae siempre en el mismo worker (hash del
+    número), así los mensajes a un mismo usuario salen en orden. Si a un
+    número todavía no le toca, el worker no lo espera: sus mensajes pasan
+    a una tarea propia que los envía en orden cuando se cumple el
+    intervalo, y el worker sigue con los demás números.
+
+    Los errores transitorios (429, 5xx, timeouts) se reintentan hasta
+    OUTBOUND_MAX_ATTEMPTS veces con espera exponencial y jitter (o lo que
+    pida Retry-After). La espera es solo de ese número: el mensaje pasa
+    a su tarea de retenidos (los siguientes van detrás, en orden) y el
+    worker sigue con los demás. Un CircuitBreaker frena a todos los
+    workers mientras la API sigue fallando. Los errores definitivos
+    (número inválido, payload mal armado) no se reintentan.
+
+    Si se pasa un `journal` (OutboxJournal), cada mensaje se anota antes
+    de enviarse y se marca al terminar; al arrancar se vuelven a encolar
+    los que quedaron sin enviar.
+
+    Si se pasa un `tracker` (DeliveryTracker), cada mensaje aceptado se
+    anota con su wamid y el handler que lo encoló, para cruzarlo después
+    con los webhooks de estado.
+    """
+
+    # Ventana (segundos) sobre la que se calcula la tasa de vaciado
+    RATE_WINDOW = 60
+
+    def __init__(
+        self,
+        service: AsyncWhatsAppService,
+        workers: int = OUTBOUND_WORKERS,
+        max_size: int = OUTBOUND_QUEUE_SIZE,
+        rate_per_second: float = OUTBOUND_RATE_PER_SECOND,
+        burst: int = OUTBOUND_BURST,
+        recipient_interval: float = OUTBOUND_RECIPIENT_INTERVAL,
+        max_attempts: int = OUTBOUND_MAX_ATTEMPTS,
+        backoff_base: float = OUTBOUND_BACKOFF_BASE,
+        backoff_max: float = OUTBOUND_BACKOFF_MAX,
+        breaker: CircuitBreaker = None,
+        journal=None,
+        tracker=None,
+    ):
+        self.service = service
+        self.journal = journal
+        self.tracker = tracker
+        self.bucket = TokenBucket(rate_per_second, burst)
+        self.breaker = breaker or CircuitBreaker(BREAKER_THRESHOLD, BREAKER_COOLDOWN)
+        self.recipient_interval = recipient_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        # Una cola por worker; el tamaño máximo se reparte entre todas
+        per_worker = max(1, max_size // workers)
+        self.queues = [asyncio.Queue(maxsize=per_worker) for _ in range(workers)]
+        self.tasks: list[asyncio.Task] = []
+
+        # Último envío por número (solo los que todavía están dentro del intervalo)
+        self.last_sent: dict[str, float] = {}
+        # Mensajes retenidos hasta que se cumpla el intervalo de su número,
+        # y las tareas que los envían
+        self.held: dict[str, deque[OutboundMessage]] = {}
+        self.pacers: set[asyncio.Task] = set()
+
+        # Contadores
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.retried = 0
+        self.replayed = 0
+        self.rate = SendRate(self.RATE_WINDOW)
+
+    # ============================================================
+    # API PARA LOS HANDLERS (no bloquea)
+    # ============================================================
+
+    def send_text_message(self, phone_number: str, text: str):
+        """Encola un mensaje de texto simple"""
+        self.enqueue(phone_number, build_text_payload(phone_number, text))
+
+    def send_button_message(self, phone_number: str, body_text: str, buttons: list):
+        """Encola un mensaje con botones"""
+        self.enqueue(phone_number, build_button_payload(phone_number, body_text, buttons))
+
+    def send_list_message(self, phone_number: str, body_text: str, button_text: str, sections: list):
+        """Encola un mensaje con lista"""
+        self.enqueue(phone_number, build_list_payload(phone_number, body_text, button_text, sections))
+
+    def send_template(self, phone_number: str, template):
+        """Encola un PayloadTemplate pre-serializado (solo se agrega el destinatario)"""
+        self.enqueue(phone_number, template.render(phone_number))
+
+    def enqueue(self, phone_number: str, payload, tag: str = "") -> bool:
+        """
+        Encola un payload ya armado (dict o bytes serializados).
+        `tag` identifica el envío en los estados de entrega; por defecto
+        es el handler que se está ejecutando.
+        Devuelve False si la cola está llena.
+        """
+        queue = self._queue_for(phone_number)
+        if queue.full():
+            self.dropped += 1
+            log_event(logger, logging.WARNING, "outbound_queue_full", recipient=phone_number)
+            return False
+
+        tag = tag or current_handler.get()
+        seq = 0
+        if self.journal is not None:
+            if not isinstance(payload, bytes):
+                payload = encode_payload(payload)
+            seq = self.journal.append(phone_number, tag, payload)
+        queue.put_nowait(OutboundMessage(phone_number, payload, tag, seq))
+        self.enqueued += 1
+        return True
+
+    def _queue_for(self, phone_number: str) -> asyncio.Queue:
+        return self.queues[zlib.crc32(phone_number.encode()) % len(self.queues)]
+
+    # ============================================================
+    # WORKERS
+    # ============================================================
+
+    async def start(self):
+        """
+        Arranca los workers (se llama desde el lifespan) y, si hay
+        journal, vuelve a encolar lo que quedó sin enviar.
+        """
+        self.tasks = [
+            asyncio.create_task(self._worker(queue), name=f"outbound-{i}")
+            for i, queue in enumerate(self.queues)
+        ]
+        if self.journal is not None:
+            pending = self.journal.recover()
+            await self.journal.start()
+            for seq, phone_number, tag, payload in pending:
+                # put (no put_nowait): si es más que la cola, se espera a los workers
+                await self._queue_for(phone_number).put(OutboundMessage(phone_number, payload, tag, seq))
+            self.replayed = len(pending)
+            if pending:
+                log_event(logger, logging.WARNING, "outbound_replayed", messages=len(pending))
+
+    async def stop(self, timeout: float = 5.0):
+        """Espera a que se vacíe la cola (hasta `timeout` segundos) y frena los workers"""
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in self.queues)),
+                timeout,
+            )
+        except asyncio.TimeoutError:
+            log_event(logger, logging.WARNING, "outbound_unsent_at_shutdown", depth=self.depth())
+
+        tasks = [*self.tasks, *self.pacers]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.tasks = []
+        # Lo que no se llegó a enviar queda en el journal para el próximo arranque
+        if self.journal is not None:
+            await self.journal.stop()
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            message = await queue.get()
+            phone_number = message.phone_number
+
+            held = self.held.get(phone_number)
+            if held is not None:
+                # Ya hay mensajes de este número esperando: va detrás de ellos
+                held.append(message)
+                continue
+            if self._wait(phone_number) > 0 or not await self._deliver(message):
+                # Todavía no le toca (o hay que reintentar): lo espera su propia tarea
+                self._hold(queue, message)
+                continue
+            queue.task_done()
+
+            # Limpieza ocasional: los números fuera del intervalo no necesitan entrada
+            if len(self.last_sent) > 10_000:
+                cutoff = time.monotonic() - self.recipient_interval
+                self.last_sent = {p: t for p, t in self.last_sent.items() if t > cutoff}
+
+    def _hold(self, queue: asyncio.Queue, message: OutboundMessage):
+        self.held[message.phone_number] = deque((message,))
+        task = asyncio.create_task(self._send_held(queue, message.phone_number))
+        self.pacers.add(task)
+        task.add_done_callback(self.pacers.discard)
+
+    async def _send_held(self, queue: asyncio.Queue, phone_number: str):
+        """
+        Envía en orden los mensajes retenidos de un número, respetando su
+        intervalo y la espera de los reintentos. Un mensaje sale de la
+        fila recién cuando termina (enviado o fallido).
+        """
+        held = self.held[phone_number]
+        try:
+            # Sin await entre esta revisión y el del: el worker no puede
+            # agregar nada que quede sin enviar
+            while held:
+                message = held[0]
+                wait = max(self._wait(phone_number), message.not_before - time.monotonic())
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                if await self._deliver(message):
+                    held.popleft()
+                    queue.task_done()
+        finally:
+            del self.held[phone_number]
+
+    async def _deliver(self, message: OutboundMessage) -> bool:
+        """Un intento de envío. False si hay que reintentar (desde message.not_before)."""
+        try:
+            if self.journal is not None:
+                await self.journal.committed(message.seq)
+            return await self._send(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("outbound_worker_error", extra={"fields": {"recipient": message.phone_number}})
+            return True
+        finally:
+            self.last_sent[message.phone_number] = time.monotonic()
+
+    async def _send(self, message: OutboundMessage) -> bool:
+        """
+        Envía una vez. Si termina (enviado o fallido) lo marca en el
+        journal y devuelve True; si el error es transitorio y quedan
+        intentos, anota cuándo reintentar y devuelve False.
+        """
+        message.attempts += 1
+        attempt = message.attempts
+        probe = await self.breaker.wait()
+        try:
+            await self.bucket.acquire()
+            try:
+                response = await self.service.send_payload(message.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                retryable = is_retryable(e)
+                if retryable:
+                    self.breaker.failure()
+                else:
+                    # La API contestó (con un error nuestro): está funcionando
+                    self.breaker.success()
+                if not retryable or attempt >= self.max_attempts:
+                    self.failed += 1
+                    log_event(
+                        logger, logging.ERROR, "outbound_send_failed",
+                        recipient=message.phone_number, attempts=attempt, error=str(e)
+                    )
+                    if self.journal is not None:
+                        self.journal.done(message.seq, failed=True)
+                    return True
+                self.retried += 1
+                message.not_before = time.monotonic() + backoff_delay(attempt, e, self.backoff_base, self.backoff_max)
+                return False
+            self.breaker.success()
+        finally:
+            if probe:
+                self.breaker.abort()
+
+        if self.tracker is not None:
+            self.tracker.record_sent(sent_message_id(response), message.tag)
+        if self.journal is not None:
+            self.journal.done(message.seq)
+        self.sent += 1
+        self.rate.add()
+        return True
+
+    def _wait(self, phone_number: str) -> float:
+        """Segundos que faltan para poder enviarle al número (0 o menos: ya)"""
+        last = self.last_sent.get(phone_number)
+        if last is None:
+            return 0.0
+        return last + self.recipient_interval - time.monotonic()
+
+    # ============================================================
+    # ESTADÍSTICAS
+    # ============================================================
+
+    def depth(self) -> int:
+        """Mensajes esperando en la cola (incluidos los retenidos por el intervalo)"""
+        return sum(queue.qsize() for queue in self.queues) + sum(len(held) for held in self.held.values())
+
+    def drain_rate(self) -> float:
+        """Mensajes enviados por segundo (promedio sobre RATE_WINDOW)"""
+        return self.rate.per_second()
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth(),
+            "capacity": sum(queue.maxsize for queue in self.queues),
+            "workers": len(self.queues),
+            "paced_recipients": len(self.held),
+            "drain_rate_per_second": round(self.drain_rate(), 2),
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "retried": self.retried,
+            "replayed": self.replayed,
+            "breaker": self.breaker.state,
+            "breaker_trips": self.breaker.trips,
+            "journal": self.journal.stats() if self.journal is not None else None,
+        }
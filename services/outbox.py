@@ -0,0 +1,233 @@
+import asyncio
+import logging
+import os
+import struct
+import zlib
+from typing import Dict, List, Optional, Tuple
+import msgspec
+from shared.log import get_logger, log_event, Timer
+from shared.config import OUTBOX_PATH, OUTBOX_COMMIT_INTERVAL, OUTBOX_COMPACT_BYTES
+
+logger = get_logger("outbox")
+
+# Tipos de registro
+SEND, DONE, FAILED = 1, 2, 3
+# Encabezado de cada registro: largo y crc32 del contenido
+HEADER = struct.Struct("!II")
+
+# Un mensaje pendiente: (seq, número, tag, payload)
+Entry = Tuple[int, str, str, bytes]
+
+
+def _record(kind: int, seq: int, phone_number: str = "", tag: str = "", payload: bytes = b"") -> bytes:
+    body = msgspec.msgpack.encode((kind, seq, phone_number, tag, payload))
+    return HEADER.pack(len(body), zlib.crc32(body)) + body
+
+
+class OutboxJournal:
+    """
+    Journal append-only de los mensajes salientes.
+
+    Cada mensaje que se encola se anota (SEND) antes de enviarse y se
+    marca (DONE o FAILED) cuando termina. Si el proceso se cae, al
+    arrancar se vuelven a encolar los SEND sin marca. Como la marca
+    puede perderse justo después de un envío, un mensaje puede salir dos
+    veces, pero nunca se pierde (at-least-once).
+
+    Las escrituras se juntan en memoria y una tarea las baja a disco con
+    un solo write + fsync cada OUTBOX_COMMIT_INTERVAL (group commit), en
+    un hilo aparte. Un mensaje no se envía hasta que su SEND está en
+    disco (committed). Cuando el archivo pasa OUTBOX_COMPACT_BYTES se
+    reescribe solo con lo pendiente.
+
+    Cada registro lleva su largo y un crc32: un registro cortado por un
+    corte de luz se detecta al leer y el archivo se trunca ahí.
+    """
+
+    def __init__(
+        self,
+        path: str = OUTBOX_PATH,
+        commit_interval: float = OUTBOX_COMMIT_INTERVAL,
+        compact_bytes: int = OUTBOX_COMPACT_BYTES,
+    ):
+        self.path = path
+        self.commit_interval = commit_interval
+        self.compact_bytes = compact_bytes
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # SEND sin marcar, por seq (se guarda el registro para compactar)
+        self.pending: Dict[int, bytes] = {}
+        self.next_seq = 1
+        self.committed_seq = 0
+        self.size = 0
+
+        # Registros esperando el próximo fsync
+        self.buffer: List[bytes] = []
+        self.commit_waiter: Optional[asyncio.Future] = None
+        self.wakeup: Optional[asyncio.Event] = None
+        self.lock: Optional[asyncio.Lock] = None
+        self.task: Optional[asyncio.Task] = None
+        self.file = None
+
+        self.commits = 0
+        self.failed_commits = 0
+        self.last_commit_ms = 0.0
+
+    # ============================================================
+    # ARRANQUE (replay) Y APAGADO
+    # ============================================================
+
+    def recover(self) -> List[Entry]:
+        """
+        Lee el journal y devuelve los mensajes que quedaron sin enviar,
+        en el orden en que se encolaron. Deja el archivo compactado.
+        """
+        entries: Dict[int, Entry] = {}
+        valid = 0
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                data = f.read()
+            while valid + HEADER.size <= len(data):
+                size, crc = HEADER.unpack_from(data, valid)
+                body = data[valid + HEADER.size:valid + HEADER.size + size]
+                if len(body) < size or zlib.crc32(body) != crc:
+                    break
+                kind, seq, phone_number, tag, payload = msgspec.msgpack.decode(body)
+                if kind == SEND:
+                    entries[seq] = (seq, phone_number, tag, payload)
+                else:
+                    entries.pop(seq, None)
+                self.next_seq = max(self.next_seq, seq + 1)
+                valid += HEADER.size + size
+            if valid < len(data):
+                log_event(logger, logging.WARNING, "outbox_truncated_tail", bytes=len(data) - valid)
+
+        pending = [entries[seq] for seq in sorted(entries)]
+        self.pending = {entry[0]: _record(SEND, *entry) for entry in pending}
+        self.committed_seq = self.next_seq - 1
+        self._compact(list(self.pending.values()))
+        return pending
+
+    async def start(self):
+        self.wakeup = asyncio.Event()
+        self.lock = asyncio.Lock()
+        if self.file is None:
+            self.recover()
+        self.task = asyncio.create_task(self._committer(), name="outbox-committer")
+
+    async def stop(self):
+        """Baja a disco lo que quede (las marcas DONE) y cierra el archivo"""
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        await self.commit()
+        self.file.close()
+
+    # ============================================================
+    # REGISTRO (no bloquea: solo agrega al buffer)
+    # ============================================================
+
+    def append(self, phone_number: str, tag: str, payload: bytes) -> int:
+        """Anota un mensaje a enviar y devuelve su seq"""
+        seq = self.next_seq
+        self.next_seq += 1
+        record = _record(SEND, seq, phone_number, tag, payload)
+        self.pending[seq] = record
+        self._write(record)
+        return seq
+
+    def done(self, seq: int, failed: bool = False):
+        """Marca un mensaje como enviado (o descartado después de los reintentos)"""
+        if self.pending.pop(seq, None) is not None:
+            self._write(_record(FAILED if failed else DONE, seq))
+
+    def _write(self, record: bytes):
+        self.buffer.append(record)
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    async def committed(self, seq: int):
+        """Espera a que el SEND de `seq` esté en disco"""
+        while self.committed_seq < seq:
+            if self.commit_waiter is None:
+                self.commit_waiter = asyncio.get_running_loop().create_future()
+            await asyncio.shield(self.commit_waiter)
+
+    # ============================================================
+    # GROUP COMMIT
+    # ============================================================
+
+    async def _committer(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            # Se espera un poco para que el fsync cubra todo lo que llegue mientras tanto
+            await asyncio.sleep(self.commit_interval)
+            await self.commit()
+
+    async def commit(self):
+        """Escribe y sincroniza todo lo acumulado en un solo write + fsync"""
+        async with self.lock:
+            if not self.buffer:
+                return
+            records, self.buffer = self.buffer, []
+            upto = self.next_seq - 1
+            # Si toca compactar se reescribe con los pendientes de ahora
+            # (incluye los SEND de este lote; los DONE de este lote ya no están)
+            snapshot = list(self.pending.values()) if self.size >= self.compact_bytes else None
+
+            timer = Timer()
+            try:
+                await asyncio.to_thread(self._sync, records, snapshot)
+                self.commits += 1
+            except OSError as e:
+                # Sin disco se sigue enviando igual: mejor perder la durabilidad que los mensajes
+                self.failed_commits += 1
+                log_event(logger, logging.ERROR, "outbox_commit_failed", records=len(records), error=str(e))
+            self.last_commit_ms = timer.ms()
+
+            # Se despierta a todos: los que tienen un seq mayor vuelven a esperar
+            self.committed_seq = upto
+            waiter, self.commit_waiter = self.commit_waiter, None
+            if waiter is not None:
+                waiter.set_result(None)
+
+    def _sync(self, records: List[bytes], snapshot: Optional[List[bytes]]):
+        if snapshot is not None:
+            self._compact(snapshot)
+            return
+        data = b"".join(records)
+        self.file.write(data)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.size += len(data)
+
+    def _compact(self, records: List[bytes]):
+        """Reemplaza el journal por uno con solo `records` (escritura atómica con rename)"""
+        tmp_path = self.path + ".tmp"
+        data = b"".join(records)
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if self.file is not None:
+            self.file.close()
+        os.replace(tmp_path, self.path)
+        self.file = open(self.path, "ab")
+        self.size = len(data)
+
+    # ============================================================
+    # ESTADÍSTICAS
+    # ============================================================
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self.pending),
+            "buffered": len(self.buffer),
+            "bytes": self.size,
+            "commits": self.commits,
+            "failed_commits": self.failed_commits,
+            "last_commit_ms": self.last_commit_ms,
+        }
@@ -0,0 +1,173 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from services.catalog import Catalog, Product
+from services.extraction import trigrams
+from shared.router import normalize
+from shared.config import SEARCH_MAX_RESULTS, SEARCH_MIN_SCORE
+
+# Filas borradas (sobre el total) a partir de las cuales se rearma el índice
+COMPACT_RATIO = 0.25
+
+EMPTY = np.zeros(0, dtype=np.int32)
+
+
+def product_grams(product: Product) -> set:
+    return set(trigrams(normalize(product.name)))
+
+
+class ProductSearch:
+    """
+    Búsqueda de productos por texto ("muzza", "milanesa") con errores de
+    tipeo y palabras a medias.
+
+    Es un índice invertido de trigramas: por cada trigrama, un array de
+    NumPy (int32, ordenado) con las filas de los productos que lo tienen.
+    Buscar es juntar las listas de los trigramas de la consulta y contar
+    cuántos comparte cada producto (un bincount); el puntaje es el
+    coeficiente de Dice, así un nombre largo no gana solo por largo.
+
+    El índice se arma al arrancar y, cuando cambia la versión del
+    catálogo, se actualiza solo con la diferencia: los productos nuevos o
+    renombrados se agregan al final de las listas de sus trigramas y los
+    que salieron quedan marcados como borrados. Si los borrados pasan
+    COMPACT_RATIO se rearma todo.
+    """
+
+    def __init__(
+        self,
+        catalog: Catalog,
+        max_results: int = SEARCH_MAX_RESULTS,
+        min_score: float = SEARCH_MIN_SCORE,
+    ):
+        self.catalog = catalog
+        self.max_results = max_results
+        self.min_score = min_score
+        self.version = None
+
+        # Fila → producto (None si se borró) y producto → fila
+        self.rows: List[Optional[Product]] = []
+        self.row_of: Dict[str, int] = {}
+        # Trigramas distintos de cada fila y si sigue en el catálogo
+        self.sizes = np.zeros(0, dtype=np.int32)
+        self.alive = np.zeros(0, dtype=np.bool_)
+        self.postings: Dict[str, np.ndarray] = {}
+
+        self.builds = 0
+        self.updates = 0
+
+    def __len__(self) -> int:
+        return len(self.row_of)
+
+    # ============================================================
+    # ARMADO Y ACTUALIZACIÓN
+    # ============================================================
+
+    def refresh(self):
+        """Aplica los cambios del catálogo si cambió de versión"""
+        self.catalog.refresh_if_stale()
+        if self.version == self.catalog.version:
+            return
+        if self.version is None:
+            self.build()
+        else:
+            self.update()
+
+    def build(self):
+        """Arma el índice completo desde el catálogo"""
+        self.rows = []
+        self.row_of = {}
+        self.sizes = EMPTY
+        self.alive = np.zeros(0, dtype=np.bool_)
+        self.postings = {}
+        self._add(self.catalog.by_id.values())
+        self.version = self.catalog.version
+        self.builds += 1
+
+    def update(self):
+        """Aplica solo lo que cambió desde la última versión indexada"""
+        current = self.catalog.by_id
+        removed = [row for product_id, row in self.row_of.items() if product_id not in current]
+        added = []
+        for product in current.values():
+            row = self.row_of.get(product.id)
+            if row is None:
+                added.append(product)
+            elif self.rows[row].name != product.name:
+                # Cambió el nombre: cambian sus trigramas
+                removed.append(row)
+                added.append(product)
+            else:
+                # Precio o categoría: mismos trigramas, solo se cambia el objeto
+                self.rows[row] = product
+
+        for row in removed:
+            del self.row_of[self.rows[row].id]
+            self.rows[row] = None
+        if removed:
+            self.alive[removed] = False
+
+        if len(self.rows) - len(self.row_of) > COMPACT_RATIO * max(len(self.rows), 1):
+            self.build()
+            return
+        self._add(added)
+        self.version = self.catalog.version
+        self.updates += 1
+
+    def _add(self, products: Iterable[Product]):
+        """Agrega filas al final y sus números a las listas de cada trigrama"""
+        new_postings: Dict[str, List[int]] = {}
+        sizes = []
+        first = len(self.rows)
+        for product in products:
+            row = len(self.rows)
+            grams = product_grams(product)
+            for gram in grams:
+                new_postings.setdefault(gram, []).append(row)
+            self.rows.append(product)
+            self.row_of[product.id] = row
+            sizes.append(len(grams))
+        if not sizes:
+            return
+
+        # Las filas nuevas son mayores que todas las anteriores: las listas siguen ordenadas
+        for gram, rows in new_postings.items():
+            extra = np.array(rows, dtype=np.int32)
+            existing = self.postings.get(gram)
+            self.postings[gram] = extra if existing is None else np.concatenate((existing, extra))
+        self.sizes = np.concatenate((self.sizes, np.array(sizes, dtype=np.int32)))
+        self.alive = np.concatenate((self.alive, np.ones(len(self.rows) - first, dtype=np.bool_)))
+
+    # ============================================================
+    # BÚSQUEDA
+    # ============================================================
+
+    def search(self, text: str, limit: Optional[int] = None) -> List[Tuple[Product, float]]:
+        """Productos más parecidos a `text`, del mejor al peor, con su puntaje (0 a 1)"""
+        self.refresh()
+        limit = limit or self.max_results
+        grams = set(trigrams(normalize(text)))
+        lists = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not lists:
+            return []
+
+        # Trigramas en común con la consulta, por fila
+        shared = np.bincount(np.concatenate(lists), minlength=len(self.rows))
+        scores = 2.0 * shared / (len(grams) + self.sizes)
+        scores[~self.alive] = 0.0
+
+        candidates = np.flatnonzero(scores >= self.min_score)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        # Mayor puntaje primero; a igual puntaje, en el orden del catálogo
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [(self.rows[row], float(scores[row])) for row in candidates]
+
+    def stats(self) -> dict:
+        return {
+            "products": len(self.row_of),
+            "rows": len(self.rows),
+            "trigrams": len(self.postings),
+            "postings": int(sum(len(rows) for rows in self.postings.values())),
+            "builds": self.builds,
+            "updates": self.updates,
+        }
@@ -0,0 +1,154 @@
+import json
+from services.whatsapp_service import build_text_payload, build_button_payload, build_list_payload
+
+
+def encode_payload(payload: dict) -> bytes:
+    """JSON compacto en UTF-8 (sin espacios ni escapes \\uXXXX para los emojis)"""
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+class PayloadTemplate:
+    """
+    Payload de WhatsApp ya serializado, al que solo le falta el destinatario.
+
+    El JSON se arma y se codifica una sola vez. Al enviar, render() pega
+    el campo "to" adelante del resto de los bytes: no se arma ningún
+    dict ni se vuelve a serializar nada.
+    """
+
+    __slots__ = ("tail",)
+
+    def __init__(self, payload: dict):
+        payload = {key: value for key, value in payload.items() if key != "to"}
+        # Bytes sin la llave de apertura: '"messaging_product":"whatsapp",...}'
+        self.tail = encode_payload(payload)[1:]
+
+    def render(self, phone_number: str) -> bytes:
+        """Bytes listos para mandar a la Graph API"""
+        if phone_number.isdigit():
+            return b'{"to":"' + phone_number.encode() + b'",' + self.tail
+        return b'{"to":' + json.dumps(phone_number).encode() + b"," + self.tail
+
+
+def text_template(text: str) -> PayloadTemplate:
+    return PayloadTemplate(build_text_payload("", text))
+
+
+def button_template(body_text: str, buttons: list) -> PayloadTemplate:
+    return PayloadTemplate(build_button_payload("", body_text, buttons))
+
+
+def list_template(body_text: str, button_text: str, sections: list) -> PayloadTemplate:
+    return PayloadTemplate(build_list_payload("", body_text, button_text, sections))
+
+
+class TextTemplates:
+    """
+    Memoriza los textos fijos (ayuda, errores de validación) ya codificados.
+    Solo para textos que están en el código: los dinámicos se envían normal.
+    """
+
+    def __init__(self):
+        self.templates: dict[str, PayloadTemplate] = {}
+
+    def get(self, text: str) -> PayloadTemplate:
+        template = self.templates.get(text)
+        if template is None:
+            template = self.templates[text] = text_template(text)
+        return template
+
+
+# ============================================================
+# PÁGINAS DEL CATÁLOGO
+# ============================================================
+
+# WhatsApp admite hasta 10 filas por lista: 8 categorías + "anterior" y "siguiente"
+CATEGORY_PAGE_SIZE = 8
+
+
+def list_row(row_id: str, title: str, description: str = "") -> dict:
+    """Arma una fila de lista respetando los largos máximos de WhatsApp"""
+    row = {"id": row_id[:200], "title": title[:24]}
+    if description:
+        row["description"] = description[:72]
+    return row
+
+
+class CatalogTemplates:
+    """
+    Todas las páginas de listas del catálogo (categorías y productos por
+    categoría), ya serializadas. Se arman de una vez (en el pre-warm del
+    lifespan, o la primera vez que se piden) y se vuelven a armar solo
+    cuando cambia la versión del catálogo.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.version = None
+        self.category_pages: list[PayloadTemplate] = []
+        self.product_pages: dict[tuple[str, int], PayloadTemplate] = {}
+
+    def refresh(self):
+        """Reconstruye las páginas si el catálogo cambió de versión"""
+        self.catalog.refresh_if_stale()
+        if self.version != self.catalog.version:
+            self.build()
+
+    def build(self):
+        catalog = self.catalog
+        categories = catalog.categories
+
+        category_pages = []
+        for start in range(0, max(len(categories), 1), CATEGORY_PAGE_SIZE):
+            page = start // CATEGORY_PAGE_SIZE
+            rows = [
+                list_row(f"cat:{category}", category, f"{len(catalog.by_category[category])} productos")
+                for category in categories[start:start + CATEGORY_PAGE_SIZE]
+            ]
+            if page > 0:
+                rows.append(list_row(f"cats:{page - 1}", "⬅️ Anterior"))
+            if start + CATEGORY_PAGE_SIZE < len(categories):
+                rows.append(list_row(f"cats:{page + 1}", "➡️ Siguiente"))
+
+            category_pages.append(list_template(
+                "🍽️ Elige una categoría:",
+                "Ver Categorías",
+                [{"title": "Categorías", "rows": rows}]
+            ))
+
+        product_pages = {}
+        for category in categories:
+            page = 0
+            while True:
+                products, has_previous, has_next = catalog.page(category, page)
+                rows = [
+                    list_row(p.id, p.name, f"${p.price} - {p.category}")
+                    for p in products
+                ]
+                if has_previous:
+                    rows.append(list_row(f"page:{page - 1}:{category}", "⬅️ Anterior"))
+                if has_next:
+                    rows.append(list_row(f"page:{page + 1}:{category}", "➡️ Siguiente"))
+
+                product_pages[(category, page)] = list_template(
+                    f"🍽️ {category}: selecciona un producto",
+                    "Ver Productos",
+                    [{"title": category[:24], "rows": rows}]
+                )
+                if not has_next:
+                    break
+                page += 1
+
+        self.category_pages = category_pages
+        self.product_pages = product_pages
+        self.version = catalog.version
+
+    def category_page(self, page: int) -> PayloadTemplate:
+        if self.version is None:
+            self.build()
+        return self.category_pages[page] if 0 <= page < len(self.category_pages) else None
+
+    def product_page(self, category: str, page: int) -> PayloadTemplate:
+        if self.version is None:
+            self.build()
+        return self.product_pages.get((category, page))
@@ -1,108 +1,286 @@
-import requests
-from shared.config import ACCESS_TOKEN, WHATSAPP_API_URL
+import asyncio
+import time
+import httpx
+from shared.metrics import OUTBOUND_SECONDS, OUTBOUND_RESPONSES
+from shared.config import (
+    ACCESS_TOKEN,
+    WHATSAPP_API_URL,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_TIMEOUT,
+)
 
-class WhatsAppService:
-    """Servicio para enviar mensajes por WhatsApp"""
-    
-    @staticmethod
-    def send_text_message(phone_number: str, text: str):
-        """Envía un mensaje de texto simple"""
-        headers = {
-            "Authorization": f"Bearer {ACCESS_TOKEN}",
-            "Content-Type": "application/json"
+# Los headers son siempre los mismos: se arman una sola vez y viven en el cliente
+HEADERS = {
+    "Authorization": f"Bearer {ACCESS_TOKEN}",
+    "Content-Type": "application/json"
+}
+
+LIMITS = httpx.Limits(
+    max_connections=HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+)
+
+# Códigos de error de Meta que significan "más despacio" aunque vengan con un 400
+# (4: límite de la app, 80007: límite de la cuenta, 130429: throughput,
+# 131056: demasiados mensajes al mismo número)
+THROTTLING_CODES = frozenset({4, 80007, 130429, 131056})
+
+
+# ============================================================
+# ERRORES
+# ============================================================
+
+class GraphAPIError(Exception):
+    """La Graph API contestó con un error (status >= 400)"""
+
+    def __init__(self, status_code: int, code: int = 0, message: str = "", retry_after: float = 0.0):
+        super().__init__(f"HTTP {status_code} (código {code}): {message}")
+        self.status_code = status_code
+        self.code = code
+        self.message = message
+        # Segundos que pidió esperar la API (header Retry-After), 0 si no dijo
+        self.retry_after = retry_after
+
+    @classmethod
+    def from_response(cls, response: httpx.Response) -> "GraphAPIError":
+        try:
+            error = response.json().get("error") or {}
+        except ValueError:
+            error = {}
+        try:
+            retry_after = float(response.headers.get("retry-after", 0))
+        except ValueError:
+            retry_after = 0.0
+        return cls(response.status_code, int(error.get("code") or 0), error.get("message", ""), retry_after)
+
+    @property
+    def retryable(self) -> bool:
+        """True si tiene sentido reintentar: límites de envío o errores del lado de Meta"""
+        return self.status_code == 429 or self.status_code >= 500 or self.code in THROTTLING_CODES
+
+
+def is_retryable(error: Exception) -> bool:
+    """Errores de red (timeout, conexión caída) y errores transitorios de la API"""
+    if isinstance(error, GraphAPIError):
+        return error.retryable
+    return isinstance(error, httpx.TransportError)
+
+
+def _checked(response: httpx.Response) -> dict:
+    OUTBOUND_RESPONSES.inc(str(response.status_code))
+    if response.status_code >= 400:
+        raise GraphAPIError.from_response(response)
+    return response.json()
+
+
+# ============================================================
+# ARMADO DE PAYLOADS (compartido por la versión async y la sync)
+# ============================================================
+
+def build_text_payload(phone_number: str, text: str) -> dict:
+    """Arma el payload de un mensaje de texto simple"""
+    return {
+        "messaging_product": "whatsapp",
+        "recipient_type": "individual",
+        "to": phone_number,
+        "type": "text",
+        "text": {
+            "preview_url": False,
+            "body": text
         }
-        
-        payload = {
-            "messaging_product": "whatsapp",
-            "recipient_type": "individual",
-            "to": phone_number,
-            "type": "text",
-            "text": {
-                "preview_url": False,
-                "body": text
+    }
+
+
+def build_button_payload(phone_number: str, body_text: str, buttons: list) -> dict:
+    """
+    Arma el payload de un mensaje con botones.
+
+    buttons debe ser una lista de diccionarios:
+    [
+        {"id": "btn_1", "title": "Opción 1"},
+        {"id": "btn_2", "title": "Opción 2"}
+    ]
+    """
+    button_objects = [
+        {
+            "type": "reply",
+            "reply": {
+                "id": btn["id"],
+                "title": btn["title"]
             }
         }
-        
-        response = requests.post(WHATSAPP_API_URL, headers=headers, json=payload)
-        return response.json()
-    
-    @staticmethod
-    def send_button_message(phone_number: str, body_text: str, buttons: list):
-        """
-        Envía un mensaje con botones.
-        
-        buttons debe ser una lista de diccionarios:
-        [
-            {"id": "btn_1", "title": "Opción 1"},
-            {"id": "btn_2", "title": "Opción 2"}
-        ]
-        """
-        headers = {
-            "Authorization": f"Bearer {ACCESS_TOKEN}",
-            "Content-Type": "application/json"
+        for btn in buttons
+    ]
+
+    return {
+        "messaging_product": "whatsapp",
+        "recipient_type": "individual",
+        "to": phone_number,
+        "type": "interactive",
+        "interactive": {
+            "type": "button",
+            "body": {"text": body_text},
+            "action": {"buttons": button_objects}
         }
-        
-        button_objects = [
-            {
-                "type": "reply",
-                "reply": {
-                    "id": btn["id"],
-                    "title": btn["title"]
-                }
-            }
-            for btn in buttons
-        ]
-        
-        payload = {
-            "messaging_product": "whatsapp",
-            "recipient_type": "individual",
-            "to": phone_number,
-            "type": "interactive",
-            "interactive": {
-                "type": "button",
-                "body": {"text": body_text},
-                "action": {"buttons": button_objects}
+    }
+
+
+def build_list_payload(phone_number: str, body_text: str, button_text: str, sections: list) -> dict:
+    """
+    Arma el payload de un mensaje con lista.
+
+    sections debe ser una lista de diccionarios:
+    [
+        {
+            "title": "Categoría 1",
+            "rows": [
+                {"id": "item_1", "title": "Item 1", "description": "Desc 1"},
+                {"id": "item_2", "title": "Item 2", "description": "Desc 2"}
+            ]
+        }
+    ]
+    """
+    return {
+        "messaging_product": "whatsapp",
+        "recipient_type": "individual",
+        "to": phone_number,
+        "type": "interactive",
+        "interactive": {
+            "type": "list",
+            "body": {"text": body_text},
+            "action": {
+                "button": button_text,
+                "sections": sections
             }
         }
-        
-        response = requests.post(WHATSAPP_API_URL, headers=headers, json=payload)
-        return response.json()
-    
-    @staticmethod
-    def send_list_message(phone_number: str, body_text: str, button_text: str, sections: list):
+    }
+
+
+def sent_message_id(response) -> str:
+    """Id (wamid) del mensaje que aceptó la Graph API, o "" si la respuesta es un error"""
+    try:
+        return response["messages"][0]["id"]
+    except (KeyError, IndexError, TypeError):
+        return ""
+
+
+# ============================================================
+# SERVICIO ASYNC (el que usa el webhook)
+# ============================================================
+
+class AsyncWhatsAppService:
+    """
+    Servicio async para enviar mensajes por WhatsApp.
+
+    Usa un único cliente HTTP/2 con keep-alive y un pool de conexiones
+    acotado, así cada envío reusa una conexión ya abierta en lugar de
+    hacer un handshake TLS nuevo. Se crea y se cierra en el lifespan de
+    FastAPI (ver main.py).
+    """
+
+    def __init__(self, client: httpx.AsyncClient = None):
+        self.client = client or httpx.AsyncClient(
+            http2=True,
+            headers=HEADERS,
+            limits=LIMITS,
+            timeout=HTTP_TIMEOUT,
+        )
+
+    async def send_payload(self, payload):
         """
-        Envía un mensaje con lista.
-        
-        sections debe ser una lista de diccionarios:
-        [
-            {
-                "title": "Categoría 1",
-                "rows": [
-                    {"id": "item_1", "title": "Item 1", "description": "Desc 1"},
-                    {"id": "item_2", "title": "Item 2", "description": "Desc 2"}
-                ]
-            }
-        ]
+        Envía un payload ya armado a la Graph API.
+        Acepta un dict o bytes ya serializados (ver services/templates.py).
+        Si la API contesta con un error levanta GraphAPIError.
         """
-        headers = {
-            "Authorization": f"Bearer {ACCESS_TOKEN}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "messaging_product": "whatsapp",
-            "recipient_type": "individual",
-            "to": phone_number,
-            "type": "interactive",
-            "interactive": {
-                "type": "list",
-                "body": {"text": body_text},
-                "action": {
-                    "button": button_text,
-                    "sections": sections
-                }
-            }
-        }
-        
-        response = requests.post(WHATSAPP_API_URL, headers=headers, json=payload)
-        return response.json()
\ No newline at end of file
+        started = time.perf_counter()
+        try:
+            if isinstance(payload, bytes):
+                response = await self.client.post(WHATSAPP_API_URL, content=payload)
+            else:
+                response = await self.client.post(WHATSAPP_API_URL, json=payload)
+        except httpx.HTTPError:
+            OUTBOUND_RESPONSES.inc("error")
+            raise
+        finally:
+            OUTBOUND_SECONDS.observe(time.perf_counter() - started)
+        return _checked(response)
+
+    async def send_template(self, phone_number: str, template):
+        """Envía un PayloadTemplate pre-serializado"""
+        return await self.send_payload(template.render(phone_number))
+
+    async def send_text_message(self, phone_number: str, text: str):
+        """Envía un mensaje de texto simple"""
+        return await self.send_payload(build_text_payload(phone_number, text))
+
+    async def send_button_message(self, phone_number: str, body_text: str, buttons: list):
+        """Envía un mensaje con botones (ver build_button_payload)"""
+        return await self.send_payload(build_button_payload(phone_number, body_text, buttons))
+
+    async def send_list_message(self, phone_number: str, body_text: str, button_text: str, sections: list):
+        """Envía un mensaje con lista (ver build_list_payload)"""
+        return await self.send_payload(build_list_payload(phone_number, body_text, button_text, sections))
+
+    async def warm(self, timeout: float = HTTP_TIMEOUT):
+        """
+        Abre la conexión con la Graph API (DNS, TLS y HTTP/2) antes del
+        primer envío. La respuesta no importa: solo que quede en el pool.
+        """
+        await self.client.head(WHATSAPP_API_URL, timeout=timeout)
+
+    async def aclose(self):
+        """Cierra el pool de conexiones"""
+        await self.client.aclose()
+
+
+# ============================================================
+# SERVICIO SYNC (wrapper fino, para scripts y código bloqueante)
+# ============================================================
+
+class WhatsAppService:
+    """
+    Versión sync de AsyncWhatsAppService para scripts y código
+    bloqueante (no usar desde el event loop del webhook).
+
+    Cada llamada corre el método async en un event loop propio que vive
+    lo mismo que la instancia, así los envíos reusan el mismo pool de
+    conexiones. Cerrar con close() (o usarlo con `with`).
+    """
+
+    def __init__(self, client: httpx.AsyncClient = None):
+        self.runner = asyncio.Runner()
+        self.service = AsyncWhatsAppService(client)
+
+    def send_payload(self, payload):
+        """Envía un payload ya armado (dict o bytes); ver AsyncWhatsAppService.send_payload"""
+        return self.runner.run(self.service.send_payload(payload))
+
+    def send_text_message(self, phone_number: str, text: str):
+        """Envía un mensaje de texto simple"""
+        return self.runner.run(self.service.send_text_message(phone_number, text))
+
+    def send_button_message(self, phone_number: str, body_text: str, buttons: list):
+        """Envía un mensaje con botones (ver build_button_payload)"""
+        return self.runner.run(self.service.send_button_message(phone_number, body_text, buttons))
+
+    def send_list_message(self, phone_number: str, body_text: str, button_text: str, sections: list):
+        """Envía un mensaje con lista (ver build_list_payload)"""
+        return self.runner.run(self.service.send_list_message(phone_number, body_text, button_text, sections))
+
+    def send_template(self, phone_number: str, template):
+        """Envía un PayloadTemplate pre-serializado"""
+        return self.runner.run(self.service.send_template(phone_number, template))
+
+    def close(self):
+        """Cierra el pool de conexiones y el event loop"""
+        self.runner.run(self.service.aclose())
+        self.runner.close()
+
+    def __enter__(self) -> "WhatsAppService":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,395 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import struct
+from bisect import bisect
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+import msgspec
+from shared.webhook import Event, Message, Status, decode_webhook, event_sender, iter_events, dispatch_events
+from shared.actors import Mailboxes
+from shared.log import get_logger, log_event
+from shared.config import (
+    WORKER_SOCKET_PATH,
+    WORKER_RING_REPLICAS,
+    WORKER_BACKLOG_SIZE,
+    WORKER_TIMEOUT,
+)
+
+logger = get_logger("workers")
+
+# ============================================================
+# PROTOCOLO (frames sobre un socket Unix)
+# ============================================================
+# Cada frame es: largo del contenido (4 bytes) + tipo (1 byte) + contenido.
+#   HELLO   worker → principal   [índice, pid] en msgpack, al conectarse
+#   BODY    principal → worker   el body JSON del webhook tal cual llegó
+#   EVENTS  principal → worker   lista de Envelope en msgpack
+#   STATS   principal → worker   pedido vacío; el worker contesta otro
+#                                STATS con sus estadísticas en JSON
+
+HELLO, BODY, EVENTS, STATS = 1, 2, 3, 4
+HEADER = struct.Struct("!IB")
+
+# spawn: cada worker arranca con un intérprete limpio (sin el event
+# loop ni los sockets de uvicorn heredados de un fork)
+CONTEXT = multiprocessing.get_context("spawn")
+
+
+class Envelope(msgspec.Struct, array_like=True):
+    """Un evento suelto (cuando un webhook trae eventos para varios workers)"""
+    kind: str
+    message: Optional[Message] = None
+    status: Optional[Status] = None
+
+
+ENCODER = msgspec.msgpack.Encoder()
+ENVELOPES_DECODER = msgspec.msgpack.Decoder(list[Envelope])
+
+
+def encode_events(events: List[Event]) -> bytes:
+    return ENCODER.encode([
+        Envelope(kind, message=item) if kind == "message" else Envelope(kind, status=item)
+        for kind, _, item in events
+    ])
+
+
+def decode_events(data: bytes) -> List[Event]:
+    # El value del change no viaja: los handlers no lo usan
+    return [
+        (e.kind, None, e.message if e.kind == "message" else e.status)
+        for e in ENVELOPES_DECODER.decode(data)
+    ]
+
+
+def write_frame(writer: asyncio.StreamWriter, kind: int, payload: bytes = b""):
+    header = HEADER.pack(len(payload), kind)
+    if not payload:
+        # writelines con un elemento vacío deja el transporte esperando
+        # para escribir para siempre (y nunca termina de cerrarse)
+        writer.write(header)
+        return
+    # writelines: el contenido no se copia para pegarle el encabezado
+    writer.writelines((header, payload))
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    size, kind = HEADER.unpack(await reader.readexactly(HEADER.size))
+    return kind, (await reader.readexactly(size) if size else b"")
+
+
+# ============================================================
+# HASHING CONSISTENTE
+# ============================================================
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Anillo de hashing consistente: cada worker ocupa `replicas` puntos
+    del anillo y un número va al worker del primer punto que sigue a su
+    hash. Así la carga se reparte pareja y, si cambia la cantidad de
+    workers, solo se mueve ~1/N de los clientes (los demás conservan su
+    sesión en memoria).
+    """
+
+    def __init__(self, nodes: int, replicas: int = WORKER_RING_REPLICAS):
+        points = sorted((_hash(f"worker-{node}#{r}"), node) for node in range(nodes) for r in range(replicas))
+        self.points = [point for point, _ in points]
+        self.nodes = [node for _, node in points]
+
+    def node_for(self, key: str) -> int:
+        index = bisect(self.points, _hash(key))
+        return self.nodes[index if index < len(self.nodes) else 0]
+
+
+# ============================================================
+# PROCESO PRINCIPAL
+# ============================================================
+
+class WorkerLink:
+    """Estado de la conexión con un worker"""
+
+    __slots__ = ("index", "process", "pid", "reader", "writer", "replies", "reader_task", "backlog",
+                 "forwarded", "dropped", "restarts")
+
+    def __init__(self, index: int, backlog_size: int):
+        self.index = index
+        self.process: Optional[multiprocessing.Process] = None
+        self.pid = 0
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        # Pedidos de STATS esperando respuesta (el worker contesta en orden)
+        self.replies: deque[asyncio.Future] = deque()
+        self.reader_task: Optional[asyncio.Task] = None
+        # Frames para cuando se (re)conecte
+        self.backlog: deque[Tuple[int, bytes]] = deque(maxlen=backlog_size)
+        self.forwarded = 0
+        self.dropped = 0
+        self.restarts = 0
+
+    @property
+    def connected(self) -> bool:
+        return self.writer is not None and not self.writer.is_closing()
+
+
+class WorkerPool:
+    """
+    Reparte los eventos del webhook entre WORKER_PROCESSES procesos.
+
+    Cada número de teléfono cae siempre en el mismo worker (HashRing),
+    que es dueño de su sesión, su carrito y sus envíos: las conversaciones
+    no necesitan estado compartido y los mensajes de un cliente se
+    procesan en orden. El proceso de uvicorn solo decodifica el webhook
+    para saber a quién va cada evento y lo escribe en el socket del
+    worker; si todo el webhook va al mismo worker (lo normal) se reenvía
+    el body tal cual, sin volver a serializar nada.
+
+    Un worker que se cae se vuelve a lanzar; mientras tanto sus eventos
+    se guardan (hasta WORKER_BACKLOG_SIZE frames) y se le mandan cuando
+    se conecta de nuevo. Lo que ya estaba escrito en el socket del worker
+    que se cayó se pierde.
+    """
+
+    def __init__(
+        self,
+        target: Callable[[int, int, str], None],
+        count: int,
+        socket_path: str = WORKER_SOCKET_PATH,
+        backlog_size: int = WORKER_BACKLOG_SIZE,
+        timeout: float = WORKER_TIMEOUT,
+    ):
+        # target(índice, cantidad, socket_path) corre en cada proceso worker
+        self.target = target
+        self.count = count
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.ring = HashRing(count)
+        self.links = [WorkerLink(index, backlog_size) for index in range(count)]
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.monitor: Optional[asyncio.Task] = None
+        self.all_connected = asyncio.Event()
+
+    # ============================================================
+    # ARRANQUE Y APAGADO
+    # ============================================================
+
+    async def start(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self.server = await asyncio.start_unix_server(self._on_connect, self.socket_path)
+        for link in self.links:
+            self._spawn(link)
+        self.monitor = asyncio.create_task(self._monitor(), name="worker-monitor")
+
+    async def stop(self):
+        """Cierra los sockets (cada worker termina lo que tiene y se apaga) y espera a los procesos"""
+        if self.monitor is not None:
+            self.monitor.cancel()
+            await asyncio.gather(self.monitor, return_exceptions=True)
+        for link in self.links:
+            if link.writer is not None:
+                link.writer.close()
+        self.server.close()
+
+        for link in self.links:
+            await asyncio.to_thread(link.process.join, self.timeout)
+            if link.process.is_alive():
+                log_event(logger, logging.WARNING, "worker_killed", worker=link.index, pid=link.process.pid)
+                link.process.terminate()
+            if link.reader_task is not None:
+                link.reader_task.cancel()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def _spawn(self, link: WorkerLink):
+        link.process = CONTEXT.Process(
+            target=self.target, args=(link.index, self.count, self.socket_path),
+            name=f"bot-worker-{link.index}", daemon=True,
+        )
+        link.process.start()
+
+    async def _monitor(self):
+        """Relanza los workers que se cayeron"""
+        while True:
+            await asyncio.sleep(1)
+            for link in self.links:
+                if not link.process.is_alive():
+                    log_event(
+                        logger, logging.ERROR, "worker_died",
+                        worker=link.index, pid=link.process.pid, exitcode=link.process.exitcode
+                    )
+                    self._disconnect(link)
+                    link.restarts += 1
+                    self._spawn(link)
+
+    async def _on_connect(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        kind, data = await read_frame(reader)
+        if kind != HELLO:
+            writer.close()
+            return
+        index, pid = msgspec.msgpack.decode(data)
+        link = self.links[index]
+        link.pid = pid
+
+        # Un worker relanzado puede conectarse antes de que se note que se
+        # cayó: la conexión vieja y su lector se descartan
+        if link.writer is not None:
+            self._disconnect(link)
+        if link.reader_task is not None:
+            link.reader_task.cancel()
+
+        # Primero lo que se juntó mientras no estaba conectado, después lo nuevo
+        while link.backlog:
+            write_frame(writer, *link.backlog.popleft())
+            link.forwarded += 1
+        link.reader, link.writer = reader, writer
+        link.reader_task = asyncio.create_task(self._read_replies(link, reader), name=f"worker-{index}-replies")
+
+        log_event(logger, logging.INFO, "worker_connected", worker=index, pid=pid)
+        if all(link.connected for link in self.links):
+            self.all_connected.set()
+
+    async def _read_replies(self, link: WorkerLink, reader: asyncio.StreamReader):
+        try:
+            while True:
+                kind, data = await read_frame(reader)
+                if kind != STATS or not link.replies:
+                    # Nadie lo pidió: se descarta sin cortar la lectura
+                    log_event(logger, logging.WARNING, "worker_unexpected_frame", worker=link.index, kind=kind)
+                    continue
+                future = link.replies.popleft()
+                if not future.done():
+                    future.set_result(msgspec.json.decode(data))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # El worker cerró el socket (se cayó o se está apagando)
+            if link.reader is reader:
+                self._disconnect(link)
+
+    def _disconnect(self, link: WorkerLink):
+        if link.writer is not None:
+            link.writer.close()
+        link.reader = link.writer = None
+        while link.replies:
+            future = link.replies.popleft()
+            if not future.done():
+                future.set_exception(ConnectionError(f"worker {link.index} desconectado"))
+
+    # ============================================================
+    # REENVÍO DE EVENTOS (lo llama el webhook)
+    # ============================================================
+
+    def forward(self, body: bytes, events: List[Event]) -> List[WorkerLink]:
+        """
+        Escribe los eventos en el socket de cada worker, sin esperar (el
+        orden de escritura es el orden de llegada de los webhooks).
+        Devuelve los workers usados, para esperar con drain().
+        """
+        groups: Dict[int, List[Event]] = {}
+        for event in events:
+            groups.setdefault(self.ring.node_for(event_sender(event)), []).append(event)
+
+        if len(groups) == 1:
+            (index,) = groups
+            self._send(self.links[index], BODY, body)
+        else:
+            for index, group in groups.items():
+                self._send(self.links[index], EVENTS, encode_events(group))
+        return [self.links[index] for index in groups]
+
+    def _send(self, link: WorkerLink, kind: int, payload: bytes):
+        if link.connected:
+            write_frame(link.writer, kind, payload)
+            link.forwarded += 1
+            return
+        if len(link.backlog) == link.backlog.maxlen:
+            link.dropped += 1
+            log_event(logger, logging.WARNING, "worker_backlog_full", worker=link.index)
+        link.backlog.append((kind, payload))
+
+    async def drain(self, links: List[WorkerLink]):
+        """Espera a que los sockets acepten lo escrito (contrapresión si un worker se atrasa)"""
+        for link in links:
+            if link.connected:
+                try:
+                    await link.writer.drain()
+                except ConnectionError:
+                    self._disconnect(link)
+
+    # ============================================================
+    # ESTADÍSTICAS
+    # ============================================================
+
+    async def worker_stats(self, link: WorkerLink) -> dict:
+        """Estadísticas que arma el propio worker (las mismas de /health)"""
+        if not link.connected:
+            return {"connected": False}
+        future = asyncio.get_running_loop().create_future()
+        link.replies.append(future)
+        write_frame(link.writer, STATS)
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except (asyncio.TimeoutError, ConnectionError) as e:
+            return {"connected": link.connected, "error": type(e).__name__}
+
+    def backlog(self) -> int:
+        return sum(len(link.backlog) for link in self.links)
+
+    async def stats(self) -> List[dict]:
+        replies = await asyncio.gather(*(self.worker_stats(link) for link in self.links))
+        return [
+            {
+                "worker": link.index,
+                "pid": link.pid,
+                "connected": link.connected,
+                "forwarded": link.forwarded,
+                "backlog": len(link.backlog),
+                "dropped": link.dropped,
+                "restarts": link.restarts,
+                "stats": reply,
+            }
+            for link, reply in zip(self.links, replies)
+        ]
+
+
+# ============================================================
+# PROCESO WORKER
+# ============================================================
+
+async def serve_worker(
+    index: int,
+    socket_path: str,
+    mailboxes: Mailboxes,
+    stats: Callable[[], dict],
+):
+    """
+    Se conecta al proceso principal y procesa sus frames hasta que cierra
+    el socket. Los eventos van a los buzones de cada cliente (ver
+    shared/actors.py): los de clientes distintos corren en paralelo y
+    los de un mismo cliente en orden. Un frame no empieza hasta que
+    terminó el anterior.
+    """
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    write_frame(writer, HELLO, ENCODER.encode([index, os.getpid()]))
+    await writer.drain()
+
+    try:
+        while True:
+            try:
+                kind, data = await read_frame(reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return
+
+            if kind == BODY:
+                await dispatch_events(iter_events(decode_webhook(data)), mailboxes)
+            elif kind == EVENTS:
+                await dispatch_events(iter(decode_events(data)), mailboxes)
+            elif kind == STATS:
+                write_frame(writer, STATS, msgspec.json.encode(stats()))
+                await writer.drain()
+    finally:
+        writer.close()
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+from shared.log import get_logger, log_event
+from shared.config import MAILBOX_IDLE_SECONDS, MAILBOX_MAX_DEPTH
+
+logger = get_logger("actors")
+
+# Marca para que un buzón termine (al apagar)
+_STOP = object()
+
+
+class Mailbox:
+    """Buzón de un cliente: su cola de mensajes y la tarea que la consume"""
+
+    __slots__ = ("key", "queue", "task", "processed")
+
+    def __init__(self, key: str):
+        self.key = key
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+        self.processed = 0
+
+
+class Mailboxes:
+    """
+    Un actor por cliente activo: cada número de teléfono tiene su buzón
+    (una cola) y una tarea que procesa sus mensajes de a uno, en el orden
+    en que llegaron. Los clientes distintos corren en paralelo.
+
+    Así dos mensajes del mismo cliente (un doble toque en un botón, dos
+    textos seguidos en webhooks distintos) nunca leen y modifican su
+    sesión a la vez, sin locks en el ChatController.
+
+    El buzón se crea con el primer mensaje y se desarma cuando queda
+    `idle_timeout` segundos sin nada que hacer: un cliente inactivo no
+    cuesta ninguna tarea. Si un cliente acumula más de `max_depth`
+    mensajes sin procesar, los siguientes se descartan.
+    """
+
+    def __init__(
+        self,
+        handle: Callable[[Any], Awaitable[Any]],
+        idle_timeout: float = MAILBOX_IDLE_SECONDS,
+        max_depth: int = MAILBOX_MAX_DEPTH,
+    ):
+        self.handle = handle
+        self.idle_timeout = idle_timeout
+        self.max_depth = max_depth
+        self.boxes: Dict[str, Mailbox] = {}
+        self.closing = False
+
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.created = 0
+        self.peak = 0
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    # ============================================================
+    # ENTRADA (no bloquea)
+    # ============================================================
+
+    def submit(self, key: str, item: Any) -> asyncio.Future:
+        """
+        Deja `item` en el buzón de `key` (lo crea si no existe). Devuelve
+        un future que se completa cuando el mensaje terminó de procesarse
+        (con error o sin él).
+        """
+        future = asyncio.get_running_loop().create_future()
+        if self.closing:
+            self.dropped += 1
+            future.set_result(None)
+            return future
+
+        box = self.boxes.get(key)
+        if box is None:
+            box = self.boxes[key] = Mailbox(key)
+            box.task = asyncio.create_task(self._run(box), name=f"mailbox-{key}")
+            self.created += 1
+            self.peak = max(self.peak, len(self.boxes))
+        elif box.queue.qsize() >= self.max_depth:
+            self.dropped += 1
+            log_event(logger, logging.WARNING, "mailbox_full", key=key, depth=box.queue.qsize())
+            future.set_result(None)
+            return future
+
+        box.queue.put_nowait((item, future))
+        self.submitted += 1
+        return future
+
+    # ============================================================
+    # ACTOR
+    # ============================================================
+
+    async def _run(self, box: Mailbox):
+        queue = box.queue
+        try:
+            while True:
+                try:
+                    entry = await asyncio.wait_for(queue.get(), self.idle_timeout)
+                except TimeoutError:
+                    # Entre el timeout y esta línea no hay ningún await: nadie
+                    # pudo dejar un mensaje, así que el buzón se puede borrar
+                    if queue.empty():
+                        return
+                    continue
+                if entry is _STOP:
+                    return
+
+                item, future = entry
+                try:
+                    await self.handle(item)
+                except Exception:
+                    self.errors += 1
+                    logger.exception("mailbox_error", extra={"fields": {"key": box.key}})
+                box.processed += 1
+                self.processed += 1
+                if not future.done():
+                    future.set_result(None)
+        finally:
+            if self.boxes.get(box.key) is box:
+                del self.boxes[box.key]
+            # Si la tarea se canceló, no dejar a nadie esperando
+            while not queue.empty():
+                entry = queue.get_nowait()
+                if entry is not _STOP and not entry[1].done():
+                    entry[1].set_result(None)
+
+    async def stop(self):
+        """Deja de aceptar mensajes y espera a que cada buzón procese lo que tiene"""
+        self.closing = True
+        tasks = []
+        for box in list(self.boxes.values()):
+            box.queue.put_nowait(_STOP)
+            tasks.append(box.task)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # ============================================================
+    # ESTADÍSTICAS
+    # ============================================================
+
+    def depth(self) -> int:
+        """Mensajes esperando en todos los buzones"""
+        return sum(box.queue.qsize() for box in self.boxes.values())
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self.boxes),
+            "peak": self.peak,
+            "created": self.created,
+            "depth": self.depth(),
+            "submitted": self.submitted,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
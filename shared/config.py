@@ -0,0 +1,239 @@
+import os
+import tempfile
+
+# ============================================================
+# CONFIGURACIÓN GENERAL
+# ============================================================
+# Todos los valores se pueden sobreescribir con variables de entorno
+# (en Render se configuran desde el panel "Environment").
+
+# 🔑 ACCESS_TOKEN: Se usa para TODO (envío de mensajes y verificación del webhook)
+ACCESS_TOKEN = os.getenv(
+    "ACCESS_TOKEN",
+    "EAAPrCUjHBWYBPwPlmMKZBlCio386SlWewHJtjDoehs1exMVwQpcN8lzPJuwFSmhZAgRVCPPCd8k3DQCCDHbMQvy9oXn37HEkO6nOoBivqFF8uOYZAiOnLak807DmVzGkdwwyf90fIZC2sgESjmJpvseVydb00erBZAvDo5kpFqgwdypLg1hZAWZBdj2FBgxGAZDZD",
+)
+
+# 🔐 APP_SECRET: con él Meta firma cada webhook (header X-Hub-Signature-256).
+# Meta for Developers → App settings → Basic → App secret. Sin él se
+# rechazan todos los POST del webhook (403)...
+APP_SECRET = os.getenv("APP_SECRET", "")
+# ...salvo que se pida explícitamente aceptarlos sin firma ("1"): solo para desarrollo
+WEBHOOK_ALLOW_UNSIGNED = os.getenv("WEBHOOK_ALLOW_UNSIGNED", "0") == "1"
+
+# ID del número de teléfono de WhatsApp Business (Meta for Developers → WhatsApp → API Setup)
+PHONE_NUMBER_ID = os.getenv("PHONE_NUMBER_ID", "")
+
+GRAPH_API_VERSION = os.getenv("GRAPH_API_VERSION", "v21.0")
+GRAPH_API_BASE_URL = os.getenv("GRAPH_API_BASE_URL", f"https://graph.facebook.com/{GRAPH_API_VERSION}")
+WHATSAPP_API_URL = os.getenv("WHATSAPP_API_URL", f"{GRAPH_API_BASE_URL}/{PHONE_NUMBER_ID}/messages")
+
+# ============================================================
+# SERVIDOR
+# ============================================================
+
+# Puerto donde escucha uvicorn (Render lo pasa en PORT)
+PORT = int(os.getenv("PORT", "8000"))
+# Recargar al cambiar el código: solo para desarrollo ("1" para activarlo)
+RELOAD = os.getenv("RELOAD", "0") == "1"
+# Tamaño máximo de un POST del webhook (bytes); los de Meta pesan unos pocos KB
+WEBHOOK_MAX_BYTES = int(os.getenv("WEBHOOK_MAX_BYTES", str(1024 * 1024)))
+# Pre-warm al arrancar: abrir el pool HTTP y armar las páginas del catálogo
+# antes de que /ready conteste 200 ("0" para desactivarlo)
+PREWARM = os.getenv("PREWARM", "1") == "1"
+# Segundos máximos para abrir la conexión con la Graph API durante el pre-warm
+PREWARM_TIMEOUT = float(os.getenv("PREWARM_TIMEOUT", "5"))
+
+# ============================================================
+# PROCESOS WORKER
+# ============================================================
+
+# Procesos que atienden las conversaciones (1 = todo en el proceso de uvicorn)
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "1"))
+# Socket Unix por el que el proceso de uvicorn les pasa los eventos
+WORKER_SOCKET_PATH = os.getenv(
+    "WORKER_SOCKET_PATH", os.path.join(tempfile.gettempdir(), f"bot-workers-{PORT}.sock")
+)
+# Puntos de cada worker en el anillo de hashing consistente
+WORKER_RING_REPLICAS = int(os.getenv("WORKER_RING_REPLICAS", "160"))
+# Eventos que se guardan para un worker mientras se (re)conecta
+WORKER_BACKLOG_SIZE = int(os.getenv("WORKER_BACKLOG_SIZE", "10000"))
+# Segundos para esperar la respuesta de un worker y para que termine al apagar
+WORKER_TIMEOUT = float(os.getenv("WORKER_TIMEOUT", "5"))
+
+# ============================================================
+# BUZONES POR CLIENTE
+# ============================================================
+
+# Segundos sin mensajes hasta que se desarma el buzón (y la tarea) de un cliente
+MAILBOX_IDLE_SECONDS = float(os.getenv("MAILBOX_IDLE_SECONDS", "2"))
+# Mensajes de un mismo cliente esperando a procesarse; los que pasen se descartan
+MAILBOX_MAX_DEPTH = int(os.getenv("MAILBOX_MAX_DEPTH", "100"))
+
+# ============================================================
+# CLIENTE HTTP
+# ============================================================
+
+# Máximo de conexiones abiertas contra la Graph API (pool compartido)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+# Cuántas de esas conexiones se mantienen vivas (keep-alive) esperando reuso
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+# Segundos que una conexión ociosa queda en el pool antes de cerrarse
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+# Timeout total por request (segundos)
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+
+# ============================================================
+# COLA DE SALIDA
+# ============================================================
+
+# Workers que envían mensajes en segundo plano
+OUTBOUND_WORKERS = int(os.getenv("OUTBOUND_WORKERS", "8"))
+# Mensajes que pueden quedar esperando antes de empezar a descartar
+OUTBOUND_QUEUE_SIZE = int(os.getenv("OUTBOUND_QUEUE_SIZE", "10000"))
+# Límite global de envíos por segundo (token bucket) y ráfaga máxima
+OUTBOUND_RATE_PER_SECOND = float(os.getenv("OUTBOUND_RATE_PER_SECOND", "70"))
+OUTBOUND_BURST = int(os.getenv("OUTBOUND_BURST", "100"))
+# Segundos mínimos entre dos mensajes al mismo número
+OUTBOUND_RECIPIENT_INTERVAL = float(os.getenv("OUTBOUND_RECIPIENT_INTERVAL", "0.25"))
+# Intentos por mensaje ante errores transitorios (429, 5xx, timeouts)
+OUTBOUND_MAX_ATTEMPTS = int(os.getenv("OUTBOUND_MAX_ATTEMPTS", "6"))
+# Espera entre reintentos: exponencial desde BASE hasta MAX segundos, con jitter
+OUTBOUND_BACKOFF_BASE = float(os.getenv("OUTBOUND_BACKOFF_BASE", "0.5"))
+OUTBOUND_BACKOFF_MAX = float(os.getenv("OUTBOUND_BACKOFF_MAX", "30"))
+# Circuit breaker: fallas seguidas que lo abren y segundos que queda abierto
+BREAKER_THRESHOLD = int(os.getenv("BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "10"))
+
+# ============================================================
+# OUTBOX (journal de mensajes salientes)
+# ============================================================
+
+# Archivo append-only con cada mensaje a enviar ("" para desactivarlo)
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", "data/outbox.journal")
+# Segundos que se juntan escrituras antes de cada fsync (group commit)
+OUTBOX_COMMIT_INTERVAL = float(os.getenv("OUTBOX_COMMIT_INTERVAL", "0.002"))
+# Tamaño a partir del cual el journal se reescribe solo con lo pendiente
+OUTBOX_COMPACT_BYTES = int(os.getenv("OUTBOX_COMPACT_BYTES", str(16 * 1024 * 1024)))
+
+# ============================================================
+# DIFUSIONES (envíos masivos, ver services/broadcast.py)
+# ============================================================
+
+# Carpeta con el checkpoint de cada difusión
+BROADCAST_DIR = os.getenv("BROADCAST_DIR", "data/broadcasts")
+# Envíos por segundo de una difusión (debajo de OUTBOUND_RATE_PER_SECOND, así el bot sigue contestando)
+BROADCAST_RATE_PER_SECOND = float(os.getenv("BROADCAST_RATE_PER_SECOND", "20"))
+# Envíos simultáneos como máximo
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "16"))
+# Destinatarios que se marcan en disco de una vez (un fsync por lote)
+BROADCAST_BATCH_SIZE = int(os.getenv("BROADCAST_BATCH_SIZE", "64"))
+# Cada cuántos segundos se informa el avance
+BROADCAST_REPORT_INTERVAL = float(os.getenv("BROADCAST_REPORT_INTERVAL", "2"))
+
+# ============================================================
+# DE-DUPLICACIÓN DE MENSAJES
+# ============================================================
+
+# Cuántos ids de mensaje se recuerdan en memoria (los más viejos se descartan)
+DEDUP_MAX_ENTRIES = int(os.getenv("DEDUP_MAX_ENTRIES", "50000"))
+# Segundos durante los que un id se considera repetido (Meta reintenta por horas)
+DEDUP_TTL_SECONDS = float(os.getenv("DEDUP_TTL_SECONDS", str(24 * 60 * 60)))
+# Archivo SQLite compartido entre workers; vacío = solo memoria del proceso
+DEDUP_DB_PATH = os.getenv("DEDUP_DB_PATH", "")
+
+# ============================================================
+# SESIONES
+# ============================================================
+
+# Máximo de sesiones en memoria (se desalojan las menos usadas)
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "100000"))
+# Tope aproximado de memoria para todas las sesiones (bytes)
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(128 * 1024 * 1024)))
+
+# ============================================================
+# CATÁLOGO
+# ============================================================
+
+# Base SQLite con los productos
+CATALOG_DB_PATH = os.getenv("CATALOG_DB_PATH", "data/catalog.db")
+# Cada cuántos segundos se chequea si el catálogo cambió de versión
+CATALOG_REFRESH_SECONDS = float(os.getenv("CATALOG_REFRESH_SECONDS", "30"))
+
+# ============================================================
+# PEDIDOS EN TEXTO LIBRE
+# ============================================================
+
+# Similitud mínima (coseno de trigramas, 0 a 1) para aceptar un producto escrito a mano
+EXTRACT_MIN_SCORE = float(os.getenv("EXTRACT_MIN_SCORE", "0.5"))
+# Ventaja mínima sobre el segundo producto más parecido (si no, es ambiguo)
+EXTRACT_MIN_MARGIN = float(os.getenv("EXTRACT_MIN_MARGIN", "0.1"))
+# Cantidad máxima de un producto en un pedido escrito
+EXTRACT_MAX_QUANTITY = int(os.getenv("EXTRACT_MAX_QUANTITY", "50"))
+
+# ============================================================
+# BÚSQUEDA DE PRODUCTOS
+# ============================================================
+
+# Resultados que se muestran como máximo (WhatsApp admite 10 filas por lista)
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "10"))
+# Parecido mínimo (coeficiente de Dice sobre trigramas, 0 a 1) para mostrar un producto
+SEARCH_MIN_SCORE = float(os.getenv("SEARCH_MIN_SCORE", "0.3"))
+
+# ============================================================
+# SUCURSALES
+# ============================================================
+
+# JSON con las sucursales y sus zonas de entrega (si no existe se usan las de ejemplo)
+BRANCHES_PATH = os.getenv("BRANCHES_PATH", "data/branches.json")
+# Tamaño de celda (en grados) de la grilla que indexa las zonas de entrega
+BRANCH_GRID_DEGREES = float(os.getenv("BRANCH_GRID_DEGREES", "0.05"))
+
+# ============================================================
+# CARRITO Y PEDIDOS
+# ============================================================
+
+# Base SQLite con carritos y pedidos
+ORDERS_DB_PATH = os.getenv("ORDERS_DB_PATH", "data/orders.db")
+# Cada cuántos segundos se escriben a disco los cambios pendientes
+ORDERS_FLUSH_INTERVAL = float(os.getenv("ORDERS_FLUSH_INTERVAL", "0.5"))
+# Cambios pendientes a partir de los cuales se escribe sin esperar el intervalo
+ORDERS_FLUSH_BATCH = int(os.getenv("ORDERS_FLUSH_BATCH", "500"))
+# Espera máxima entre reintentos si escribir a disco falla (se duplica en cada fallo)
+ORDERS_FLUSH_MAX_BACKOFF = float(os.getenv("ORDERS_FLUSH_MAX_BACKOFF", "30"))
+# Clientes cuyos carritos e historial se mantienen en memoria
+ORDERS_CACHE_USERS = int(os.getenv("ORDERS_CACHE_USERS", "50000"))
+# Pedidos que se muestran (y se guardan en memoria) por cliente
+ORDERS_HISTORY_LIMIT = int(os.getenv("ORDERS_HISTORY_LIMIT", "5"))
+
+# ============================================================
+# MEDIOS (audios, fotos, documentos)
+# ============================================================
+
+# Carpeta donde se guardan los archivos que mandan los clientes
+MEDIA_DIR = os.getenv("MEDIA_DIR", "data/media")
+# Tipos de mensaje cuyos archivos se descargan
+MEDIA_TYPES = tuple(t for t in os.getenv("MEDIA_TYPES", "audio,image,document").split(",") if t)
+# Descargas simultáneas como máximo
+MEDIA_CONCURRENCY = int(os.getenv("MEDIA_CONCURRENCY", "4"))
+# Descargas que pueden quedar esperando antes de empezar a descartar
+MEDIA_QUEUE_SIZE = int(os.getenv("MEDIA_QUEUE_SIZE", "1000"))
+# Tamaño de cada bloque que se escribe a disco (bytes)
+MEDIA_CHUNK_SIZE = int(os.getenv("MEDIA_CHUNK_SIZE", str(64 * 1024)))
+# Tamaño máximo de un archivo (WhatsApp permite hasta 100 MB en documentos)
+MEDIA_MAX_BYTES = int(os.getenv("MEDIA_MAX_BYTES", str(100 * 1024 * 1024)))
+
+# ============================================================
+# ESTADOS DE ENTREGA
+# ============================================================
+
+# Cuántos mensajes enviados se siguen (los más viejos se van pisando)
+DELIVERY_TRACK_SIZE = int(os.getenv("DELIVERY_TRACK_SIZE", "65536"))
+
+# ============================================================
+# LOGGING
+# ============================================================
+
+# Nivel mínimo a registrar (DEBUG, INFO, WARNING, ERROR)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Muestreo de eventos de mucho volumen, p. ej. "message_received=0.1,status_received=0.01"
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
@@ -0,0 +1,128 @@
+import sqlite3
+import time
+from collections import OrderedDict
+from shared.config import DEDUP_MAX_ENTRIES, DEDUP_TTL_SECONDS, DEDUP_DB_PATH
+
+
+class SQLiteDedupBackend:
+    """
+    Backend compartido para cuando corren varios workers en la misma
+    máquina: todos consultan el mismo archivo SQLite.
+
+    Cada consulta es un único INSERT (con índice por id), así que cuesta
+    lo mismo sea un id nuevo o repetido.
+    """
+
+    def __init__(self, path: str, ttl: float):
+        self.ttl = ttl
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen_messages ("
+            " message_id TEXT PRIMARY KEY,"
+            " expires_at REAL NOT NULL)"
+        )
+        self.inserts = 0
+
+    def add(self, message_id: str, now: float) -> bool:
+        """Registra el id. Devuelve True si ya estaba (y no venció)."""
+        cursor = self.conn.execute(
+            "INSERT INTO seen_messages (message_id, expires_at) VALUES (?, ?)"
+            " ON CONFLICT(message_id) DO UPDATE SET expires_at = excluded.expires_at"
+            " WHERE seen_messages.expires_at < ?",
+            (message_id, now + self.ttl, now),
+        )
+        self.inserts += 1
+
+        # Limpieza ocasional de los vencidos
+        if self.inserts % 1000 == 0:
+            self.conn.execute("DELETE FROM seen_messages WHERE expires_at < ?", (now,))
+
+        return cursor.rowcount == 0
+
+    def close(self):
+        self.conn.close()
+
+
+class MessageDeduplicator:
+    """
+    Evita procesar dos veces el mismo mensaje cuando Meta reintenta un
+    webhook (lo hace cada vez que tardamos en responder).
+
+    Guarda los ids vistos en un OrderedDict de tamaño fijo: la consulta
+    es O(1), los ids vencen a los `ttl` segundos y, si se llena, se
+    descartan los más viejos. Opcionalmente consulta un backend
+    compartido cuando el id no está en memoria.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEDUP_MAX_ENTRIES,
+        ttl: float = DEDUP_TTL_SECONDS,
+        backend: SQLiteDedupBackend = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        # {message_id: expira_en}, ordenado del más viejo al más nuevo
+        self.entries: OrderedDict[str, float] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_config(cls) -> "MessageDeduplicator":
+        backend = SQLiteDedupBackend(DEDUP_DB_PATH, DEDUP_TTL_SECONDS) if DEDUP_DB_PATH else None
+        return cls(backend=backend)
+
+    def seen(self, message_id: str) -> bool:
+        """
+        Devuelve True si el mensaje ya se procesó (es un reintento).
+        Si es nuevo, lo registra y devuelve False.
+        """
+        now = time.monotonic()
+        expires_at = self.entries.get(message_id)
+
+        if expires_at is not None and expires_at > now:
+            self.hits += 1
+            return True
+
+        # El backend compartido usa reloj de pared (lo comparten varios procesos)
+        if self.backend is not None and self.backend.add(message_id, time.time()):
+            self._remember(message_id, now)
+            self.hits += 1
+            return True
+
+        self._remember(message_id, now)
+        self.misses += 1
+        return False
+
+    def _remember(self, message_id: str, now: float):
+        self.entries[message_id] = now + self.ttl
+        self.entries.move_to_end(message_id)
+
+        # Los más viejos están al principio: se sacan los vencidos y,
+        # si sigue lleno, los que sobran
+        while self.entries:
+            oldest_id, oldest_expires = next(iter(self.entries.items()))
+            if oldest_expires > now and len(self.entries) <= self.max_entries:
+                break
+            del self.entries[oldest_id]
+            if oldest_expires > now:
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "capacity": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "shared_backend": self.backend is not None,
+        }
+
+    def close(self):
+        if self.backend is not None:
+            self.backend.close()
@@ -0,0 +1,223 @@
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from shared.router import CommandRouter
+
+# El estado 0 siempre es "idle": el usuario no está respondiendo nada
+IDLE = 0
+
+# Tipos de mensaje que se buscan en el CommandRouter (lo que el usuario escribe)
+COMMAND_TYPES = frozenset({"text"})
+
+# Método que se está ejecutando ("" fuera de un despacho). La cola de
+# salida lo lee al encolar, así cada envío queda asociado a su handler.
+current_handler: ContextVar[str] = ContextVar("current_handler", default="")
+
+
+def run_handler(action: Callable[..., Any], *args) -> str:
+    """Llama al método dejando su nombre en current_handler mientras corre; devuelve el nombre"""
+    token = current_handler.set(action.__name__)
+    try:
+        action(*args)
+    finally:
+        current_handler.reset(token)
+    return action.__name__
+
+
+class StateSpec:
+    """
+    Declaración de un estado de la conversación.
+
+    - handler: método que recibe la respuesta (..., message_type, content)
+    - expects: tipos de mensaje aceptados (None = cualquiera)
+    - choices: {contenido: método} para respuestas fijas (botones, opciones)
+    - normalize: si es True, el contenido se pasa a minúsculas y sin
+      espacios antes de buscarlo en choices (para comandos de texto)
+    - commands: si es True, el texto se busca primero en el CommandRouter
+      (alias, prefijos y errores de tipeo de los comandos registrados con
+      @register_function), antes que el handler y los choices: así "menu"
+      o "cancelar" sacan al usuario de cualquier paso. None toma el valor
+      del Flow.
+    - fallback: método a llamar si el contenido no está en choices
+    - exit_to_idle: si llega un tipo de mensaje que el estado no espera
+      (p. ej. texto cuando espera un botón), se maneja como en "idle" en
+      vez de contestar invalid_reply: el usuario dejó el paso a medias
+      para escribir otra cosa
+    - invalid_reply / on_invalid: qué contestar y a qué método ir si el
+      tipo de mensaje no es el esperado (o no hay choice ni fallback)
+    """
+
+    __slots__ = (
+        "name", "handler", "expects", "choices", "normalize", "commands",
+        "fallback", "exit_to_idle", "invalid_reply", "on_invalid",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        handler: Optional[str] = None,
+        expects: Optional[Iterable[str]] = None,
+        choices: Optional[Dict[str, str]] = None,
+        normalize: bool = False,
+        commands: Optional[bool] = None,
+        fallback: Optional[str] = None,
+        exit_to_idle: bool = False,
+        invalid_reply: Optional[str] = None,
+        on_invalid: Optional[str] = None,
+    ):
+        self.name = name
+        self.handler = handler
+        self.expects = frozenset(expects) if expects is not None else None
+        self.choices = choices or {}
+        self.normalize = normalize
+        self.commands = commands
+        self.fallback = fallback
+        self.exit_to_idle = exit_to_idle
+        self.invalid_reply = invalid_reply
+        self.on_invalid = on_invalid
+
+
+class Flow:
+    """
+    Flujo de conversación declarativo.
+
+    Los estados, los tipos de mensaje que esperan y sus transiciones se
+    declaran una sola vez a nivel de módulo; compile() los convierte en
+    tablas indexadas por un entero (el id del estado). La sesión del
+    usuario guarda solo ese entero, así se puede inspeccionar, serializar
+    o mover a otro proceso, y despachar un mensaje es un acceso a lista
+    más una búsqueda en dict.
+
+    Con `commands=True` los comandos valen en todos los estados (salvo
+    los que declaren commands=False).
+    """
+
+    def __init__(self, commands: bool = False):
+        self.commands = commands
+        self.specs: List[StateSpec] = [StateSpec("idle", commands=commands)]
+
+    def state(self, name: str, **options) -> int:
+        """Declara un estado y devuelve su id"""
+        spec = StateSpec(name, **options)
+        if spec.commands is None:
+            spec.commands = self.commands
+        if name == "idle":
+            self.specs[IDLE] = spec
+            return IDLE
+        if any(s.name == name for s in self.specs):
+            raise ValueError(f"Estado duplicado: {name}")
+        self.specs.append(spec)
+        return len(self.specs) - 1
+
+    def compile(self, target: Any, reply: Callable[..., Any], router: Optional[CommandRouter] = None) -> "CompiledFlow":
+        """
+        Resuelve los nombres de métodos contra `target` (p. ej. el
+        ChatController) y arma las tablas de despacho.
+        `reply(*args, text)` se usa para las respuestas de error.
+        `router` resuelve los comandos de los estados con commands=True;
+        si no se pasa, se arma con los @register_function de `target`.
+        """
+        if router is None and any(spec.commands for spec in self.specs):
+            router = CommandRouter.from_registry(target)
+        return CompiledFlow(self.specs, target, reply, router)
+
+
+class CompiledFlow:
+    """Tablas de despacho de un Flow, ya resueltas contra un objeto"""
+
+    def __init__(
+        self,
+        specs: List[StateSpec],
+        target: Any,
+        reply: Callable[..., Any],
+        router: Optional[CommandRouter] = None,
+    ):
+        self.names = tuple(spec.name for spec in specs)
+        self.ids = {name: state_id for state_id, name in enumerate(self.names)}
+
+        def bind(method_name: Optional[str]) -> Optional[Callable]:
+            if method_name is None:
+                return None
+            method = getattr(target, method_name, None)
+            if method is None:
+                raise ValueError(f"{type(target).__name__} no tiene el método {method_name}")
+            return method
+
+        # Una entrada por estado, en el orden de los ids
+        self.handlers = [bind(spec.handler) for spec in specs]
+        self.accepts = [spec.expects for spec in specs]
+        self.choices = [{key: bind(name) for key, name in spec.choices.items()} for spec in specs]
+        self.normalize = [spec.normalize for spec in specs]
+        self.commands = [spec.commands for spec in specs]
+        self.fallbacks = [bind(spec.fallback) for spec in specs]
+        self.exits = [spec.exit_to_idle and state_id != IDLE for state_id, spec in enumerate(specs)]
+        self.invalid_replies = [spec.invalid_reply for spec in specs]
+        self.on_invalid = [bind(spec.on_invalid) for spec in specs]
+        self.reply = reply
+        self.router = router
+
+    def id(self, name: str) -> int:
+        """Id de un estado a partir de su nombre"""
+        return self.ids[name]
+
+    def handler_names(self) -> set:
+        """Nombres de todos los métodos a los que puede despachar el flujo"""
+        methods = [*self.handlers, *self.fallbacks, *self.on_invalid]
+        for choices in self.choices:
+            methods.extend(choices.values())
+        if self.router is not None:
+            methods.extend(self.router.aliases.values())
+        return {method.__name__ for method in methods if method is not None}
+
+    def dispatch(self, state_id: int, message_type: str, content: Any, *args) -> Optional[str]:
+        """
+        Despacha un mensaje según el estado actual.
+
+        `args` son los argumentos comunes a todos los métodos (en el
+        ChatController, el número de teléfono). Devuelve el nombre del
+        método que manejó el mensaje, o None si no se pudo manejar en
+        este estado.
+        """
+        if self.commands[state_id] and message_type in COMMAND_TYPES and isinstance(content, str):
+            action = self.router.match(content)
+            if action is not None:
+                return run_handler(action, *args)
+
+        accepts = self.accepts[state_id]
+        if accepts is not None and message_type not in accepts:
+            idle_accepts = self.accepts[IDLE]
+            if self.exits[state_id] and (idle_accepts is None or message_type in idle_accepts):
+                return self.dispatch(IDLE, message_type, content, *args)
+            self._invalid(state_id, args)
+            return None
+
+        handler = self.handlers[state_id]
+        if handler is not None:
+            return run_handler(handler, *args, message_type, content)
+
+        choices = self.choices[state_id]
+        key = content
+        if self.normalize[state_id] and isinstance(content, str):
+            key = content.lower().strip()
+
+        action = choices.get(key) if isinstance(key, str) else None
+        if action is not None:
+            return run_handler(action, *args)
+
+        fallback = self.fallbacks[state_id]
+        if fallback is not None:
+            return run_handler(fallback, *args, message_type, content)
+
+        self._invalid(state_id, args)
+        return None
+
+    def _invalid(self, state_id: int, args: tuple):
+        token = current_handler.set("invalid")
+        try:
+            text = self.invalid_replies[state_id]
+            if text is not None:
+                self.reply(*args, text)
+            action = self.on_invalid[state_id]
+            if action is not None:
+                action(*args)
+        finally:
+            current_handler.reset(token)
@@ -0,0 +1,124 @@
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+from shared.config import LOG_LEVEL, LOG_SAMPLE_RATES
+
+# Todos los loggers del bot cuelgan de "bot" (bot.webhook, bot.outbound, ...)
+ROOT_LOGGER = "bot"
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def log_event(logger: logging.Logger, level: int, event: str, **fields):
+    """
+    Registra un evento estructurado: `event` es el nombre del evento y
+    `fields` los datos (sender, message_id, duration_ms, ...).
+
+    Si el nivel está deshabilitado no se arma ni se formatea nada. El
+    JSON se arma recién en el hilo del QueueListener, fuera del event loop.
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
+
+
+class JsonFormatter(logging.Formatter):
+    """Un objeto JSON por línea: {"ts", "level", "logger", "event", ...campos}"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            data.update(fields)
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que NO formatea en el hilo que loguea: el record viaja
+    tal cual a la cola y el formateo (y la escritura a stdout) los hace
+    el hilo del QueueListener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Muestreo por evento para los de mucho volumen.
+    rates: {"message_received": 0.1} → se registra 1 de cada 10.
+    Los WARNING o más graves nunca se descartan.
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.msg)
+        return rate is None or random.random() < rate
+
+
+def parse_sample_rates(spec: str) -> dict[str, float]:
+    """'message_received=0.1,status_received=0.01' → dict"""
+    rates = {}
+    for item in spec.split(","):
+        if "=" in item:
+            event, rate = item.split("=", 1)
+            rates[event.strip()] = float(rate)
+    return rates
+
+
+def setup_logging(level: str = LOG_LEVEL, sample_rates: str = LOG_SAMPLE_RATES) -> logging.handlers.QueueListener:
+    """
+    Configura el logger "bot": los eventos van a una cola en memoria y
+    un hilo aparte los formatea como JSON y los escribe en stdout.
+    Devuelve el listener (hay que llamar a .stop() al apagar para que
+    se vacíe la cola).
+    """
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter())
+    listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=False)
+
+    handler = DeferredQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(parse_sample_rates(sample_rates)))
+
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.handlers = [handler]
+    logger.setLevel(level.upper())
+    logger.propagate = False
+
+    listener.start()
+    return listener
+
+
+class Timer:
+    """Mide duraciones: t = Timer(); ...; t.ms() (para logs) o t.seconds() (para métricas)"""
+
+    __slots__ = ("started",)
+
+    def __init__(self):
+        self.started = time.perf_counter()
+
+    def ms(self) -> float:
+        return round((time.perf_counter() - self.started) * 1000, 3)
+
+    def seconds(self) -> float:
+        return time.perf_counter() - self.started
@@ -0,0 +1,250 @@
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# ============================================================
+# MÉTRICAS (formato de texto de Prometheus)
+# ============================================================
+# Registrar un valor es un bisect + dos sumas sobre listas ya armadas:
+# no hay locks (todo corre en el event loop) ni se arma ningún objeto.
+# Los valores por etiqueta se crean la primera vez que se usan (o antes,
+# con .labels(...) al arrancar) y después se reusan siempre.
+
+# Segundos: de 0.5 ms a 2.5 s para lo que corre dentro del proceso
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# Segundos: de 10 ms a 10 s para llamadas a la Graph API
+NETWORK_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class HistogramValues:
+    """Cuentas por bucket (no acumuladas), suma y total de una serie"""
+
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # Un bucket por límite más el +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram:
+    """
+    Histograma con buckets fijos.
+        WEBHOOK_SECONDS.observe(0.003)
+        HANDLER_SECONDS.observe(0.001, "show_cart")
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Iterable[float] = LATENCY_BUCKETS, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.bounds = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        self.series: Dict[Tuple[str, ...], HistogramValues] = {}
+        if not self.labelnames:
+            self.labels()
+
+    def labels(self, *values: str) -> HistogramValues:
+        """Serie para esas etiquetas (se crea una sola vez)"""
+        series = self.series.get(values)
+        if series is None:
+            series = self.series[values] = HistogramValues(self.bounds)
+        return series
+
+    def observe(self, value: float, *labels: str):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.labels(*labels)
+        series.observe(value)
+
+    def render(self) -> List[str]:
+        lines = []
+        for values, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float("inf"),), series.counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_number(series.sum)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {cumulative}")
+        return lines
+
+
+class Counter:
+    """
+    Contador que solo sube.
+        OUTBOUND_RESPONSES.inc("200")
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        # Cada serie es una lista de un elemento para sumar sin buscar dos veces
+        self.series: Dict[Tuple[str, ...], List[float]] = {}
+        if not self.labelnames:
+            self.labels()
+
+    def labels(self, *values: str) -> List[float]:
+        series = self.series.get(values)
+        if series is None:
+            series = self.series[values] = [0]
+        return series
+
+    def inc(self, *labels: str, amount: float = 1):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.labels(*labels)
+        series[0] += amount
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}{_labels(self.labelnames, values)} {_number(series[0])}"
+            for values, series in self.series.items()
+        ]
+
+
+class Gauge(Counter):
+    """
+    Valor que se fija (puede subir o bajar).
+        STARTUP_SECONDS.set(0.42, "prewarm")
+    """
+
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.labels(*labels)
+        series[0] = value
+
+
+class GaugeFunc:
+    """
+    Valor que se lee recién al pedir /metrics (sesiones vivas, profundidad
+    de la cola, ...): no cuesta nada mientras no se consulta.
+    `read` devuelve un número, o un dict {valores de etiquetas: número}.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, read: Callable[[], object], labelnames: Iterable[str] = (), kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        value = self.read()
+        if isinstance(value, dict):
+            return [
+                f"{self.name}{_labels(self.labelnames, labels if isinstance(labels, tuple) else (labels,))} {_number(v)}"
+                for labels, v in value.items()
+            ]
+        return [f"{self.name} {_number(value)}"]
+
+
+class Registry:
+    """Conjunto de métricas que se exponen en /metrics"""
+
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        """Agrega (o reemplaza, si ya había una con ese nombre) una métrica"""
+        self.metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name: str, help: str, buckets: Iterable[float] = LATENCY_BUCKETS, labelnames: Iterable[str] = ()) -> Histogram:
+        return self.register(Histogram(name, help, buckets, labelnames))
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def gauge_func(self, name: str, help: str, read: Callable[[], object], labelnames: Iterable[str] = (), kind: str = "gauge") -> GaugeFunc:
+        return self.register(GaugeFunc(name, help, read, labelnames, kind))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# ============================================================
+# MÉTRICAS DEL BOT
+# ============================================================
+# Los gauges (sesiones, colas, ...) se registran en el lifespan de
+# main.py, porque leen los objetos que se crean ahí.
+
+STARTUP_SECONDS = REGISTRY.gauge(
+    "bot_startup_seconds",
+    "Duración del arranque por fase (lifespan, prewarm y cada paso del prewarm)",
+    labelnames=("phase",),
+)
+WEBHOOK_SECONDS = REGISTRY.histogram(
+    "bot_webhook_seconds",
+    "Tiempo de procesamiento de un POST /whatsapp",
+)
+HANDLER_SECONDS = REGISTRY.histogram(
+    "bot_handler_seconds",
+    "Tiempo de procesamiento de un mensaje por handler de la conversación",
+    labelnames=("handler",),
+)
+WEBHOOK_REJECTED = REGISTRY.counter(
+    "bot_webhook_rejected_total",
+    "POST /whatsapp rechazados antes de decodificar, por motivo (missing, malformed, too_large, mismatch, no_secret)",
+    labelnames=("reason",),
+)
+EVENTS = REGISTRY.counter(
+    "bot_webhook_events_total",
+    "Eventos recibidos por el webhook",
+    labelnames=("kind",),
+)
+OUTBOUND_SECONDS = REGISTRY.histogram(
+    "bot_outbound_seconds",
+    "Latencia de los envíos a la Graph API",
+    buckets=NETWORK_BUCKETS,
+)
+OUTBOUND_RESPONSES = REGISTRY.counter(
+    "bot_outbound_responses_total",
+    "Respuestas de la Graph API por código de estado ('error' = sin respuesta)",
+    labelnames=("code",),
+)
+MEDIA_DOWNLOADS = REGISTRY.counter(
+    "bot_media_downloads_total",
+    "Descargas de archivos de clientes por resultado (downloaded, cached, failed, dropped)",
+    labelnames=("result",),
+)
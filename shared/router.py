@@ -0,0 +1,185 @@
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+
+def register_function(command: str, *aliases: str):
+    """
+    Decorador para registrar comandos del bot.
+
+    Marca el método con su comando principal y sus sinónimos; el
+    CommandRouter los junta al compilarse (ver CommandRouter.from_registry).
+        @register_function("/start", "hola", "menú", "inicio")
+    """
+    def decorator(func):
+        func.commands = (command, *aliases)
+        return func
+    return decorator
+
+
+def registered_commands(cls) -> Dict[str, tuple]:
+    """{nombre del método: comandos} de los métodos marcados en la clase"""
+    registry = {}
+    for name in dir(cls):
+        commands = getattr(getattr(cls, name, None), "commands", None)
+        if isinstance(commands, tuple):
+            registry[name] = commands
+    return registry
+
+
+# ============================================================
+# NORMALIZACIÓN
+# ============================================================
+
+def _build_translation() -> dict:
+    """
+    Tabla para str.translate: saca acentos (á→a, ü→u, ñ→n) y cambia la
+    puntuación por espacios. Se arma una vez al importar, así normalizar
+    un mensaje es un casefold + un translate.
+    """
+    table = {}
+    for code in range(0xC0, 0x250):
+        char = chr(code)
+        base = unicodedata.normalize("NFKD", char)[0]
+        if base != char and base.isascii():
+            table[code] = base
+    for char in "¡!¿?.,;:\"'()[]{}*_~-/\\":
+        table[ord(char)] = " "
+    return table
+
+
+_TRANSLATION = _build_translation()
+
+
+def normalize(text: str) -> str:
+    """'¡Menú!' → 'menu', '/Inicio  ya' → 'inicio ya'"""
+    return " ".join(text.casefold().translate(_TRANSLATION).split())
+
+
+def _within_distance(a: str, b: str, limit: int) -> bool:
+    """Levenshtein acotado: True si a y b están a `limit` ediciones o menos"""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        row_min = i
+        for j, char_b in enumerate(b, 1):
+            cost = previous[j - 1] + (char_a != char_b)
+            value = min(previous[j] + 1, current[j - 1] + 1, cost)
+            current.append(value)
+            row_min = min(row_min, value)
+        if row_min > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+
+# ============================================================
+# ROUTER
+# ============================================================
+
+class CommandRouter:
+    """
+    Resuelve un texto libre al comando que corresponde.
+
+    Al compilar arma:
+    - un dict de alias normalizados → destino (búsqueda exacta O(1))
+    - un índice de prefijos no ambiguos (un trie aplanado en un dict):
+      "men" → menú, "carr" → carrito
+    - los alias agrupados por largo, para buscar con distancia de
+      edición acotada solo entre los de largo parecido ("meun" → menu)
+
+    Además recuerda los últimos textos resueltos (o no resueltos), así
+    los mensajes repetidos ("hola", "menu") no vuelven a recorrer nada.
+    """
+
+    MIN_PREFIX = 3
+    CACHE_SIZE = 4096
+
+    def __init__(self):
+        self.aliases: Dict[str, Any] = {}
+        self.prefixes: Dict[str, Any] = {}
+        self.by_length: Dict[int, List[str]] = {}
+        self.cache: OrderedDict[str, Optional[Any]] = OrderedDict()
+
+    @classmethod
+    def from_registry(cls, target: Any) -> "CommandRouter":
+        """Router con los métodos de `target` marcados con @register_function"""
+        router = cls()
+        for name, commands in registered_commands(type(target)).items():
+            router.add(getattr(target, name), *commands)
+        return router.compile()
+
+    def add(self, destination: Any, *aliases: str) -> "CommandRouter":
+        for alias in aliases:
+            key = normalize(alias)
+            existing = self.aliases.get(key)
+            if existing is not None and existing != destination:
+                raise ValueError(f"El comando '{alias}' ya está registrado")
+            self.aliases[key] = destination
+        return self
+
+    def compile(self) -> "CommandRouter":
+        prefixes: Dict[str, set] = {}
+        by_length: Dict[int, List[str]] = {}
+        for alias, destination in self.aliases.items():
+            by_length.setdefault(len(alias), []).append(alias)
+            for end in range(self.MIN_PREFIX, len(alias)):
+                prefixes.setdefault(alias[:end], set()).add(id(destination))
+
+        # Solo quedan los prefijos que llevan a un único destino
+        destinations = {id(d): d for d in self.aliases.values()}
+        self.prefixes = {
+            prefix: destinations[next(iter(ids))]
+            for prefix, ids in prefixes.items()
+            if len(ids) == 1 and prefix not in self.aliases
+        }
+        self.by_length = by_length
+        self.cache.clear()
+        return self
+
+    def match(self, text: str) -> Optional[Any]:
+        """Destino del comando escrito en `text`, o None si no es ningún comando"""
+        cached = self.cache.get(text, self)
+        if cached is not self:
+            return cached
+
+        result = self._match(normalize(text))
+        self.cache[text] = result
+        if len(self.cache) > self.CACHE_SIZE:
+            self.cache.popitem(last=False)
+        return result
+
+    def _match(self, key: str) -> Optional[Any]:
+        # Solo el mensaje completo es un comando: "hola quiero 2 napolitanas"
+        # es un pedido y lo resuelve el fallback del estado, no el saludo
+        if not key:
+            return None
+
+        # 1) Alias exacto
+        destination = self.aliases.get(key)
+        if destination is not None:
+            return destination
+
+        # 2) Prefijo no ambiguo de una sola palabra ("carr")
+        if " " not in key:
+            destination = self.prefixes.get(key)
+            if destination is not None:
+                return destination
+
+        # 3) Errores de tipeo: 1 edición hasta 5 letras, 2 para más largos.
+        # Primero los alias a una edición, así "carito" es carrito y no carta
+        if len(key) < self.MIN_PREFIX:
+            return None
+        for limit in range(1, (1 if len(key) <= 5 else 2) + 1):
+            for length in range(len(key) - limit, len(key) + limit + 1):
+                for alias in self.by_length.get(length, ()):
+                    if _within_distance(key, alias, limit):
+                        return self.aliases[alias]
+
+        return None
+
+    def commands(self) -> Dict[str, Callable]:
+        """{alias normalizado: destino}"""
+        return dict(self.aliases)
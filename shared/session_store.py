@@ -0,0 +1,136 @@
+import sys
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict
+from shared.config import SESSION_MAX_ENTRIES, SESSION_MAX_BYTES
+from shared.flow import IDLE
+
+
+class Session:
+    """
+    Estado de la conversación con un usuario.
+
+    Usa __slots__ para que cada sesión ocupe lo mínimo: con cientos de
+    miles de clientes por mes, el dict por instancia pesa.
+    """
+
+    __slots__ = ("phone_number", "waiting_for", "data", "last_seen", "size")
+
+    def __init__(self, phone_number: str):
+        self.phone_number = phone_number
+        # Id del estado del flujo (ver shared/flow.py); IDLE = no espera nada
+        self.waiting_for: int = IDLE
+        self.data: Dict[str, Any] = {}
+        self.last_seen = time.monotonic()
+        self.size = 0
+
+    def estimate_size(self) -> int:
+        """Tamaño aproximado en bytes (sesión + datos temporales)"""
+        size = sys.getsizeof(self) + sys.getsizeof(self.data)
+        for key, value in self.data.items():
+            size += sys.getsizeof(key) + sys.getsizeof(value)
+        return size
+
+
+class SessionStore(ABC):
+    """Dónde se guardan las sesiones de los usuarios"""
+
+    @abstractmethod
+    def get(self, phone_number: str) -> Session:
+        """Obtiene la sesión del usuario (la crea si no existe)"""
+
+    @abstractmethod
+    def discard(self, phone_number: str):
+        """Borra la sesión del usuario"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Cantidad de sesiones vivas"""
+
+    @abstractmethod
+    def stats(self) -> dict:
+        """Contadores para monitoreo"""
+
+
+class MemorySessionStore(SessionStore):
+    """
+    Sesiones en memoria con tope de cantidad y de bytes.
+
+    Las sesiones se guardan en un OrderedDict ordenado por último uso:
+    cuando se pasa algún tope se desalojan las menos usadas (LRU).
+    El tamaño de cada sesión se recalcula cada vez que se accede, así
+    refleja lo que el turno anterior guardó en `data`.
+
+    También recuerda (sin datos) los últimos números desalojados, para
+    contar cuántas sesiones se tuvieron que recrear: si ese número crece
+    mucho, el tope es demasiado chico.
+    """
+
+    def __init__(self, max_entries: int = SESSION_MAX_ENTRIES, max_bytes: int = SESSION_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sessions: OrderedDict[str, Session] = OrderedDict()
+        self.total_bytes = 0
+
+        # Números desalojados recientemente (solo la clave)
+        self.evicted_recently: OrderedDict[str, None] = OrderedDict()
+
+        self.created = 0
+        self.evicted = 0
+        self.recreated = 0
+
+    def get(self, phone_number: str) -> Session:
+        session = self.sessions.get(phone_number)
+
+        if session is None:
+            session = Session(phone_number)
+            self.sessions[phone_number] = session
+            self.created += 1
+            if phone_number in self.evicted_recently:
+                del self.evicted_recently[phone_number]
+                self.recreated += 1
+        else:
+            self.sessions.move_to_end(phone_number)
+            session.last_seen = time.monotonic()
+
+        new_size = session.estimate_size()
+        self.total_bytes += new_size - session.size
+        session.size = new_size
+
+        self._evict(keep=phone_number)
+        return session
+
+    def discard(self, phone_number: str):
+        session = self.sessions.pop(phone_number, None)
+        if session is not None:
+            self.total_bytes -= session.size
+
+    def _evict(self, keep: str):
+        while len(self.sessions) > 1 and (
+            len(self.sessions) > self.max_entries or self.total_bytes > self.max_bytes
+        ):
+            phone_number, session = next(iter(self.sessions.items()))
+            if phone_number == keep:
+                break
+            del self.sessions[phone_number]
+            self.total_bytes -= session.size
+            self.evicted += 1
+
+            self.evicted_recently[phone_number] = None
+            if len(self.evicted_recently) > self.max_entries:
+                self.evicted_recently.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def stats(self) -> dict:
+        return {
+            "live": len(self.sessions),
+            "max_entries": self.max_entries,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "created": self.created,
+            "evicted": self.evicted,
+            "recreated": self.recreated,
+        }
@@ -0,0 +1,75 @@
+import hashlib
+import hmac
+from typing import AsyncIterator, Optional
+
+# Meta firma cada webhook con el App Secret: X-Hub-Signature-256: sha256=<hex>
+SIGNATURE_PREFIX = "sha256="
+
+
+class SignatureError(Exception):
+    """El webhook no viene firmado por Meta; `reason` va a las métricas"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def parse_signature(header: Optional[str]) -> bytes:
+    """'sha256=ab12...' → los 32 bytes del HMAC"""
+    if not header:
+        raise SignatureError("missing")
+    if not header.startswith(SIGNATURE_PREFIX):
+        raise SignatureError("malformed")
+    try:
+        digest = bytes.fromhex(header[len(SIGNATURE_PREFIX):])
+    except ValueError:
+        raise SignatureError("malformed") from None
+    if len(digest) != hashlib.sha256().digest_size:
+        raise SignatureError("malformed")
+    return digest
+
+
+async def read_signed_body(
+    chunks: AsyncIterator[bytes],
+    signature: Optional[str],
+    secret: bytes,
+    max_bytes: int,
+    declared_size: Optional[int] = None,
+    allow_unsigned: bool = False,
+) -> bytes:
+    """
+    Lee el body del request verificando la firma en la misma pasada: el
+    HMAC se actualiza con cada pedazo a medida que llega, así al terminar
+    de leer ya se sabe si es válido y los mismos bytes se decodifican
+    después sin volver a leerlos. Si vino en un solo pedazo (lo normal)
+    se devuelve ese mismo objeto, sin copiarlo.
+
+    Lo que se puede rechazar antes de leer (sin firma, firma mal
+    formada, Content-Length mayor a `max_bytes`) se rechaza sin leer
+    nada. Levanta SignatureError. Con `secret` vacío se rechaza todo
+    ("no_secret"), salvo que `allow_unsigned` pida no verificar.
+    """
+    if not secret and not allow_unsigned:
+        raise SignatureError("no_secret")
+    expected = parse_signature(signature) if secret else None
+    if declared_size is not None and declared_size > max_bytes:
+        raise SignatureError("too_large")
+
+    mac = hmac.new(secret, digestmod=hashlib.sha256) if secret else None
+    parts = []
+    size = 0
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        size += len(chunk)
+        if size > max_bytes:
+            raise SignatureError("too_large")
+        if mac is not None:
+            mac.update(chunk)
+        parts.append(chunk)
+
+    if mac is not None and not hmac.compare_digest(mac.digest(), expected):
+        raise SignatureError("mismatch")
+    if len(parts) == 1:
+        return parts[0]
+    return b"".join(parts)
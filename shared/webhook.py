@@ -0,0 +1,272 @@
+import asyncio
+from typing import TYPE_CHECKING, Any, Callable, Iterator, Optional, Tuple, Union
+import msgspec
+
+if TYPE_CHECKING:
+    from shared.actors import Mailboxes
+
+# ============================================================
+# ESTRUCTURAS DEL WEBHOOK DE META
+# ============================================================
+# Solo se declaran los campos que usamos o que vale la pena tener
+# tipados; lo que no está declarado se ignora al decodificar (no se
+# crea ningún objeto para eso). Ref: WhatsApp Cloud API → Webhooks.
+
+
+class Text(msgspec.Struct):
+    body: str = ""
+
+
+class Reply(msgspec.Struct):
+    id: str = ""
+    title: str = ""
+    description: Optional[str] = None
+
+
+class FlowReply(msgspec.Struct):
+    response_json: str = ""
+    body: str = ""
+    name: str = ""
+
+
+class Interactive(msgspec.Struct):
+    type: str = ""
+    button_reply: Optional[Reply] = None
+    list_reply: Optional[Reply] = None
+    nfm_reply: Optional[FlowReply] = None
+
+
+class Button(msgspec.Struct):
+    """Respuesta a un botón de una plantilla (quick reply)"""
+    payload: str = ""
+    text: str = ""
+
+
+class Location(msgspec.Struct):
+    latitude: float = 0.0
+    longitude: float = 0.0
+    name: Optional[str] = None
+    address: Optional[str] = None
+    url: Optional[str] = None
+
+
+class Media(msgspec.Struct):
+    """Imagen, audio, video, documento o sticker"""
+    id: str = ""
+    mime_type: str = ""
+    sha256: str = ""
+    caption: Optional[str] = None
+    filename: Optional[str] = None
+    voice: bool = False
+    animated: bool = False
+
+
+class Reaction(msgspec.Struct):
+    message_id: str = ""
+    emoji: str = ""
+
+
+class Order(msgspec.Struct):
+    catalog_id: str = ""
+    text: Optional[str] = None
+    product_items: list[dict] = []
+
+
+class System(msgspec.Struct):
+    body: str = ""
+    type: str = ""
+    wa_id: Optional[str] = None
+
+
+class Context(msgspec.Struct):
+    id: str = ""
+    from_: str = msgspec.field(default="", name="from")
+    forwarded: bool = False
+
+
+class Error(msgspec.Struct):
+    code: int = 0
+    title: str = ""
+    message: str = ""
+    error_data: Optional[dict] = None
+
+
+class Message(msgspec.Struct):
+    id: str = ""
+    from_: str = msgspec.field(default="", name="from")
+    timestamp: str = ""
+    type: str = "unknown"
+    context: Optional[Context] = None
+    text: Optional[Text] = None
+    interactive: Optional[Interactive] = None
+    button: Optional[Button] = None
+    location: Optional[Location] = None
+    image: Optional[Media] = None
+    audio: Optional[Media] = None
+    video: Optional[Media] = None
+    document: Optional[Media] = None
+    sticker: Optional[Media] = None
+    reaction: Optional[Reaction] = None
+    contacts: Optional[list[dict]] = None
+    order: Optional[Order] = None
+    system: Optional[System] = None
+    referral: Optional[dict] = None
+    errors: Optional[list[Error]] = None
+
+
+class Status(msgspec.Struct):
+    """Estado de un mensaje que enviamos: sent, delivered, read o failed"""
+    id: str = ""
+    status: str = ""
+    timestamp: str = ""
+    recipient_id: str = ""
+    conversation: Optional[dict] = None
+    pricing: Optional[dict] = None
+    errors: Optional[list[Error]] = None
+    biz_opaque_callback_data: Optional[str] = None
+
+
+class Metadata(msgspec.Struct):
+    display_phone_number: str = ""
+    phone_number_id: str = ""
+
+
+class Value(msgspec.Struct):
+    messaging_product: str = ""
+    metadata: Optional[Metadata] = None
+    messages: list[Message] = []
+    statuses: list[Status] = []
+    errors: Optional[list[Error]] = None
+
+
+class Change(msgspec.Struct):
+    field: str = ""
+    value: Value = msgspec.field(default_factory=Value)
+
+
+class Entry(msgspec.Struct):
+    id: str = ""
+    changes: list[Change] = []
+
+
+class WebhookPayload(msgspec.Struct):
+    object: str = ""
+    entry: list[Entry] = []
+
+
+_decoder = msgspec.json.Decoder(WebhookPayload)
+
+
+def decode_webhook(body: bytes) -> WebhookPayload:
+    """
+    Decodifica el body crudo del webhook directo a las estructuras de
+    arriba, en una sola pasada (sin armar dicts intermedios).
+    Lanza msgspec.DecodeError / ValidationError si el body no es válido.
+    """
+    return _decoder.decode(body)
+
+
+# ============================================================
+# CONTENIDO DE CADA TIPO DE MENSAJE
+# ============================================================
+
+def _interactive_content(message: Message):
+    interactive = message.interactive
+    if interactive.type == "button_reply":
+        return interactive.button_reply.id  # ¡IMPORTANTE: usa 'id' no 'title'!
+    if interactive.type == "list_reply":
+        return interactive.list_reply.id  # ¡IMPORTANTE: usa 'id' no 'title'!
+    if interactive.type == "nfm_reply":
+        return interactive.nfm_reply.response_json
+    return None
+
+
+# Tipo de mensaje → función que devuelve su contenido
+CONTENT_EXTRACTORS: dict[str, Callable[[Message], Any]] = {
+    "text": lambda m: m.text.body,
+    "interactive": _interactive_content,
+    "button": lambda m: m.button.payload,
+    "location": lambda m: m.location,  # Location completo con lat/lon
+    "image": lambda m: m.image,
+    "audio": lambda m: m.audio,  # Media: el id sirve para descargarlo
+    "video": lambda m: m.video,
+    "document": lambda m: m.document,
+    "sticker": lambda m: m.sticker,
+    "reaction": lambda m: m.reaction,
+    "contacts": lambda m: m.contacts,
+    "order": lambda m: m.order,
+    "system": lambda m: m.system,
+}
+
+
+def get_message_type(message: Message) -> Tuple[str, Any]:
+    """
+    Extrae el tipo y contenido de un mensaje de WhatsApp.
+
+    - text: el texto
+    - interactive: el 'id' del botón o fila de lista elegida
+    - button: el payload del botón de plantilla
+    - location: Location (lat/lon, nombre, dirección)
+    - image / audio / video / document / sticker: Media (id, mime_type, ...)
+    - reaction, contacts, order, system: la estructura correspondiente
+    - cualquier otro tipo (o un tipo sin su campo): None
+    """
+    extractor = CONTENT_EXTRACTORS.get(message.type)
+    if extractor is None:
+        return message.type, None
+    try:
+        return message.type, extractor(message)
+    except AttributeError:
+        # El tipo declarado no trae su objeto (p. ej. type="image" sin "image")
+        return message.type, None
+
+
+# ============================================================
+# RECORRIDO Y DESPACHO DE EVENTOS
+# ============================================================
+
+# Un evento es ("message" | "status", value del change, Message o Status)
+Event = Tuple[str, Value, Union[Message, Status]]
+
+
+def iter_events(payload: WebhookPayload) -> Iterator[Event]:
+    """
+    Recorre TODO el payload del webhook en una sola pasada.
+
+    Meta agrupa varias entradas (entry), varios cambios por entrada
+    (changes) y varios mensajes/status por cambio cuando hay carga, así
+    que no alcanza con mirar entry[0].changes[0].messages[0].
+    Los eventos salen en el mismo orden en que vienen en el payload.
+    """
+    for entry in payload.entry:
+        for change in entry.changes:
+            value = change.value
+
+            for message in value.messages:
+                yield "message", value, message
+
+            for status in value.statuses:
+                yield "status", value, status
+
+
+def event_sender(event: Event) -> str:
+    """Número de teléfono del cliente al que corresponde el evento"""
+    kind, _, item = event
+    if kind == "message":
+        return item.from_
+    return item.recipient_id
+
+
+async def dispatch_events(events: Iterator[Event], mailboxes: "Mailboxes") -> int:
+    """
+    Procesa los eventos en paralelo entre clientes distintos, pero en
+    orden para cada cliente: cada evento va al buzón de su número (ver
+    shared/actors.py), que los atiende de a uno. El orden se respeta
+    también entre webhooks que llegan a la vez.
+
+    Un error en un evento no frena al resto. Espera a que terminen y
+    devuelve cuántos eventos se procesaron.
+    """
+    futures = [mailboxes.submit(event_sender(event), event) for event in events]
+    await asyncio.gather(*futures)
+    return len(futures)
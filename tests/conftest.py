@@ -0,0 +1,93 @@
+import json
+import pytest
+from controllers.chat_controller import ChatController
+from services.branches import BranchIndex
+from services.catalog import Catalog
+from services.orders import OrderStore
+
+
+class FakeWhatsApp:
+    """
+    Hace de WhatsAppService/OutboundQueue: guarda cada envío como
+    (tipo, texto, ids de botones o filas) en vez de mandarlo.
+    """
+
+    def __init__(self):
+        self.sent = []
+
+    def send_text_message(self, phone_number, text):
+        self.sent.append(("text", text, []))
+
+    def send_button_message(self, phone_number, body_text, buttons):
+        self.sent.append(("buttons", body_text, [button["id"] for button in buttons]))
+
+    def send_list_message(self, phone_number, body_text, button_text, sections):
+        self.sent.append(("list", body_text, [row["id"] for section in sections for row in section["rows"]]))
+
+    def send_template(self, phone_number, template):
+        payload = json.loads(template.render(phone_number))
+        assert payload["to"] == phone_number
+        if payload["type"] == "text":
+            self.send_text_message(phone_number, payload["text"]["body"])
+            return
+        interactive = payload["interactive"]
+        action = interactive["action"]
+        if interactive["type"] == "button":
+            self.send_button_message(phone_number, interactive["body"]["text"], [b["reply"] for b in action["buttons"]])
+        else:
+            self.send_list_message(phone_number, interactive["body"]["text"], action["button"], action["sections"])
+
+    @property
+    def last(self):
+        return self.sent[-1]
+
+
+class Conversation:
+    """Un cliente hablando con el ChatController"""
+
+    def __init__(self, controller: ChatController, phone_number: str = "5491100000000"):
+        self.controller = controller
+        self.phone_number = phone_number
+
+    def text(self, content: str):
+        return self.send("text", content)
+
+    def tap(self, choice: str):
+        return self.send("interactive", choice)
+
+    def send(self, message_type: str, content):
+        whatsapp = self.controller.whatsapp
+        start = len(whatsapp.sent)
+        handler = self.controller.process_message(self.phone_number, message_type, content)
+        self.replies = whatsapp.sent[start:]
+        return handler
+
+    @property
+    def state(self) -> str:
+        session = self.controller.get_user_state(self.phone_number)
+        return self.controller.flow.names[session.waiting_for]
+
+
+@pytest.fixture
+def catalog():
+    # Una base vacía se llena con los productos de ejemplo (SAMPLE_PRODUCTS)
+    catalog = Catalog(":memory:")
+    yield catalog
+    catalog.conn.close()
+
+
+@pytest.fixture
+def orders():
+    store = OrderStore(":memory:")
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def controller(catalog, orders):
+    return ChatController(FakeWhatsApp(), catalog, orders, BranchIndex([]))
+
+
+@pytest.fixture
+def chat(controller):
+    return Conversation(controller)
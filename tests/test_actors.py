@@ -0,0 +1,89 @@
+import asyncio
+from shared.actors import Mailboxes
+
+
+def test_one_key_runs_in_order_and_keys_run_in_parallel():
+    running = {}
+    overlap = []
+    handled = []
+
+    async def handle(item):
+        key, index = item
+        running[key] = running.get(key, 0) + 1
+        overlap.append((key, running[key], len([k for k, n in running.items() if n])))
+        await asyncio.sleep(0.01)
+        handled.append(item)
+        running[key] -= 1
+
+    async def scenario():
+        mailboxes = Mailboxes(handle, idle_timeout=1)
+        futures = [mailboxes.submit(key, (key, index)) for index in range(3) for key in ("a", "b")]
+        await asyncio.gather(*futures)
+        await mailboxes.stop()
+
+    asyncio.run(scenario())
+    assert [index for key, index in handled if key == "a"] == [0, 1, 2]
+    # Nunca dos mensajes del mismo cliente a la vez...
+    assert all(same == 1 for _, same, _ in overlap)
+    # ...pero sí de clientes distintos
+    assert max(active for _, _, active in overlap) == 2
+
+
+def test_errors_are_counted_and_the_box_keeps_going():
+    handled = []
+
+    async def handle(item):
+        if item == "boom":
+            raise RuntimeError(item)
+        handled.append(item)
+
+    async def scenario():
+        mailboxes = Mailboxes(handle, idle_timeout=1)
+        for item in ("ok1", "boom", "ok2"):
+            mailboxes.submit("a", item)
+        await mailboxes.stop()
+        return mailboxes
+
+    mailboxes = asyncio.run(scenario())
+    assert handled == ["ok1", "ok2"]
+    assert (mailboxes.processed, mailboxes.errors) == (3, 1)
+
+
+def test_idle_boxes_are_removed():
+    async def handle(item):
+        pass
+
+    async def scenario():
+        mailboxes = Mailboxes(handle, idle_timeout=0.01)
+        await mailboxes.submit("a", 1)
+        assert len(mailboxes) == 1
+        await asyncio.sleep(0.05)
+        assert len(mailboxes) == 0
+        # Un mensaje nuevo vuelve a crear el buzón
+        await mailboxes.submit("a", 2)
+        await mailboxes.stop()
+        return mailboxes.created
+
+    assert asyncio.run(scenario()) == 2
+
+
+def test_full_boxes_drop_and_closed_boxes_refuse():
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def handle(item):
+            await gate.wait()
+
+        mailboxes = Mailboxes(handle, idle_timeout=1, max_depth=2)
+        for index in range(5):
+            mailboxes.submit("a", index)
+        await asyncio.sleep(0)
+        gate.set()
+        await mailboxes.stop()
+        late = mailboxes.submit("a", 99)
+        return mailboxes, late
+
+    mailboxes, late = asyncio.run(scenario())
+    assert late.done()
+    # Entran los 2 primeros; los otros 3 y el que llega después de stop() se descartan
+    assert (mailboxes.processed, mailboxes.dropped) == (2, 4)
@@ -0,0 +1,37 @@
+from benchmarks.load_test import percentiles
+from benchmarks.payloads import KINDS, webhook_body
+from shared.webhook import decode_webhook, get_message_type, iter_events
+
+
+def test_generated_webhooks_decode_like_real_ones():
+    payload = decode_webhook(webhook_body(messages=50, statuses=10, entries=3, seed=1))
+    assert len(payload.entry) == 3
+    events = list(iter_events(payload))
+    assert sum(kind == "message" for kind, _, _ in events) == 50
+    assert sum(kind == "status" for kind, _, _ in events) == 10
+
+    for kind, _, item in events:
+        if kind == "message":
+            message_type, content = get_message_type(item)
+            assert content is not None, message_type
+
+
+def test_every_kind_can_be_generated_alone():
+    for kind in KINDS:
+        payload = decode_webhook(webhook_body(messages=1, kinds=(kind,)))
+        message = payload.entry[0].changes[0].value.messages[0]
+        assert get_message_type(message)[1] is not None
+
+
+def test_same_seed_same_senders():
+    first = decode_webhook(webhook_body(messages=5, seed=7))
+    second = decode_webhook(webhook_body(messages=5, seed=7))
+    senders = lambda payload: [m.from_ for m in payload.entry[0].changes[0].value.messages]
+    assert senders(first) == senders(second)
+
+
+def test_percentiles_in_milliseconds():
+    assert percentiles([]) == {"count": 0}
+    stats = percentiles([index / 1000 for index in range(1, 101)])
+    assert stats["count"] == 100
+    assert (stats["p50"], stats["p99"], stats["max"]) == (51.0, 100.0, 100.0)
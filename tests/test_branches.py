@@ -0,0 +1,65 @@
+import math
+import pytest
+from services.branches import SAMPLE_BRANCHES, BranchIndex
+from shared.webhook import Location
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6_371_000 * math.asin(math.sqrt(a))
+
+
+@pytest.fixture
+def index():
+    return BranchIndex(SAMPLE_BRANCHES)
+
+
+@pytest.mark.parametrize("lat, lon, delivery", [
+    (-34.905, -56.19, "centro"),
+    (-34.905, -56.15, "pocitos"),
+    (-34.880, -56.06, "carrasco"),
+    (-34.950, -56.10, None),
+])
+def test_delivery_zone(index, lat, lon, delivery):
+    match = index.locate(lat, lon)
+    assert (match.delivery.id if match.delivery else None) == delivery
+
+
+def test_nearest_matches_a_brute_force_haversine(index):
+    for lat, lon in [(-34.905, -56.19), (-34.95, -56.10), (-34.70, -55.90)]:
+        branch, distance = index.nearest(lat, lon)
+        expected = min(SAMPLE_BRANCHES, key=lambda b: haversine(lat, lon, b["lat"], b["lon"]))
+        assert branch.id == expected["id"]
+        assert distance == pytest.approx(haversine(lat, lon, expected["lat"], expected["lon"]), abs=1)
+
+
+def test_concave_zone_excludes_its_notch():
+    # Una "U": el hueco del medio no es parte de la zona
+    zone = [[0, 0], [0, 3], [3, 3], [3, 2], [1, 2], [1, 1], [3, 1], [3, 0]]
+    index = BranchIndex([{"id": "u", "name": "U", "lat": 0, "lon": 0, "zones": [zone]}], grid_degrees=1)
+    assert index.locate(0.5, 1.5).delivery.id == "u"
+    assert index.locate(2.5, 2.5).delivery.id == "u"
+    assert index.locate(2.0, 1.5).delivery is None
+
+
+def test_overlapping_zones_pick_the_closest_branch():
+    square = [[0, 0], [0, 1], [1, 1], [1, 0]]
+    index = BranchIndex([
+        {"id": "far", "name": "Lejos", "lat": 5, "lon": 5, "zones": [square]},
+        {"id": "near", "name": "Cerca", "lat": 0.5, "lon": 0.5, "zones": [square]},
+    ])
+    assert index.locate(0.4, 0.4).delivery.id == "near"
+
+
+def test_empty_index_and_missing_file(tmp_path):
+    assert BranchIndex([]).locate(0, 0) is None
+    assert len(BranchIndex.from_file(str(tmp_path / "nope.json"))) == len(SAMPLE_BRANCHES)
+
+
+def test_location_reply_in_the_conversation(chat, index):
+    chat.controller.branches = index
+    chat.send("location", Location(latitude=-34.905, longitude=-56.15))
+    assert "Sucursal Pocitos" in chat.replies[0][1]
+    chat.send("location", Location(latitude=-34.950, longitude=-56.10))
+    assert chat.replies[0][1].startswith("😕 Todavía no hacemos envíos a tu zona.")
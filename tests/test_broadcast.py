@@ -0,0 +1,143 @@
+import asyncio
+import json
+import pytest
+from services.broadcast import CLAIMED, FAILED, SENT, Broadcast, Checkpoint, load_recipients
+from services.whatsapp_service import GraphAPIError
+
+
+class FakeGraphAPI:
+    def __init__(self, fail_for=(), latency=0.0):
+        self.sent = []
+        self.fail_for = set(fail_for)
+        self.latency = latency
+
+    async def send_payload(self, payload):
+        if isinstance(payload, bytes):
+            payload = json.loads(payload)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if payload["to"] in self.fail_for:
+            raise GraphAPIError(400, code=131026, message="número sin WhatsApp")
+        self.sent.append((payload["to"], payload["text"]["body"]))
+        return {"messages": [{"id": "wamid.x"}]}
+
+
+def phones(count, start=0):
+    return [{"phone": f"5989{index:07d}", "nombre": f"Cliente {index}"} for index in range(start, start + count)]
+
+
+def make(tmp_path, rows, text="¡Hola {nombre}!", service=None, **options):
+    options.setdefault("rate_per_second", 10_000)
+    options.setdefault("concurrency", 4)
+    options.setdefault("batch_size", 5)
+    return Broadcast("promo", rows, text, service=service or FakeGraphAPI(), directory=str(tmp_path), **options)
+
+
+def test_sends_each_number_once_with_its_fields(tmp_path):
+    rows = phones(3) + [phones(1)[0], {"phone": ""}]
+    broadcast = make(tmp_path, rows)
+    summary = asyncio.run(broadcast.run())
+    assert sorted(broadcast.service.sent) == [(row["phone"], f"¡Hola {row['nombre']}!") for row in phones(3)]
+    assert summary["sent"] == 3
+    assert broadcast.invalid == 1
+
+
+def test_text_without_fields_is_sent_as_is(tmp_path):
+    broadcast = make(tmp_path, phones(2), text="2x1 en pizzas {{hoy}}")
+    asyncio.run(broadcast.run())
+    assert {body for _, body in broadcast.service.sent} == {"2x1 en pizzas {hoy}"}
+
+
+@pytest.mark.parametrize("text", ["Hola {nombre!x}", "Hola {nombre", "Hola {}", "Total {total:d}"])
+def test_invalid_text_fails_on_creation(tmp_path, text):
+    with pytest.raises(ValueError):
+        make(tmp_path, phones(1), text=text)
+
+
+def test_missing_field_fails_only_that_recipient(tmp_path):
+    rows = phones(2) + [{"phone": "59890000099"}]
+    broadcast = make(tmp_path, rows)
+    summary = asyncio.run(broadcast.run())
+    assert summary["sent"] == 2
+    assert summary["failed"] == 1
+    assert broadcast.checkpoint.states["59890000099"] == FAILED
+
+
+def test_unexpected_error_does_not_stop_the_workers(tmp_path, monkeypatch):
+    broadcast = make(tmp_path, phones(10), concurrency=2)
+    payload = broadcast._payload
+    broken = {phones(1, start=3)[0]["phone"], phones(1, start=7)[0]["phone"]}
+
+    def flaky_payload(phone_number):
+        if phone_number in broken:
+            raise TypeError("boom")
+        return payload(phone_number)
+
+    monkeypatch.setattr(broadcast, "_payload", flaky_payload)
+    summary = asyncio.run(asyncio.wait_for(broadcast.run(), 5))
+    assert summary["sent"] == 8
+    assert summary["failed"] == 2
+    assert summary["remaining"] == 0
+
+
+def test_resume_skips_sent_and_retries_failed(tmp_path):
+    rows = phones(6)
+    bad = rows[2]["phone"]
+    first = make(tmp_path, rows, service=FakeGraphAPI(fail_for={bad}))
+    asyncio.run(first.run())
+    assert first.sent == 5
+
+    second = make(tmp_path, rows)
+    summary = asyncio.run(second.run())
+    assert [to for to, _ in second.service.sent] == [bad]
+    assert summary["skipped"] == 5
+
+
+def test_interrupted_run_resumes_without_duplicates(tmp_path):
+    rows = phones(40)
+    service = FakeGraphAPI(latency=0.002)
+
+    async def interrupted():
+        broadcast = make(tmp_path, rows, service=service, concurrency=2)
+        task = asyncio.create_task(broadcast.run())
+        while len(service.sent) < 10:
+            await asyncio.sleep(0.001)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(interrupted())
+    first = [to for to, _ in service.sent]
+
+    second = make(tmp_path, rows)
+    summary = asyncio.run(second.run())
+    resent = [to for to, _ in second.service.sent]
+
+    assert not set(first) & set(resent)
+    # Los que se cortaron en pleno envío quedan "inciertos": no se reenvían solos
+    assert len(first) + len(resent) + summary["uncertain"] == 40
+    assert summary["uncertain"] <= 2
+
+    third = make(tmp_path, rows, resend_uncertain=True)
+    asyncio.run(third.run())
+    everyone = set(first) | set(resent) | {to for to, _ in third.service.sent}
+    assert everyone == {row["phone"] for row in rows}
+
+
+def test_checkpoint_ignores_a_torn_last_line(tmp_path):
+    path = tmp_path / "promo.log"
+    path.write_text(f"{CLAIMED}\t111\n{SENT}\t111\n{CLAIMED}\t222\n{SENT}\t2")
+    states = Checkpoint(str(path)).load()
+    assert states == {"111": SENT, "222": CLAIMED}
+
+
+def test_load_recipients_csv_and_plain(tmp_path):
+    csv_path = tmp_path / "clientes.csv"
+    csv_path.write_text("Telefono,Nombre\n+598 92 717 261,Ana\n123,Corto\n")
+    assert load_recipients(str(csv_path)) == [
+        {"telefono": "+598 92 717 261", "nombre": "Ana", "phone": "59892717261"},
+        {"telefono": "123", "nombre": "Corto", "phone": ""},
+    ]
+    plain = tmp_path / "numeros.txt"
+    plain.write_text("59892717261\n\n59892717262\n")
+    assert [row["phone"] for row in load_recipients(str(plain))] == ["59892717261", "59892717262"]
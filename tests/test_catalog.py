@@ -0,0 +1,92 @@
+import pytest
+from services.catalog import PAGE_SIZE, Catalog, Product
+from services.templates import CatalogTemplates
+
+
+def pizzas(count):
+    return [Product(f"pz_{index:02d}", f"Pizza {index:02d}", 400 + index, "Pizzas") for index in range(count)]
+
+
+def test_sample_products_are_indexed_by_id_and_category(catalog):
+    assert len(catalog) == 5
+    assert catalog.get("prod_1").name == "Pizza Napolitana"
+    assert catalog.get("nope") is None
+    assert catalog.categories == ("Bebidas", "Minutas", "Pizzas")
+    assert [p.id for p in catalog.by_category["Pizzas"]] == ["prod_5", "prod_1"]
+
+
+def test_pages(catalog):
+    catalog.upsert_products(pizzas(PAGE_SIZE * 2))
+    catalog.refresh_if_stale()
+    products, has_previous, has_next = catalog.page("Pizzas", 0)
+    assert len(products) == PAGE_SIZE and not has_previous and has_next
+    products, has_previous, has_next = catalog.page("Pizzas", 2)
+    assert len(products) == 2 and has_previous and not has_next
+    assert catalog.page("Nada", 0) == ((), False, False)
+
+
+def test_other_writers_are_seen_after_refresh(tmp_path):
+    path = str(tmp_path / "catalog.db")
+    reader = Catalog(path, refresh_seconds=0)
+    writer = Catalog(path)
+    writer.upsert_products([Product("prod_9", "Flan", 150, "Postres")])
+    writer.deactivate(["prod_3"])
+
+    assert reader.refresh_if_stale() is True
+    assert reader.get("prod_9").name == "Flan"
+    assert reader.get("prod_3") is None
+    assert reader.refresh_if_stale() is False
+    reader.close()
+    writer.close()
+
+
+def test_catalog_pages_follow_the_catalog_version(catalog):
+    catalog.refresh_seconds = 0
+    pages = CatalogTemplates(catalog)
+    first = pages.product_page("Pizzas", 0)
+    assert pages.product_page("Pizzas", 1) is None
+
+    catalog.upsert_products(pizzas(PAGE_SIZE + 1))
+    pages.refresh()
+    assert pages.product_page("Pizzas", 0) is not first
+    assert pages.product_page("Pizzas", 1) is not None
+    assert pages.category_page(5) is None
+
+
+def test_browsing_pages_in_the_conversation(chat, catalog):
+    catalog.upsert_products(pizzas(PAGE_SIZE))
+    catalog.refresh_seconds = 0
+    chat.text("/productos")
+    chat.tap("cat:Pizzas")
+    rows = chat.replies[-1][2]
+    assert len(rows) == PAGE_SIZE + 1
+    assert rows[-1] == "page:1:Pizzas"
+
+    chat.tap("page:1:Pizzas")
+    rows = chat.replies[-1][2]
+    assert rows[-1] == "page:0:Pizzas"
+    assert chat.state == "product"
+
+    # Un producto que ya no existe vuelve a la lista de categorías
+    catalog.deactivate(["pz_00"])
+    catalog.refresh_if_stale()
+    chat.tap("pz_00")
+    assert chat.replies[0][1] == "❌ Ese producto ya no está disponible."
+    assert chat.state == "category"
+
+
+@pytest.mark.parametrize("choice", ["cats:x", "cats:", "cat:Helados", None])
+def test_unknown_category_ids_get_an_answer(chat, choice):
+    chat.text("/productos")
+    chat.tap(choice)
+    assert chat.replies[0][1] == "❌ Esa categoría ya no está disponible."
+    assert chat.state == "category"
+
+
+@pytest.mark.parametrize("choice", ["page:3", "page:x:Pizzas", "nope", None])
+def test_unknown_product_ids_get_an_answer(chat, choice):
+    chat.text("/productos")
+    chat.tap("cat:Pizzas")
+    chat.tap(choice)
+    assert chat.replies[0][1] == "❌ Ese producto ya no está disponible."
+    assert chat.state == "category"
@@ -0,0 +1,105 @@
+def test_free_text_order_goes_to_the_cart(chat, orders):
+    assert chat.text("2 napolitanas sin tomate, una coca") == "handle_free_text"
+    kind, text, buttons = chat.replies[-1]
+    assert kind == "buttons"
+    assert "2 x Pizza Napolitana (sin tomate)" in text
+    assert "1 x Coca-Cola 1.5L" in text
+    assert buttons == ["confirmar_pedido", "vaciar_carrito", "ver_productos"]
+    assert chat.state == "cart"
+    assert orders.cart_total(chat.phone_number) == 2 * 450 + 120
+
+
+def test_order_confirm_then_free_text_again(chat, orders):
+    chat.text("2 napolitanas sin tomate")
+    assert chat.tap("confirmar_pedido") == "place_order"
+    assert "confirmado" in chat.replies[0][1]
+    assert chat.state == "menu"
+
+    # Desde el menú, un texto se entiende igual que en idle
+    assert chat.text("1 muzza") == "handle_free_text"
+    assert "1 x Pizza Muzzarella" in chat.replies[-1][1]
+    assert chat.state == "cart"
+    assert chat.text("carrito") == "show_cart"
+    assert chat.text("hola") == "show_welcome_menu"
+    assert chat.state == "menu"
+    assert len(orders.orders(chat.phone_number)) == 1
+
+
+def test_greeting_with_an_order_is_an_order(chat, orders):
+    assert chat.text("hola quiero 2 napolitanas") == "handle_free_text"
+    assert orders.cart(chat.phone_number)[0].quantity == 2
+
+
+def test_buttons_still_work_after_free_text_in_menu(chat):
+    chat.text("hola")
+    chat.text("no se que pedir")
+    assert chat.replies[0][1].startswith("❌ No entendí")
+    assert chat.tap("ver_productos") == "show_products_list"
+
+
+def test_unknown_button_in_menu_shows_the_menu_again(chat):
+    chat.text("hola")
+    assert chat.tap("algo_viejo") is None
+    assert chat.replies[0] == ("text", "❌ Por favor, selecciona una opción del menú.", [])
+    assert chat.state == "menu"
+
+
+def test_commands_escape_the_quantity_step(chat):
+    chat.text("hola")
+    chat.tap("ver_productos")
+    chat.tap("cat:Pizzas")
+    chat.tap("prod_1")
+    assert chat.state == "quantity"
+
+    chat.text("muchas")
+    assert chat.replies[0][1].startswith("❌ Cantidad inválida")
+    assert chat.state == "quantity"
+
+    assert chat.text("menu") == "show_welcome_menu"
+    assert chat.state == "menu"
+
+
+def test_cancel_returns_to_idle(chat, controller):
+    chat.text("hola")
+    chat.tap("ver_productos")
+    chat.tap("cat:Pizzas")
+    chat.tap("prod_1")
+    chat.text("2")
+    assert chat.state == "details"
+
+    assert chat.text("cancelar") == "cancel"
+    assert chat.state == "idle"
+    assert controller.get_user_state(chat.phone_number).data == {}
+
+
+def test_guided_order_still_works(chat, orders):
+    chat.text("/start")
+    chat.tap("ver_productos")
+    chat.tap("cat:Pizzas")
+    chat.tap("prod_5")
+    chat.text("3")
+    assert chat.text("bien cocida") == "handle_product_details"
+    item = orders.cart(chat.phone_number)[0]
+    assert (item.name, item.quantity, item.details) == ("Pizza Muzzarella", 3, "bien cocida")
+    assert chat.state == "menu"
+
+
+def test_search_after_the_first_interaction(chat):
+    chat.text("hola")
+    assert chat.text("muzza") == "handle_free_text"
+    kind, text, rows = chat.replies[-1]
+    assert kind == "list"
+    assert rows[0] == "prod_5"
+    assert chat.state == "product"
+
+    # Elegir un resultado sigue el camino de la lista de productos
+    chat.tap("prod_5")
+    assert chat.state == "quantity"
+
+
+def test_search_from_the_cart(chat):
+    chat.text("1 coca")
+    assert chat.state == "cart"
+    chat.text("milanesa")
+    assert chat.replies[-1][2][0] == "prod_4"
+    assert chat.state == "product"
@@ -0,0 +1,50 @@
+import time
+from shared.dedup import MessageDeduplicator, SQLiteDedupBackend
+
+
+def test_second_delivery_is_a_duplicate():
+    dedup = MessageDeduplicator(max_entries=10, ttl=60)
+    assert dedup.seen("wamid.1") is False
+    assert dedup.seen("wamid.1") is True
+    assert dedup.seen("wamid.2") is False
+    assert dedup.stats()["hits"] == 1
+    assert dedup.stats()["misses"] == 2
+
+
+def test_ids_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    dedup = MessageDeduplicator(max_entries=10, ttl=5)
+    dedup.seen("wamid.1")
+    now[0] += 6
+    assert dedup.seen("wamid.1") is False
+
+
+def test_memory_is_capped_oldest_first():
+    dedup = MessageDeduplicator(max_entries=3, ttl=60)
+    for index in range(5):
+        dedup.seen(f"wamid.{index}")
+    assert list(dedup.entries) == ["wamid.2", "wamid.3", "wamid.4"]
+    assert dedup.stats()["evictions"] == 2
+    # El más viejo ya no se recuerda: se procesaría de nuevo
+    assert dedup.seen("wamid.0") is False
+
+
+def test_shared_backend_across_processes(tmp_path):
+    path = str(tmp_path / "dedup.db")
+    first = MessageDeduplicator(max_entries=10, ttl=60, backend=SQLiteDedupBackend(path, 60))
+    second = MessageDeduplicator(max_entries=10, ttl=60, backend=SQLiteDedupBackend(path, 60))
+    assert first.seen("wamid.1") is False
+    # Otro worker no lo tiene en memoria pero sí en la base compartida
+    assert second.seen("wamid.1") is True
+    assert second.seen("wamid.2") is False
+    first.close()
+    second.close()
+
+
+def test_shared_backend_entries_expire(tmp_path):
+    backend = SQLiteDedupBackend(str(tmp_path / "dedup.db"), ttl=5)
+    assert backend.add("wamid.1", now=100.0) is False
+    assert backend.add("wamid.1", now=104.0) is True
+    assert backend.add("wamid.1", now=106.0) is False
+    backend.close()
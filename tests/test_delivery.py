@@ -0,0 +1,64 @@
+from services.delivery import DeliveryTracker
+from shared.webhook import Error, Status
+
+
+def status(message_id, state, at, errors=None):
+    return Status(id=message_id, status=state, timestamp=str(at), recipient_id="59892717261", errors=errors)
+
+
+def test_stage_latencies_and_rates_per_handler():
+    tracker = DeliveryTracker(capacity=10)
+    tracker.record_sent("w1", "show_cart", at=100)
+    tracker.record_sent("w2", "show_cart", at=100)
+    tracker.record_sent("w3", "show_cart", at=100)
+    tracker.on_status(status("w1", "sent", 101))
+    tracker.on_status(status("w1", "delivered", 102))
+    tracker.on_status(status("w1", "read", 110))
+    # Leído sin delivered: cuenta como entregado
+    tracker.on_status(status("w2", "read", 105))
+
+    cart = tracker.summary()["show_cart"]
+    assert (cart["tracked"], cart["pending"]) == (3, 1)
+    assert (cart["delivered_rate"], cart["read_rate"], cart["failed_rate"]) == (1.0, 1.0, 0.0)
+    assert cart["accepted_to_sent"] == {"count": 1, "p50": 1.0, "p95": 1.0}
+    assert cart["delivered_to_read"]["p50"] == 8.0
+
+
+def test_out_of_order_statuses_keep_the_first_of_each_stage():
+    tracker = DeliveryTracker(capacity=10)
+    tracker.record_sent("w1", "welcome", at=100)
+    tracker.on_status(status("w1", "delivered", 103))
+    tracker.on_status(status("w1", "delivered", 109))
+    assert tracker.summary()["welcome"]["accepted_to_delivered"]["p50"] == 3.0
+
+
+def test_failures_are_counted_by_error_code():
+    tracker = DeliveryTracker(capacity=10)
+    tracker.record_sent("w1", "welcome", at=100)
+    tracker.record_sent("w2", "welcome", at=100)
+    tracker.on_status(status("w1", "failed", 101, [Error(code=131047, title="Re-engagement message")]))
+    tracker.on_status(status("w2", "delivered", 101))
+
+    assert tracker.error_codes() == {131047: 1}
+    assert tracker.summary()["welcome"]["failed_rate"] == 0.5
+
+
+def test_ring_buffer_overwrites_the_oldest():
+    tracker = DeliveryTracker(capacity=2)
+    for message_id in ("w1", "w2", "w3"):
+        tracker.record_sent(message_id, "other", at=100)
+    assert set(tracker.slots) == {"w2", "w3"}
+    assert tracker.on_status(status("w1", "delivered", 101)) is False
+    assert tracker.on_status(status("w3", "delivered", 101)) is True
+
+    stats = tracker.stats()
+    assert (stats["tracked"], stats["live"], stats["statuses"], stats["unmatched"]) == (3, 2, 2, 1)
+
+
+def test_empty_ids_and_bad_timestamps():
+    tracker = DeliveryTracker(capacity=2)
+    tracker.record_sent("", "welcome")
+    assert tracker.stats()["tracked"] == 0
+    tracker.record_sent("w1", "")
+    assert tracker.on_status(status("w1", "delivered", "nope")) is True
+    assert tracker.summary()["other"]["delivered_rate"] == 1.0
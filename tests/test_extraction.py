@@ -0,0 +1,61 @@
+import pytest
+from services.catalog import Product
+from services.extraction import OrderExtractor, trigrams
+
+
+@pytest.fixture
+def extractor(catalog):
+    return OrderExtractor(catalog)
+
+
+def summary(items):
+    return [(item.product.id, item.quantity, item.details) for item in items]
+
+
+def test_trigrams_are_per_word_and_singular():
+    assert trigrams("pizzas") == [" pi", "piz", "izz", "zza", "za "]
+    assert set(trigrams("pizza napolitana")) == set(trigrams("napolitanas pizza"))
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("2 napolitanas", [("prod_1", 2, "")]),
+    ("dos napolitanas sin tomate", [("prod_1", 2, "sin tomate")]),
+    ("napolitana x3", [("prod_1", 3, "")]),
+    ("una coca", [("prod_3", 1, "")]),
+    ("quiero 1 milanesa con papas", [("prod_4", 1, "")]),
+    ("1 milanesa con papas sin sal", [("prod_4", 1, "sin sal")]),
+    ("2 muzza bien cocida y 1 hamburguesa", [("prod_5", 2, "bien cocida"), ("prod_2", 1, "")]),
+    ("hola quiero 2 napolitanas", [("prod_1", 2, "")]),
+    ("2 muzzas y 2x coca", [("prod_5", 2, ""), ("prod_3", 2, "")]),
+    ("2 muzzas y x3 cocas", [("prod_5", 2, ""), ("prod_3", 3, "")]),
+])
+def test_extracts_product_quantity_and_details(extractor, text, expected):
+    items, unmatched = extractor.extract(text)
+    assert summary(items) == expected
+    assert unmatched == []
+
+
+def test_segments_without_quantity_are_left_to_search(extractor):
+    assert extractor.extract("muzza") == ([], [])
+    assert extractor.extract("hola") == ([], [])
+
+
+def test_ambiguous_or_unknown_products_are_unmatched(extractor):
+    items, unmatched = extractor.extract("2 pizzas, 3 sushi")
+    assert items == []
+    assert unmatched == ["2 pizzas", "3 sushi"]
+
+
+def test_quantity_over_the_limit_is_unmatched(catalog):
+    extractor = OrderExtractor(catalog, max_quantity=10)
+    items, unmatched = extractor.extract("50 napolitanas")
+    assert items == []
+    assert unmatched == ["50 napolitanas"]
+
+
+def test_rebuilds_when_the_catalog_changes(catalog, extractor):
+    extractor.build()
+    catalog.upsert_products([Product("prod_9", "Empanada de Carne", 90, "Empanadas")])
+    catalog.refresh_seconds = 0
+    items, _ = extractor.extract("6 empanadas")
+    assert summary(items) == [("prod_9", 6, "")]
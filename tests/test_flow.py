@@ -0,0 +1,126 @@
+import pytest
+from shared.flow import Flow, IDLE, current_handler
+from shared.router import register_function
+
+
+class Bot:
+    """Objetivo mínimo para compilar flujos: anota qué se llamó"""
+
+    def __init__(self):
+        self.calls = []
+        self.replies = []
+
+    def reply(self, user, text):
+        self.replies.append(text)
+
+    @register_function("menu", "hola")
+    def show_menu(self, user):
+        self.calls.append(("show_menu", current_handler.get()))
+
+    @register_function("cancelar")
+    def cancel(self, user):
+        self.calls.append(("cancel",))
+
+    def pick(self, user):
+        self.calls.append(("pick",))
+
+    def quantity(self, user, message_type, content):
+        self.calls.append(("quantity", content))
+
+    def free_text(self, user, message_type, content):
+        self.calls.append(("free_text", content))
+
+
+def build(commands=True):
+    flow = Flow(commands=commands)
+    flow.state("idle", expects=("text",), fallback="free_text")
+    flow.state(
+        "menu",
+        expects=("interactive",),
+        choices={"pick": "pick"},
+        exit_to_idle=True,
+        invalid_reply="elegí una opción",
+        on_invalid="show_menu",
+    )
+    flow.state("quantity", handler="quantity", expects=("text",))
+    flow.state("closed", expects=("interactive",), commands=False, invalid_reply="cerrado")
+    bot = Bot()
+    return bot, flow.compile(bot, reply=bot.reply)
+
+
+def test_ids_follow_declaration_order():
+    _, compiled = build()
+    assert compiled.names == ("idle", "menu", "quantity", "closed")
+    assert compiled.id("idle") == IDLE
+    assert compiled.id("quantity") == 2
+
+
+def test_duplicate_state_is_rejected():
+    flow = Flow()
+    flow.state("menu")
+    with pytest.raises(ValueError):
+        flow.state("menu")
+
+
+def test_missing_method_fails_at_compile_time():
+    flow = Flow()
+    flow.state("menu", handler="does_not_exist")
+    with pytest.raises(ValueError):
+        flow.compile(Bot(), reply=print)
+
+
+def test_choices_and_handler_names():
+    bot, compiled = build()
+    assert compiled.dispatch(compiled.id("menu"), "interactive", "pick", "u") == "pick"
+    # El nombre del handler queda en current_handler mientras corre
+    assert compiled.dispatch(IDLE, "text", "hola", "u") == "show_menu"
+    assert bot.calls == [("pick",), ("show_menu", "show_menu")]
+    assert current_handler.get() == ""
+
+
+def test_commands_win_over_the_state_handler():
+    bot, compiled = build()
+    quantity = compiled.id("quantity")
+    assert compiled.dispatch(quantity, "text", "3", "u") == "quantity"
+    assert compiled.dispatch(quantity, "text", "cancelar", "u") == "cancel"
+    assert compiled.dispatch(quantity, "text", "Menú", "u") == "show_menu"
+    assert bot.calls[0] == ("quantity", "3")
+
+
+def test_commands_only_match_text_messages():
+    bot, compiled = build()
+    # Un botón con id "menu" no es el comando "menu"
+    assert compiled.dispatch(compiled.id("menu"), "interactive", "menu", "u") is None
+    assert bot.replies == ["elegí una opción"]
+    assert bot.calls == [("show_menu", "invalid")]
+
+
+def test_exit_to_idle_on_unexpected_text():
+    bot, compiled = build()
+    assert compiled.dispatch(compiled.id("menu"), "text", "2 napolitanas", "u") == "free_text"
+    assert bot.calls == [("free_text", "2 napolitanas")]
+    assert bot.replies == []
+
+
+def test_exit_to_idle_only_for_types_idle_accepts():
+    bot, compiled = build()
+    assert compiled.dispatch(compiled.id("menu"), "image", None, "u") is None
+    assert bot.replies == ["elegí una opción"]
+
+
+def test_states_can_opt_out_of_commands():
+    bot, compiled = build()
+    assert compiled.dispatch(compiled.id("closed"), "text", "menu", "u") is None
+    assert bot.replies == ["cerrado"]
+    assert bot.calls == []
+
+
+def test_commands_disabled_by_default():
+    bot, compiled = build(commands=False)
+    assert compiled.router is None
+    assert compiled.dispatch(IDLE, "text", "hola", "u") == "free_text"
+
+
+def test_handler_names_cover_commands():
+    _, compiled = build()
+    assert {"pick", "quantity", "free_text", "show_menu", "cancel"} <= compiled.handler_names()
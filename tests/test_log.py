@@ -0,0 +1,60 @@
+import json
+import logging
+import random
+from shared.log import JsonFormatter, SamplingFilter, get_logger, log_event, parse_sample_rates, setup_logging
+
+
+def record(event, level=logging.INFO, **fields):
+    record = logging.LogRecord("bot.webhook", level, __file__, 1, event, None, None)
+    record.fields = fields
+    return record
+
+
+def test_events_are_one_json_object_per_line():
+    line = JsonFormatter().format(record("message_received", sender="59892717261", duration_ms=1.5))
+    data = json.loads(line)
+    assert data["event"] == "message_received"
+    assert data["level"] == "INFO"
+    assert data["logger"] == "bot.webhook"
+    assert (data["sender"], data["duration_ms"]) == ("59892717261", 1.5)
+    assert "\n" not in line
+
+
+def test_parse_sample_rates():
+    assert parse_sample_rates("message_received=0.1, status_received=0.01") == {
+        "message_received": 0.1,
+        "status_received": 0.01,
+    }
+    assert parse_sample_rates("") == {}
+
+
+def test_sampling_never_drops_warnings(monkeypatch):
+    monkeypatch.setattr(random, "random", lambda: 0.5)
+    sampling = SamplingFilter({"status_received": 0.1})
+    assert sampling.filter(record("status_received")) is False
+    assert sampling.filter(record("status_received", logging.WARNING)) is True
+    assert sampling.filter(record("message_received")) is True
+
+
+def test_disabled_levels_are_skipped():
+    logger = get_logger("test_disabled")
+    logger.setLevel(logging.WARNING)
+    seen = []
+    logger.addHandler(logging.Handler())
+    logger.handlers[0].emit = seen.append
+    log_event(logger, logging.DEBUG, "nothing")
+    log_event(logger, logging.WARNING, "something", code=1)
+    assert [(r.msg, r.fields) for r in seen] == [("something", {"code": 1})]
+
+
+def test_listener_writes_json_to_stdout(capsys):
+    listener = setup_logging("INFO", "")
+    try:
+        log_event(get_logger("webhook"), logging.INFO, "webhook_processed", events=2)
+        log_event(get_logger("webhook"), logging.DEBUG, "too_verbose")
+    finally:
+        listener.stop()
+        logging.getLogger("bot").handlers = []
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line)["event"] for line in lines] == ["webhook_processed"]
+    assert json.loads(lines[0])["events"] == 2
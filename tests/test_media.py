@@ -0,0 +1,133 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+import httpx
+import pytest
+from services import media as media_module
+from services.media import MediaChecksumMismatch, MediaDownloader, MediaJob, MediaTooLarge
+from shared.config import GRAPH_API_BASE_URL
+from shared.webhook import Media
+
+AUDIO = b"OggS" + bytes(range(256)) * 64
+AUDIO_SHA = hashlib.sha256(AUDIO).hexdigest()
+
+
+def graph_api(content=AUDIO, sha256=AUDIO_SHA, file_size=None):
+    """Transport que contesta como la Graph API: primero la info del id, después el archivo"""
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(str(request.url))
+        if str(request.url).startswith(GRAPH_API_BASE_URL):
+            return httpx.Response(200, json={
+                "url": "https://lookaside.example/media/1",
+                "mime_type": "audio/ogg; codecs=opus",
+                "sha256": sha256,
+                "file_size": len(content) if file_size is None else file_size,
+            })
+        return httpx.Response(200, content=content)
+
+    return httpx.MockTransport(handler), calls
+
+
+def job(media_id="m1", sha256=""):
+    return MediaJob("59892717261", f"wamid.{media_id}", "audio", Media(id=media_id, mime_type="audio/ogg", sha256=sha256))
+
+
+def run(tmp_path, transport, scenario, **options):
+    async def main():
+        async with httpx.AsyncClient(transport=transport) as client:
+            downloader = MediaDownloader(client, directory=str(tmp_path), chunk_size=1024, **options)
+            return await scenario(downloader)
+
+    return asyncio.run(main())
+
+
+def index_lines(tmp_path):
+    with open(tmp_path / "index.jsonl", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_downloads_by_sha256_and_records_it(tmp_path):
+    transport, _ = graph_api()
+
+    async def scenario(downloader):
+        return await downloader.download(job()), downloader.stats()
+
+    path, stats = run(tmp_path, transport, scenario)
+    assert path == os.path.join(str(tmp_path), AUDIO_SHA[:2], AUDIO_SHA + ".ogg")
+    with open(path, "rb") as f:
+        assert f.read() == AUDIO
+    assert stats["downloaded"] == 1
+    assert stats["bytes"] == len(AUDIO)
+    [line] = index_lines(tmp_path)
+    assert line["sender"] == "59892717261"
+    assert line["path"] == os.path.join(AUDIO_SHA[:2], AUDIO_SHA + ".ogg")
+    assert os.listdir(tmp_path / "tmp") == []
+
+
+def test_known_sha256_is_not_downloaded_again(tmp_path):
+    transport, calls = graph_api()
+
+    async def scenario(downloader):
+        await downloader.download(job("m1"))
+        await downloader.download(job("m2", sha256=AUDIO_SHA))
+        return downloader.stats()
+
+    stats = run(tmp_path, transport, scenario)
+    assert len(calls) == 2
+    assert stats["cached"] == 1
+    assert len(index_lines(tmp_path)) == 2
+
+
+def test_checksum_mismatch_leaves_nothing_behind(tmp_path):
+    transport, _ = graph_api(sha256="0" * 64)
+
+    async def scenario(downloader):
+        with pytest.raises(MediaChecksumMismatch):
+            await downloader.download(job())
+
+    run(tmp_path, transport, scenario)
+    assert sorted(os.listdir(tmp_path)) == ["tmp"]
+    assert os.listdir(tmp_path / "tmp") == []
+
+
+def test_too_large(tmp_path):
+    # Declarado chico pero más grande al bajarlo: se corta mientras se lee
+    transport, _ = graph_api(file_size=10)
+
+    async def scenario(downloader):
+        with pytest.raises(MediaTooLarge):
+            await downloader.download(job())
+
+    run(tmp_path, transport, scenario, max_bytes=1000)
+    assert os.listdir(tmp_path / "tmp") == []
+
+
+def test_disk_writes_do_not_block_the_event_loop(tmp_path, monkeypatch):
+    transport, _ = graph_api()
+    append = media_module._append
+
+    def slow_append(path, line):
+        time.sleep(0.2)
+        append(path, line)
+
+    monkeypatch.setattr(media_module, "_append", slow_append)
+
+    async def scenario(downloader):
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await downloader.download(job())
+        task.cancel()
+        return ticks
+
+    assert run(tmp_path, transport, scenario) >= 10
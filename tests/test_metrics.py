@@ -0,0 +1,69 @@
+from fastapi.testclient import TestClient
+import main
+from shared.metrics import Registry
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = registry.histogram("latency_seconds", "Latencia", buckets=(0.1, 0.01))
+    for value in (0.005, 0.01, 0.05, 3):
+        histogram.observe(value)
+
+    lines = histogram.render()
+    assert lines[:3] == [
+        'latency_seconds_bucket{le="0.01"} 2',
+        'latency_seconds_bucket{le="0.1"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+    ]
+    assert lines[3] == "latency_seconds_sum 3.065"
+    assert lines[4] == "latency_seconds_count 4"
+
+
+def test_labelled_series_are_created_on_first_use():
+    registry = Registry()
+    histogram = registry.histogram("handler_seconds", "Por handler", buckets=(1.0,), labelnames=("handler",))
+    assert histogram.render() == []
+    histogram.observe(0.5, "show_cart")
+    assert 'handler_seconds_bucket{handler="show_cart",le="1.0"} 1' in histogram.render()
+    assert histogram.labels("show_cart") is histogram.labels("show_cart")
+
+
+def test_counters_gauges_and_escaping():
+    registry = Registry()
+    counter = registry.counter("responses_total", "Respuestas", labelnames=("code",))
+    counter.inc("200")
+    counter.inc("200", amount=2)
+    counter.inc('a"b')
+    gauge = registry.gauge("startup_seconds", "Arranque")
+    gauge.set(0.25)
+
+    assert counter.render() == ['responses_total{code="200"} 3', 'responses_total{code="a\\"b"} 1']
+    assert gauge.render() == ["startup_seconds 0.25"]
+
+
+def test_gauge_funcs_are_read_on_render():
+    registry = Registry()
+    depth = [0]
+    registry.gauge_func("queue_depth", "Profundidad", lambda: depth[0])
+    registry.gauge_func("sessions", "Sesiones por estado", lambda: {"idle": 2, "cart": 1}, labelnames=("state",))
+    depth[0] = 7
+
+    text = registry.render()
+    assert "# HELP queue_depth Profundidad\n# TYPE queue_depth gauge\nqueue_depth 7\n" in text
+    assert 'sessions{state="idle"} 2' in text
+    assert text.endswith("\n")
+
+
+def test_registering_again_replaces_the_metric():
+    registry = Registry()
+    registry.counter("x_total", "Primera")
+    registry.counter("x_total", "Segunda")
+    assert registry.render().count("# HELP x_total") == 1
+    assert "Segunda" in registry.render()
+
+
+def test_metrics_endpoint_serves_the_registry():
+    response = TestClient(main.app).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE bot_webhook_seconds histogram" in response.text
@@ -0,0 +1,217 @@
+import asyncio
+import json
+import time
+from services.outbound_queue import CircuitBreaker, OutboundQueue, SendRate
+from services.whatsapp_service import GraphAPIError
+
+
+class FakeGraphAPI:
+    """Hace de AsyncWhatsAppService: anota (número, texto, momento) y puede fallar"""
+
+    def __init__(self, failures=()):
+        self.sent = []
+        self.failures = list(failures)
+
+    async def send_payload(self, payload):
+        if isinstance(payload, bytes):
+            payload = json.loads(payload)
+        if self.failures:
+            raise self.failures.pop(0)
+        self.sent.append((payload["to"], payload["text"]["body"], time.monotonic()))
+        return {"messages": [{"id": f"wamid.{len(self.sent)}"}]}
+
+
+def make_queue(api, **options):
+    options.setdefault("workers", 1)
+    options.setdefault("rate_per_second", 1000)
+    options.setdefault("burst", 1000)
+    options.setdefault("recipient_interval", 0.0)
+    options.setdefault("backoff_base", 0.001)
+    options.setdefault("backoff_max", 0.01)
+    options.setdefault("breaker", CircuitBreaker(threshold=5, cooldown=0.05))
+    return OutboundQueue(api, **options)
+
+
+def run(scenario):
+    return asyncio.run(scenario())
+
+
+def test_messages_to_one_recipient_keep_their_order():
+    async def scenario():
+        api = FakeGraphAPI()
+        queue = make_queue(api, workers=4)
+        await queue.start()
+        for index in range(20):
+            queue.send_text_message(str(index % 3), str(index))
+        await queue.stop()
+        return api.sent
+
+    sent = run(scenario)
+    assert len(sent) == 20
+    for phone in "012":
+        bodies = [int(body) for to, body, _ in sent if to == phone]
+        assert bodies == sorted(bodies)
+
+
+def test_pacing_one_recipient_does_not_stall_the_others():
+    async def scenario():
+        api = FakeGraphAPI()
+        queue = make_queue(api, recipient_interval=0.2)
+        await queue.start()
+        queue.send_text_message("1", "a1")
+        queue.send_text_message("1", "a2")
+        queue.send_text_message("1", "a3")
+        queue.send_text_message("2", "b1")
+        queue.send_text_message("2", "b2")
+        await asyncio.sleep(0.05)
+        # Con un solo worker: b1 ya salió aunque a2 espera su intervalo
+        early = [body for _, body, _ in api.sent]
+        await queue.stop()
+        return early, api.sent, queue
+
+    early, sent, queue = run(scenario)
+    assert early == ["a1", "b1"]
+    assert [body for to, body, _ in sent if to == "1"] == ["a1", "a2", "a3"]
+    times = [at for to, _, at in sent if to == "1"]
+    assert all(later - earlier >= 0.19 for earlier, later in zip(times, times[1:]))
+    assert queue.held == {}
+    assert queue.depth() == 0
+
+
+def test_stop_waits_for_held_messages():
+    async def scenario():
+        api = FakeGraphAPI()
+        queue = make_queue(api, recipient_interval=0.1)
+        await queue.start()
+        queue.send_text_message("1", "a1")
+        queue.send_text_message("1", "a2")
+        await asyncio.sleep(0.01)
+        assert queue.depth() == 1
+        await queue.stop()
+        return api.sent
+
+    assert [body for _, body, _ in run(scenario)] == ["a1", "a2"]
+
+
+def test_transient_errors_are_retried():
+    async def scenario():
+        api = FakeGraphAPI([GraphAPIError(503), GraphAPIError(429, retry_after=0.001)])
+        queue = make_queue(api)
+        await queue.start()
+        queue.send_text_message("1", "hola")
+        await queue.stop()
+        return api.sent, queue.stats()
+
+    sent, stats = run(scenario)
+    assert [body for _, body, _ in sent] == ["hola"]
+    assert stats["retried"] == 2
+    assert stats["sent"] == 1
+    assert stats["failed"] == 0
+
+
+def test_retrying_one_recipient_does_not_stall_its_worker():
+    class FailingFor(FakeGraphAPI):
+        async def send_payload(self, payload):
+            payload = json.loads(payload) if isinstance(payload, bytes) else payload
+            if payload["to"] == "1":
+                # Retry-After fijo: sin jitter, "1" sigue esperando a los 50 ms
+                raise GraphAPIError(503, retry_after=0.2)
+            return await super().send_payload(payload)
+
+    async def scenario():
+        api = FailingFor()
+        # Un solo worker para los dos números; el breaker no se abre
+        queue = make_queue(
+            api, max_attempts=3, backoff_base=0.2, backoff_max=0.2,
+            breaker=CircuitBreaker(threshold=100, cooldown=0.05),
+        )
+        await queue.start()
+        queue.send_text_message("1", "a1")
+        queue.send_text_message("1", "a2")
+        queue.send_text_message("2", "b1")
+        queue.send_text_message("2", "b2")
+        await asyncio.sleep(0.05)
+        # Los de "2" salen mientras "1" espera su reintento
+        early = [body for _, body, _ in api.sent]
+        assert queue.depth() == 2
+        await queue.stop()
+        return early, queue.stats()
+
+    early, stats = run(scenario)
+    assert early == ["b1", "b2"]
+    # Cada mensaje de "1" se intentó 3 veces, en orden, y falló
+    assert (stats["failed"], stats["retried"], stats["sent"]) == (2, 4, 2)
+    assert stats["paced_recipients"] == 0
+
+
+def test_permanent_errors_are_not_retried():
+    async def scenario():
+        api = FakeGraphAPI([GraphAPIError(400, code=131030)])
+        queue = make_queue(api)
+        await queue.start()
+        queue.send_text_message("1", "hola")
+        await queue.stop()
+        return api.sent, queue.stats()
+
+    sent, stats = run(scenario)
+    assert sent == []
+    assert stats["failed"] == 1
+    assert stats["retried"] == 0
+
+
+def test_full_queue_drops():
+    async def scenario():
+        queue = make_queue(FakeGraphAPI(), max_size=2)
+        return [queue.enqueue("1", {"to": "1"}) for _ in range(3)], queue.dropped
+
+    accepted, dropped = run(scenario)
+    assert accepted == [True, True, False]
+    assert dropped == 1
+
+
+def test_send_rate_memory_is_fixed():
+    rate = SendRate(60)
+    for _ in range(10_000):
+        rate.add()
+    assert len(rate.counts) == 60
+    assert rate.per_second() == 10_000 / 60
+
+
+def test_breaker_opens_after_threshold_and_closes_on_success():
+    async def scenario():
+        breaker = CircuitBreaker(threshold=2, cooldown=0.02)
+        breaker.failure()
+        assert breaker.state == breaker.CLOSED
+        breaker.failure()
+        assert breaker.state == breaker.OPEN
+        started = time.monotonic()
+        await breaker.wait()
+        assert time.monotonic() - started >= 0.015
+        assert breaker.state == breaker.HALF_OPEN
+        breaker.success()
+        assert breaker.state == breaker.CLOSED
+        assert breaker.trips == 1
+
+    run(scenario)
+
+
+def test_cancelled_probe_reopens_the_breaker():
+    class Hanging(FakeGraphAPI):
+        async def send_payload(self, payload):
+            await asyncio.Event().wait()
+
+    async def scenario():
+        breaker = CircuitBreaker(threshold=1, cooldown=0.01)
+        breaker.failure()
+        queue = make_queue(Hanging(), breaker=breaker)
+        await queue.start()
+        queue.send_text_message("1", "hola")
+        await asyncio.sleep(0.05)
+        # El envío es la prueba y quedó colgado
+        assert breaker.state == breaker.HALF_OPEN
+        await queue.stop(timeout=0.01)
+        assert breaker.state == breaker.OPEN
+        # Pasado el cooldown, otro envío puede ser la prueba
+        assert await asyncio.wait_for(breaker.wait(), 1) is True
+
+    run(scenario)
@@ -0,0 +1,112 @@
+import asyncio
+import os
+from services.outbox import OutboxJournal
+from tests.test_outbound_queue import FakeGraphAPI, make_queue
+
+
+def journal_at(tmp_path, **kwargs):
+    return OutboxJournal(str(tmp_path / "outbox" / "journal.log"), commit_interval=0, **kwargs)
+
+
+def test_unfinished_sends_are_recovered_in_order(tmp_path):
+    async def scenario():
+        journal = journal_at(tmp_path)
+        await journal.start()
+        first = journal.append("111", "welcome", b'{"a":1}')
+        second = journal.append("222", "show_cart", b'{"b":2}')
+        third = journal.append("111", "welcome", b'{"c":3}')
+        await journal.committed(third)
+        journal.done(second)
+        journal.done(third, failed=True)
+        await journal.stop()
+        return first
+
+    first = asyncio.run(scenario())
+    recovered = journal_at(tmp_path)
+    assert recovered.recover() == [(first, "111", "welcome", b'{"a":1}')]
+    # Los seq siguen después de los que ya se usaron
+    assert recovered.append("333", "other", b"{}") == 4
+    recovered.file.close()
+
+
+def test_torn_tail_is_dropped(tmp_path):
+    async def scenario():
+        journal = journal_at(tmp_path)
+        await journal.start()
+        seq = journal.append("111", "welcome", b"{}")
+        await journal.committed(seq)
+        await journal.stop()
+
+    asyncio.run(scenario())
+    path = str(tmp_path / "outbox" / "journal.log")
+    with open(path, "ab") as f:
+        f.write(b"\x00\x00\x00\x30\x12")  # un registro a medio escribir
+
+    journal = journal_at(tmp_path)
+    assert [entry[1] for entry in journal.recover()] == ["111"]
+    # Se compacta: el archivo queda solo con lo válido
+    assert os.path.getsize(path) == journal.size
+    journal.file.close()
+
+
+def test_sends_wait_for_the_group_commit(tmp_path):
+    async def scenario():
+        journal = journal_at(tmp_path)
+        await journal.start()
+        seqs = [journal.append("111", "welcome", b"{}") for _ in range(20)]
+        assert journal.committed_seq == 0
+        await asyncio.gather(*(journal.committed(seq) for seq in seqs))
+        stats = journal.stats()
+        await journal.stop()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert stats["pending"] == 20
+    # Todos los SEND entraron en un solo fsync
+    assert stats["commits"] == 1
+
+
+def test_compaction_keeps_only_pending(tmp_path):
+    async def scenario():
+        journal = journal_at(tmp_path, compact_bytes=256)
+        await journal.start()
+        for _ in range(30):
+            seq = journal.append("111", "welcome", b"x" * 40)
+            await journal.committed(seq)
+            journal.done(seq)
+        keep = journal.append("222", "welcome", b"{}")
+        await journal.committed(keep)
+        await journal.stop()
+        return journal.size, keep
+
+    size, keep = asyncio.run(scenario())
+    assert size < 30 * 40
+    journal = journal_at(tmp_path)
+    assert [entry[0] for entry in journal.recover()] == [keep]
+    journal.file.close()
+
+
+def test_queue_replays_what_a_crash_left_unsent(tmp_path):
+    async def crash():
+        # Se anota y se baja a disco, pero el proceso "muere" antes de enviar
+        journal = journal_at(tmp_path)
+        await journal.start()
+        queue = make_queue(FakeGraphAPI(), journal=journal)
+        queue.send_text_message("111", "¿sigue ahí?")
+        await journal.commit()
+        journal.task.cancel()
+        journal.file.close()
+
+    async def restart():
+        api = FakeGraphAPI()
+        journal = journal_at(tmp_path)
+        queue = make_queue(api, journal=journal)
+        await queue.start()
+        await queue.stop()
+        return api.sent, queue.replayed, journal.stats()["pending"]
+
+    asyncio.run(crash())
+    sent, replayed, pending = asyncio.run(restart())
+    assert [(to, body) for to, body, _ in sent] == [("111", "¿sigue ahí?")]
+    assert replayed == 1
+    assert pending == 0
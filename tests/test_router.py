@@ -0,0 +1,81 @@
+import pytest
+from shared.router import CommandRouter, normalize
+
+
+def start():
+    pass
+
+
+def cart():
+    pass
+
+
+def catalog():
+    pass
+
+
+@pytest.fixture
+def router():
+    return (
+        CommandRouter()
+        .add(start, "/start", "hola", "menú", "inicio")
+        .add(cart, "/carrito", "carrito", "mi carrito")
+        .add(catalog, "carta", "ver productos")
+        .compile()
+    )
+
+
+def test_normalize():
+    assert normalize("¡Menú!") == "menu"
+    assert normalize("  /Inicio   YA ") == "inicio ya"
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("hola", start),
+    ("/start", start),
+    ("¡Hola!", start),
+    ("MENU", start),
+    ("mi carrito", cart),
+    ("Ver productos", catalog),
+])
+def test_exact_aliases(router, text, expected):
+    assert router.match(text) is expected
+
+
+def test_unambiguous_prefix(router):
+    assert router.match("carr") is cart
+    # "car" es prefijo de "carrito" y de "carta"
+    assert router.match("car") is None
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("holaa", start),
+    ("carito", cart),
+    ("mi carritoo", cart),
+])
+def test_typos(router, text, expected):
+    assert router.match(text) is expected
+
+
+@pytest.mark.parametrize("text", [
+    "hola quiero 2 napolitanas",
+    "menu del dia",
+    "carrito de compras lleno",
+    "2 napolitanas",
+    "no",
+    "",
+])
+def test_only_whole_message_is_a_command(router, text):
+    assert router.match(text) is None
+
+
+def test_cache_keeps_misses(router):
+    assert router.match("muzza") is None
+    assert "muzza" in router.cache
+    assert router.match("muzza") is None
+
+
+def test_duplicate_alias_is_rejected():
+    router = CommandRouter().add(start, "hola")
+    with pytest.raises(ValueError):
+        router.add(cart, "Hola")
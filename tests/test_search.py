@@ -0,0 +1,56 @@
+import pytest
+from services.catalog import Product
+from services.search import ProductSearch
+
+
+@pytest.fixture
+def search(catalog):
+    catalog.refresh_seconds = 0
+    index = ProductSearch(catalog)
+    index.refresh()
+    return index
+
+
+def names(results):
+    return [product.name for product, _ in results]
+
+
+@pytest.mark.parametrize("query, first", [
+    ("muzza", "Pizza Muzzarella"),
+    ("napolitana", "Pizza Napolitana"),
+    ("milanesa", "Milanesa con Papas"),
+    ("hamburgesa", "Hamburguesa Completa"),
+    ("COCA", "Coca-Cola 1.5L"),
+])
+def test_typos_and_partial_words(search, query, first):
+    assert names(search.search(query))[0] == first
+
+
+def test_best_score_first(search):
+    results = search.search("pizza")
+    assert set(names(results)[:2]) == {"Pizza Napolitana", "Pizza Muzzarella"}
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_nothing_below_min_score(search):
+    assert search.search("sushi") == []
+    assert search.search("") == []
+
+
+def test_limit(search):
+    assert len(search.search("pizza", limit=1)) == 1
+
+
+def test_incremental_update(catalog, search):
+    catalog.upsert_products([
+        Product("prod_9", "Empanada de Carne", 90, "Empanadas"),
+        Product("prod_5", "Pizza Fugazzeta", 400, "Pizzas"),
+    ])
+    assert names(search.search("empanada"))[0] == "Empanada de Carne"
+    # Renombrado: el nombre viejo ya no aparece
+    assert "Pizza Muzzarella" not in names(search.search("muzzarella"))
+    assert names(search.search("fugazzeta"))[0] == "Pizza Fugazzeta"
+    assert search.stats()["builds"] == 1
+    assert search.stats()["updates"] == 1
+    assert len(search) == 6
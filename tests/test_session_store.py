@@ -0,0 +1,46 @@
+from shared.flow import IDLE
+from shared.session_store import MemorySessionStore
+
+
+def test_new_sessions_start_idle_and_are_reused():
+    store = MemorySessionStore(max_entries=10, max_bytes=1 << 20)
+    session = store.get("1")
+    assert session.waiting_for == IDLE
+    assert session.data == {}
+    session.data["quantity"] = 2
+    assert store.get("1") is session
+    assert store.stats()["created"] == 1
+
+
+def test_least_recently_used_is_evicted_first():
+    store = MemorySessionStore(max_entries=2, max_bytes=1 << 20)
+    store.get("1")
+    store.get("2")
+    store.get("1")
+    store.get("3")
+    assert list(store.sessions) == ["1", "3"]
+    assert store.stats()["evicted"] == 1
+
+    store.get("2")
+    assert store.stats()["recreated"] == 1
+
+
+def test_byte_cap_counts_session_data():
+    store = MemorySessionStore(max_entries=100, max_bytes=4000)
+    for phone in "123":
+        store.get(phone).data["details"] = "x" * 1000
+    # El tamaño se recalcula al volver a leer la sesión
+    for phone in "123":
+        store.get(phone)
+    assert store.total_bytes <= 4000
+    assert len(store) < 3
+    # La sesión que se está usando nunca se desaloja
+    assert "3" in store.sessions
+
+
+def test_discard_releases_bytes():
+    store = MemorySessionStore(max_entries=10, max_bytes=1 << 20)
+    store.get("1")
+    store.discard("1")
+    assert len(store) == 0
+    assert store.total_bytes == 0
@@ -0,0 +1,106 @@
+import asyncio
+import hashlib
+import hmac
+import pytest
+from fastapi.testclient import TestClient
+import main
+from shared.signature import SignatureError, parse_signature, read_signed_body
+
+SECRET = b"app-secret"
+BODY = b'{"object":"whatsapp_business_account","entry":[]}'
+
+
+def sign(body: bytes, secret: bytes = SECRET) -> str:
+    return "sha256=" + hmac.new(secret, body, hashlib.sha256).hexdigest()
+
+
+def read(chunks, signature, secret=SECRET, max_bytes=1024, declared_size=None, allow_unsigned=False):
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+
+    return asyncio.run(read_signed_body(stream(), signature, secret, max_bytes, declared_size, allow_unsigned))
+
+
+def reason(*args, **kwargs) -> str:
+    with pytest.raises(SignatureError) as error:
+        read(*args, **kwargs)
+    return error.value.reason
+
+
+def test_valid_signature_returns_the_same_bytes():
+    body = read([BODY], sign(BODY))
+    assert body is BODY
+
+
+def test_chunked_body_is_verified_as_a_whole():
+    chunks = [BODY[:10], b"", BODY[10:30], BODY[30:]]
+    assert read(chunks, sign(BODY)) == BODY
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, "missing"),
+    ("", "missing"),
+    ("sha1=abcd", "malformed"),
+    ("sha256=zz", "malformed"),
+    ("sha256=abcd", "malformed"),
+])
+def test_bad_headers_are_rejected_before_reading(header, expected):
+    def never():
+        raise AssertionError("no se debía leer el body")
+        yield
+
+    assert reason(never(), header) == expected
+
+
+def test_tampered_body_is_rejected():
+    assert reason([BODY + b" "], sign(BODY)) == "mismatch"
+    assert reason([BODY], sign(BODY, b"otro-secret")) == "mismatch"
+
+
+def test_size_limits():
+    assert reason([BODY], sign(BODY), max_bytes=10, declared_size=len(BODY)) == "too_large"
+    # Sin Content-Length (chunked) se corta al pasarse mientras se lee
+    assert reason([BODY[:8], BODY[8:]], sign(BODY), max_bytes=10) == "too_large"
+
+
+def test_missing_secret_fails_closed():
+    assert reason([BODY], sign(BODY), secret=b"") == "no_secret"
+    assert read([BODY], None, secret=b"", allow_unsigned=True) == BODY
+
+
+def test_parse_signature():
+    assert parse_signature(sign(BODY)) == hmac.new(SECRET, BODY, hashlib.sha256).digest()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "SECRET", SECRET)
+    monkeypatch.setattr(main, "WEBHOOK_ALLOW_UNSIGNED", False)
+    # Sin `with`: no corre el lifespan, alcanza para probar los rechazos
+    return TestClient(main.app)
+
+
+def test_webhook_rejects_unsigned_posts(client):
+    response = client.post("/whatsapp", content=BODY)
+    assert response.status_code == 403
+    response = client.post("/whatsapp", content=BODY, headers={"x-hub-signature-256": sign(BODY, b"x")})
+    assert response.status_code == 403
+
+
+def test_webhook_without_secret_rejects_even_signed_posts(client, monkeypatch):
+    monkeypatch.setattr(main, "SECRET", b"")
+    response = client.post("/whatsapp", content=BODY, headers={"x-hub-signature-256": sign(BODY)})
+    assert response.status_code == 403
+
+
+def test_webhook_rejects_oversized_posts(client, monkeypatch):
+    monkeypatch.setattr(main, "WEBHOOK_MAX_BYTES", 10)
+    response = client.post("/whatsapp", content=BODY, headers={"x-hub-signature-256": sign(BODY)})
+    assert response.status_code == 413
+
+
+def test_webhook_accepts_signed_posts(client):
+    response = client.post("/whatsapp", content=BODY, headers={"x-hub-signature-256": sign(BODY)})
+    assert response.status_code == 200
+    assert response.json() == "EVENT_RECEIVED"
@@ -0,0 +1,73 @@
+import asyncio
+import logging
+import subprocess
+import sys
+import pytest
+from fastapi.testclient import TestClient
+import main
+from services.whatsapp_service import AsyncWhatsAppService
+from shared.metrics import STARTUP_SECONDS
+
+# Cualquier request HTTP revienta: importar no tiene que tocar la red
+NO_NETWORK = """
+import httpx
+
+def refuse(*args, **kwargs):
+    raise SystemExit("request HTTP al importar")
+
+httpx.Client.send = refuse
+httpx.AsyncClient.send = refuse
+import main
+import controllers.chat_controller
+assert not hasattr(main.app.state, "whatsapp")
+"""
+
+
+def test_importing_main_has_no_side_effects(tmp_path):
+    result = subprocess.run(
+        [sys.executable, "-c", NO_NETWORK],
+        cwd=tmp_path, env={"PYTHONPATH": main.__file__.rsplit("/", 1)[0]},
+        capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    # Tampoco crea archivos (catálogo, pedidos, journal)
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.fixture
+def gated_prewarm(tmp_path, monkeypatch):
+    """El pre-warm HTTP espera a que el test abra la compuerta"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, "PREWARM", True)
+    monkeypatch.setattr(main, "SECRET", b"secret")
+    gate = {}
+
+    async def warm(self, timeout):
+        gate["event"] = asyncio.Event()
+        await gate["event"].wait()
+
+    monkeypatch.setattr(AsyncWhatsAppService, "warm", warm)
+    yield gate
+    logging.getLogger("bot").handlers = []
+
+
+def test_ready_only_after_prewarm(gated_prewarm):
+    with TestClient(main.app) as client:
+        assert client.get("/ready").status_code == 503
+        # El resto de la app ya atiende mientras tanto
+        assert client.get("/metrics").status_code == 200
+
+        client.portal.call(gated_prewarm["event"].set)
+        for _ in range(100):
+            if client.get("/ready").status_code == 200:
+                break
+            client.portal.call(asyncio.sleep, 0.01)
+        assert client.get("/ready").json() == {"ready": True}
+
+        # Las páginas del catálogo quedaron armadas en el pre-warm
+        assert main.app.state.controller.catalog_pages.version is not None
+        metrics = client.get("/metrics").text
+    assert 'bot_startup_seconds{phase="prewarm"}' in metrics
+    assert 'bot_startup_seconds{phase="lifespan"}' in metrics
+    assert "bot_ready 1" in metrics
+    assert STARTUP_SECONDS.labels("total")[0] > 0
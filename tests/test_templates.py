@@ -0,0 +1,55 @@
+import json
+from services.templates import (
+    CATEGORY_PAGE_SIZE,
+    CatalogTemplates,
+    TextTemplates,
+    button_template,
+    list_row,
+    text_template,
+)
+from services.whatsapp_service import build_button_payload, build_text_payload
+
+
+def test_rendered_template_equals_the_built_payload():
+    assert json.loads(text_template("¡Hola! 🍕").render("59892717261")) == build_text_payload("59892717261", "¡Hola! 🍕")
+    buttons = [{"id": "confirm", "title": "Sí"}]
+    rendered = button_template("¿Confirmas?", buttons).render("59892717261")
+    assert json.loads(rendered) == build_button_payload("59892717261", "¿Confirmas?", buttons)
+
+
+def test_rendering_is_compact_utf8():
+    rendered = text_template("Pizza 🍕").render("1")
+    assert rendered.startswith(b'{"to":"1","messaging_product":"whatsapp"')
+    assert b" " not in rendered.replace("Pizza 🍕".encode(), b"")
+    assert "🍕".encode() in rendered
+
+
+def test_odd_phone_numbers_are_escaped():
+    rendered = text_template("hola").render('1"2')
+    assert json.loads(rendered)["to"] == '1"2'
+
+
+def test_text_templates_are_memoized():
+    texts = TextTemplates()
+    assert texts.get("hola") is texts.get("hola")
+    assert texts.get("hola") is not texts.get("chau")
+
+
+def test_list_rows_respect_whatsapp_limits():
+    row = list_row("x" * 300, "t" * 30, "d" * 80)
+    assert (len(row["id"]), len(row["title"]), len(row["description"])) == (200, 24, 72)
+    assert "description" not in list_row("id", "title")
+
+
+def test_category_pages_have_navigation_rows(catalog):
+    catalog.categories = tuple(f"Cat {index}" for index in range(CATEGORY_PAGE_SIZE + 1))
+    catalog.by_category = {category: () for category in catalog.categories}
+    pages = CatalogTemplates(catalog)
+
+    def row_ids(page):
+        rendered = json.loads(pages.category_page(page).render("1"))
+        return [row["id"] for row in rendered["interactive"]["action"]["sections"][0]["rows"]]
+
+    assert row_ids(0)[-1] == "cats:1"
+    assert row_ids(1) == [f"cat:Cat {CATEGORY_PAGE_SIZE}", "cats:0"]
+    assert pages.category_page(2) is None
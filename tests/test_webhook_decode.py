@@ -0,0 +1,62 @@
+import json
+import msgspec
+import pytest
+from shared.webhook import Location, Media, Message, decode_webhook, get_message_type
+
+
+def decode_message(message: dict) -> Message:
+    body = json.dumps({
+        "object": "whatsapp_business_account",
+        "entry": [{"id": "1", "changes": [{"field": "messages", "value": {"messages": [message]}}]}],
+    }).encode()
+    return decode_webhook(body).entry[0].changes[0].value.messages[0]
+
+
+def base(message_type, **fields):
+    return {"from": "59892717261", "id": "wamid.1", "timestamp": "1700000000", "type": message_type, **fields}
+
+
+@pytest.mark.parametrize("message, expected", [
+    (base("text", text={"body": "hola"}), "hola"),
+    (base("interactive", interactive={"type": "button_reply", "button_reply": {"id": "confirm", "title": "Sí"}}), "confirm"),
+    (base("interactive", interactive={"type": "list_reply", "list_reply": {"id": "prod_1", "title": "Pizza"}}), "prod_1"),
+    (base("interactive", interactive={"type": "nfm_reply", "nfm_reply": {"response_json": "{}"}}), "{}"),
+    (base("button", button={"payload": "MENU", "text": "Menú"}), "MENU"),
+])
+def test_content_of_each_message_type(message, expected):
+    message = decode_message(message)
+    assert get_message_type(message) == (message.type, expected)
+
+
+def test_location_and_media_are_typed():
+    message = decode_message(base("location", location={"latitude": -34.9, "longitude": -56.2, "name": "Casa"}))
+    kind, location = get_message_type(message)
+    assert kind == "location" and isinstance(location, Location)
+    assert (location.latitude, location.longitude, location.name) == (-34.9, -56.2, "Casa")
+
+    message = decode_message(base("audio", audio={"id": "media.1", "mime_type": "audio/ogg", "voice": True}))
+    kind, audio = get_message_type(message)
+    assert kind == "audio" and isinstance(audio, Media) and audio.voice
+
+
+def test_sender_and_context_use_the_from_field():
+    message = decode_message(base("text", text={"body": "ok"}, context={"from": "111", "id": "wamid.0"}))
+    assert message.from_ == "59892717261"
+    assert message.context.from_ == "111"
+
+
+def test_unknown_or_incomplete_messages_have_no_content():
+    assert get_message_type(decode_message(base("ephemeral"))) == ("ephemeral", None)
+    assert get_message_type(decode_message(base("image"))) == ("image", None)
+
+
+def test_undeclared_fields_are_ignored():
+    message = decode_message(base("text", text={"body": "hola", "preview_url": True}, extra={"a": 1}))
+    assert message.text.body == "hola"
+
+
+def test_invalid_bodies_raise():
+    with pytest.raises(msgspec.DecodeError):
+        decode_webhook(b"{not json")
+    with pytest.raises(msgspec.ValidationError):
+        decode_webhook(b'{"entry": "nope"}')
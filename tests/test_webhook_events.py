@@ -0,0 +1,70 @@
+import asyncio
+import json
+from shared.actors import Mailboxes
+from shared.webhook import decode_webhook, dispatch_events, event_sender, iter_events
+
+
+def text_message(sender, message_id, body):
+    return {"from": sender, "id": message_id, "timestamp": "1700000000", "type": "text", "text": {"body": body}}
+
+
+def status(recipient, message_id, state="delivered"):
+    return {"id": message_id, "status": state, "timestamp": "1700000001", "recipient_id": recipient}
+
+
+def change(messages=(), statuses=()):
+    value = {"messaging_product": "whatsapp", "metadata": {"phone_number_id": "1"}}
+    if messages:
+        value["messages"] = list(messages)
+    if statuses:
+        value["statuses"] = list(statuses)
+    return {"field": "messages", "value": value}
+
+
+def body(*entries):
+    return json.dumps({
+        "object": "whatsapp_business_account",
+        "entry": [{"id": str(index), "changes": list(changes)} for index, changes in enumerate(entries)],
+    }).encode()
+
+
+BATCHED = body(
+    [change([text_message("111", "m1", "hola"), text_message("222", "m2", "menu")]), change(statuses=[status("111", "s1")])],
+    [change([text_message("111", "m3", "carrito")], [status("333", "s2", "read")])],
+)
+
+
+def test_every_entry_change_message_and_status_in_order():
+    events = list(iter_events(decode_webhook(BATCHED)))
+    assert [(kind, item.id) for kind, _, item in events] == [
+        ("message", "m1"), ("message", "m2"), ("status", "s1"), ("message", "m3"), ("status", "s2"),
+    ]
+    assert [event_sender(event) for event in events] == ["111", "222", "111", "111", "333"]
+
+
+def test_empty_payload_has_no_events():
+    assert list(iter_events(decode_webhook(body()))) == []
+    assert list(iter_events(decode_webhook(body([change()])))) == []
+
+
+def test_dispatch_keeps_each_senders_order_and_survives_errors():
+    handled = []
+
+    async def handle(event):
+        kind, _, item = event
+        if item.id == "m2":
+            raise RuntimeError("falla un evento")
+        await asyncio.sleep(0.001)
+        handled.append((event_sender(event), item.id))
+
+    async def scenario():
+        mailboxes = Mailboxes(handle, idle_timeout=1)
+        count = await dispatch_events(iter_events(decode_webhook(BATCHED)), mailboxes)
+        await mailboxes.stop()
+        return count, mailboxes.errors
+
+    count, errors = asyncio.run(scenario())
+    assert count == 5
+    assert errors == 1
+    assert [item for sender, item in handled if sender == "111"] == ["m1", "s1", "m3"]
+    assert ("333", "s2") in handled
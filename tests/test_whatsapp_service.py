@@ -0,0 +1,103 @@
+import asyncio
+import json
+import httpx
+import pytest
+from services.whatsapp_service import (
+    AsyncWhatsAppService,
+    GraphAPIError,
+    WhatsAppService,
+    build_button_payload,
+    build_text_payload,
+    is_retryable,
+    sent_message_id,
+)
+from shared.config import WHATSAPP_API_URL
+
+
+def service_with(handler):
+    return AsyncWhatsAppService(httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+def test_sends_dicts_and_bytes_to_the_messages_endpoint():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"messages": [{"id": f"wamid.{len(requests)}"}]})
+
+    async def scenario():
+        service = service_with(handler)
+        first = await service.send_text_message("59892717261", "hola")
+        second = await service.send_payload(json.dumps(build_text_payload("59892717261", "chau")).encode())
+        await service.aclose()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert sent_message_id(first) == "wamid.1"
+    assert sent_message_id(second) == "wamid.2"
+    assert all(str(request.url) == WHATSAPP_API_URL for request in requests)
+    assert [json.loads(request.content)["text"]["body"] for request in requests] == ["hola", "chau"]
+
+
+def test_api_errors_carry_status_code_and_retry_after():
+    def handler(request):
+        return httpx.Response(
+            429,
+            headers={"retry-after": "3"},
+            json={"error": {"code": 130429, "message": "Rate limit hit"}},
+        )
+
+    async def scenario():
+        service = service_with(handler)
+        try:
+            await service.send_text_message("59892717261", "hola")
+        finally:
+            await service.aclose()
+
+    with pytest.raises(GraphAPIError) as error:
+        asyncio.run(scenario())
+    assert error.value.status_code == 429
+    assert error.value.code == 130429
+    assert error.value.retry_after == 3.0
+    assert is_retryable(error.value)
+
+
+@pytest.mark.parametrize("error, retryable", [
+    (GraphAPIError(500), True),
+    (GraphAPIError(400, code=131056), True),
+    (GraphAPIError(400, code=131030), False),
+    (GraphAPIError(401), False),
+    (httpx.ConnectTimeout("timeout"), True),
+    (ValueError("bug"), False),
+])
+def test_is_retryable(error, retryable):
+    assert is_retryable(error) is retryable
+
+
+def test_button_payload_shape():
+    payload = build_button_payload("1", "¿Qué deseas?", [{"id": "a", "title": "A"}])
+    assert payload["interactive"]["action"]["buttons"] == [{"type": "reply", "reply": {"id": "a", "title": "A"}}]
+
+
+def test_sent_message_id_of_an_error_is_empty():
+    assert sent_message_id({"error": {}}) == ""
+    assert sent_message_id(None) == ""
+
+
+def test_sync_service_delegates_to_one_async_client():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if json.loads(request.content)["to"] == "0":
+            return httpx.Response(400, json={"error": {"code": 131030}})
+        return httpx.Response(200, json={"messages": [{"id": f"wamid.{len(requests)}"}]})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    with WhatsAppService(client) as service:
+        assert sent_message_id(service.send_text_message("59892717261", "hola")) == "wamid.1"
+        assert sent_message_id(service.send_button_message("59892717261", "¿Sí?", [{"id": "y", "title": "Sí"}])) == "wamid.2"
+        with pytest.raises(GraphAPIError):
+            service.send_text_message("0", "hola")
+    assert client.is_closed
+    assert len(requests) == 3
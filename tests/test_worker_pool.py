@@ -0,0 +1,165 @@
+import asyncio
+import json
+import msgspec
+from services.worker_pool import (
+    HELLO, STATS, HashRing, WorkerPool, decode_events, encode_events, read_frame, serve_worker, write_frame,
+)
+from shared.actors import Mailboxes
+from shared.webhook import decode_webhook, event_sender, iter_events
+
+
+def text_message(sender, message_id):
+    return {"from": sender, "id": message_id, "type": "text", "text": {"body": "hola"}}
+
+
+def body(*senders):
+    messages = [text_message(sender, f"m{index}") for index, sender in enumerate(senders)]
+    return json.dumps({"entry": [{"changes": [{"value": {"messages": messages}}]}]}).encode()
+
+
+def test_each_phone_always_goes_to_the_same_worker():
+    ring = HashRing(4)
+    phones = [f"5989{index:07d}" for index in range(2000)]
+    owners = [ring.node_for(phone) for phone in phones]
+    rebuilt = HashRing(4)
+    assert owners == [rebuilt.node_for(phone) for phone in phones]
+    # Reparto parejo: ningún worker con menos de la mitad de lo justo
+    assert min(owners.count(node) for node in range(4)) > len(phones) / 8
+
+    # Con un worker más solo se mueven los que van al nuevo
+    grown = HashRing(5)
+    moved = [phone for phone, owner in zip(phones, owners) if grown.node_for(phone) != owner]
+    assert all(grown.node_for(phone) == 4 for phone in moved)
+    assert len(moved) < len(phones) / 3
+
+
+def test_events_survive_the_msgpack_round_trip():
+    events = list(iter_events(decode_webhook(body("111", "222"))))
+    decoded = decode_events(encode_events(events))
+    assert [(kind, item) for kind, _, item in decoded] == [(kind, item) for kind, _, item in events]
+
+
+def run_pool(tmp_path, scenario_body, count=2):
+    """Pool con "workers" que corren serve_worker en este mismo proceso"""
+    received = {index: [] for index in range(count)}
+
+    async def scenario():
+        socket_path = str(tmp_path / "workers.sock")
+        pool = WorkerPool(target=None, count=count, socket_path=socket_path, timeout=2)
+        pool.server = await asyncio.start_unix_server(pool._on_connect, socket_path)
+        workers = []
+
+        def start_worker(index):
+            async def handle(event):
+                received[index].append(event_sender(event))
+
+            mailboxes = Mailboxes(handle, idle_timeout=1)
+            workers.append((mailboxes, asyncio.create_task(
+                serve_worker(index, socket_path, mailboxes, lambda: {"worker": index})
+            )))
+
+        result = await scenario_body(pool, start_worker)
+        for link in pool.links:
+            if link.writer is not None:
+                link.writer.close()
+        for mailboxes, task in workers:
+            await task
+            await mailboxes.stop()
+        pool.server.close()
+        return pool, result
+
+    pool, result = asyncio.run(scenario())
+    return pool, received, result
+
+
+def test_forward_splits_a_webhook_by_owner(tmp_path):
+    senders = [f"5989{index:07d}" for index in range(20)]
+
+    async def scenario(pool, start_worker):
+        for index in range(2):
+            start_worker(index)
+        await asyncio.wait_for(pool.all_connected.wait(), 2)
+        links = pool.forward(body(*senders), list(iter_events(decode_webhook(body(*senders)))))
+        await pool.drain(links)
+        return await pool.stats()
+
+    pool, received, stats = run_pool(tmp_path, scenario)
+    for index in range(2):
+        assert received[index] == [s for s in senders if pool.ring.node_for(s) == index]
+    assert [entry["stats"] for entry in stats] == [{"worker": 0}, {"worker": 1}]
+
+
+def test_frames_wait_in_the_backlog_until_the_worker_connects(tmp_path):
+    async def scenario(pool, start_worker):
+        phone = next(f"5989{index:07d}" for index in range(100) if pool.ring.node_for(f"5989{index:07d}") == 0)
+        pool.forward(body(phone), list(iter_events(decode_webhook(body(phone)))))
+        assert pool.backlog() == 1
+        assert (await pool.worker_stats(pool.links[0])) == {"connected": False}
+        start_worker(0)
+        while not pool.links[0].connected:
+            await asyncio.sleep(0.01)
+        # Un STATS va detrás del backlog: cuando vuelve, el body ya se procesó
+        await pool.worker_stats(pool.links[0])
+        return phone
+
+    pool, received, phone = run_pool(tmp_path, scenario)
+    assert received[0] == [phone]
+    assert pool.backlog() == 0
+
+
+async def fake_worker(socket_path, index=0):
+    """Conexión a mano: solo HELLO, el resto lo maneja el test"""
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    write_frame(writer, HELLO, msgspec.msgpack.encode([index, 1234]))
+    return reader, writer
+
+
+def test_unexpected_frames_are_dropped_and_reading_goes_on(tmp_path):
+    async def scenario(pool, start_worker):
+        reader, writer = await fake_worker(pool.socket_path)
+        # Un STATS que nadie pidió
+        write_frame(writer, STATS, b'{"late":true}')
+        while not pool.links[0].connected:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.01)
+        assert not pool.links[0].reader_task.done()
+
+        pending = asyncio.create_task(pool.worker_stats(pool.links[0]))
+        assert (await read_frame(reader))[0] == STATS
+        write_frame(writer, STATS, b'{"worker":0}')
+        result = await pending
+        writer.close()
+        return result
+
+    _, _, result = run_pool(tmp_path, scenario, count=1)
+    assert result == {"worker": 0}
+
+
+def test_reconnecting_worker_replaces_the_old_reader(tmp_path):
+    async def scenario(pool, start_worker):
+        _, old_writer = await fake_worker(pool.socket_path)
+        while not pool.links[0].connected:
+            await asyncio.sleep(0.01)
+        old_task = pool.links[0].reader_task
+        old_reply = asyncio.create_task(pool.worker_stats(pool.links[0]))
+        await asyncio.sleep(0)
+
+        # El worker relanzado conecta antes de que se cierre la conexión vieja
+        reader, writer = await fake_worker(pool.socket_path)
+        while pool.links[0].reader_task is old_task:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.01)
+        assert old_task.cancelled()
+        # El pedido que quedó en la conexión vieja falla en vez de colgarse
+        assert (await old_reply)["error"] == "ConnectionError"
+
+        pending = asyncio.create_task(pool.worker_stats(pool.links[0]))
+        assert (await read_frame(reader))[0] == STATS
+        write_frame(writer, STATS, b'{"worker":"new"}')
+        result = await pending
+        old_writer.close()
+        writer.close()
+        return result
+
+    _, _, result = run_pool(tmp_path, scenario, count=1)
+    assert result == {"worker": "new"}